@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+级联刷新并发基准测试（模拟LLM，不访问真实API）
+
+用模拟的LLM客户端（固定延迟 + 固定城市/区县/医院数）替换 llm_client.LLMClient，
+在临时数据库上以不同的医院阶段并发数运行级联刷新流水线（cascade_pipeline.CascadePipeline），
+输出每种并发设置下的吞吐量（区县/分钟），用于验证 MAX_CONCURRENT_DISTRICT_REFRESHES 的效果。
+
+用法:
+    python benchmark_district_refresh.py --provinces 2 --cities 3 --districts 8 --latency 0.5 --concurrency 1,2,4,8
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import db
+import llm_client
+import tasks
+from cascade_pipeline import CascadePipeline
+
+
+class MockLLMClient:
+    """模拟LLM客户端：每次调用等待固定延迟后返回固定数量的城市/区县/医院"""
+
+    latency = 0.5
+    cities_per_province = 3
+    districts_per_city = 8
+    hospitals_per_district = 20
+
+    async def get_cities_by_province(self, province_name: str, bypass_cache: bool = False) -> dict:
+        await asyncio.sleep(self.latency)
+        return {"cities": [f"{province_name}第{i + 1}市" for i in range(self.cities_per_province)]}
+
+    async def get_districts_by_city(self, city_name: str, bypass_cache: bool = False) -> dict:
+        await asyncio.sleep(self.latency)
+        return {"items": [{"name": f"{city_name}第{i + 1}区"} for i in range(self.districts_per_city)]}
+
+    async def get_hospitals_from_district(self, province_name: str, city_name: str, district_name: str,
+                                          bypass_cache: bool = False) -> list:
+        await asyncio.sleep(self.latency)
+        return [
+            {"name": f"{district_name}第{i + 1}医院", "level": "二级", "address": f"{district_name}{i + 1}号"}
+            for i in range(self.hospitals_per_district)
+        ]
+
+    async def stream_hospitals_from_district(self, province_name: str, city_name: str, district_name: str,
+                                            bypass_cache: bool = False):
+        for hospital in await self.get_hospitals_from_district(province_name, city_name, district_name):
+            yield hospital
+
+
+async def run_benchmark(province_names: list, concurrency_levels: list, city_concurrency: int) -> list:
+    task_manager = tasks.TaskManager()
+    results = []
+    for concurrency in concurrency_levels:
+        pipeline = CascadePipeline(f"benchmark-{concurrency}", task_manager,
+                                   city_concurrency=city_concurrency, hospital_concurrency=concurrency)
+        start = time.monotonic()
+        summary = await pipeline.run(province_names)
+        elapsed = time.monotonic() - start
+        results.append({
+            "concurrency": concurrency,
+            "succeeded": summary["hospital_refreshes_success"],
+            "districts": summary["districts_done"],
+            "seconds": elapsed,
+            "districts_per_minute": summary["districts_done"] / elapsed * 60 if elapsed > 0 else 0.0,
+        })
+    return results
+
+
+async def main(args):
+    MockLLMClient.latency = args.latency
+    MockLLMClient.cities_per_province = args.cities
+    MockLLMClient.districts_per_city = args.districts
+    MockLLMClient.hospitals_per_district = args.hospitals
+    llm_client.LLMClient = MockLLMClient
+    llm_client.LLM_STREAMING_ENABLED = False
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database = db.Database(os.path.join(tmp_dir, "benchmark.db"))
+        await database.init_db()
+        db._db_instance = database
+        try:
+            province_names = [f"基准测试省{i + 1}" for i in range(args.provinces)]
+            levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+            results = await run_benchmark(province_names, levels, args.city_concurrency)
+        finally:
+            await db.close_db()
+
+    baseline = results[0]["districts_per_minute"] if results else 0.0
+    print(f"\n省份数: {args.provinces}, 每省城市数: {args.cities}, 每市区县数: {args.districts}, "
+          f"每区县医院数: {args.hospitals}, 模拟LLM延迟: {args.latency}s, 城市阶段并发: {args.city_concurrency}")
+    print(f"{'医院并发':>6} {'区县':>6} {'成功':>6} {'耗时(s)':>9} {'区县/分钟':>10} {'加速比':>7}")
+    for row in results:
+        speedup = row["districts_per_minute"] / baseline if baseline else 0.0
+        print(f"{row['concurrency']:>6} {row['districts']:>6} {row['succeeded']:>6} {row['seconds']:>9.2f} "
+              f"{row['districts_per_minute']:>10.1f} {speedup:>7.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="级联刷新并发基准测试（模拟LLM）")
+    parser.add_argument("--provinces", type=int, default=2, help="省份数量")
+    parser.add_argument("--cities", type=int, default=3, help="每个省份的城市数量")
+    parser.add_argument("--districts", type=int, default=8, help="每个城市的区县数量")
+    parser.add_argument("--latency", type=float, default=0.5, help="模拟LLM单次调用延迟（秒）")
+    parser.add_argument("--hospitals", type=int, default=20, help="每个区县返回的医院数量")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="逗号分隔的医院阶段并发数列表")
+    parser.add_argument("--city-concurrency", type=int, default=4, help="城市阶段并发数")
+    parser.add_argument("--verbose", action="store_true", help="输出刷新过程日志")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    asyncio.run(main(args))
@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+医院层级扫查微服务 - 级联刷新流水线
+
+省份 -> 城市 -> 区县 -> 医院 的级联刷新按阶段拆分为生产者/消费者流水线：
+- 省份阶段：获取省份的城市列表并入库，把城市放入城市队列
+- 城市阶段：获取城市的区县列表并入库，把区县放入区县队列
+- 医院阶段：刷新区县的医院数据
+阶段之间是有界队列（下游处理不过来时上游自动等待），每个阶段有独立的并发数，
+不同省份、不同城市的区县/医院请求可以重叠执行。
+
+启用断点（checkpoint=True）时，按主任务ID记录省份/城市/区县的进度：
+下级列表入库后记为 listed，单元及其下级全部成功后记为 completed。
+同一任务再次运行（断点续跑或作业恢复）时跳过 completed 的单元，listed 的单元从数据库读取下级列表而不再调用LLM。
+
+指定 max_age_hours 时按 last_refreshed_at 增量刷新：最近刷新过的省份/城市从数据库读取下级列表，
+最近刷新过的区县跳过医院刷新；plan_cascade_refresh / plan_city_refresh 按同样规则估算LLM调用数（dry-run）。
+"""
+
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from db import get_db
+from schemas import TaskStatus, TaskType, ScanTaskRequest
+from tasks import TaskManager, refresh_district_hospitals_internal
+
+logger = logging.getLogger(__name__)
+
+CASCADE_PROVINCE_CONCURRENCY = int(os.getenv("CASCADE_PROVINCE_CONCURRENCY", "2"))
+CASCADE_CITY_CONCURRENCY = int(os.getenv("CASCADE_CITY_CONCURRENCY", "4"))
+CASCADE_QUEUE_SIZE = int(os.getenv("CASCADE_QUEUE_SIZE", "200"))
+
+
+def freshness_cutoff(max_age_hours: Optional[float]) -> Optional[str]:
+    """新鲜度阈值转为 last_refreshed_at 的比较下限（ISO时间字符串）；None 表示不按新鲜度跳过"""
+    if max_age_hours is None:
+        return None
+    return (datetime.now() - timedelta(hours=max_age_hours)).isoformat()
+
+
+def is_fresh(row: Optional[Dict[str, Any]], cutoff: Optional[str]) -> bool:
+    """省份/城市/区县记录是否在阈值之后刷新过"""
+    refreshed_at = row.get("last_refreshed_at") if row else None
+    return bool(cutoff and refreshed_at and refreshed_at >= cutoff)
+
+
+class ProvinceState:
+    """单个省份在流水线中的进度；pending 为该省尚未处理完的阶段任务数，归零即该省完成"""
+
+    def __init__(self, index: int, name: str, task_id: Optional[str]):
+        self.index = index
+        self.name = name
+        self.task_id = task_id
+        self.province_id: Optional[int] = None
+        self.pending = 1  # 省份阶段自身
+        self.failures = 0  # 失败的城市/区县数，非零时不记录省份完成断点
+        self.error: Optional[str] = None
+        self.start_time = time.time()
+        self.stats = {
+            "cities_total": 0, "cities_created": 0, "cities_skipped": 0, "cities_failed": 0,
+            "districts_total": 0, "districts_created": 0, "districts_skipped": 0,
+            "hospital_refreshes_success": 0, "hospital_refreshes_failed": 0,
+            "hospitals_saved": 0, "hospitals_updated": 0, "hospitals_unchanged": 0,
+            "cities_checkpoint_skipped": 0, "districts_checkpoint_skipped": 0,
+            "cities_fresh_skipped": 0, "districts_fresh_skipped": 0,
+        }
+
+
+class CascadePipeline:
+    """省份→城市→区县→医院 级联刷新流水线"""
+
+    def __init__(self, task_id: str, task_manager: TaskManager,
+                 province_concurrency: int = None, city_concurrency: int = None,
+                 hospital_concurrency: int = None, queue_size: int = None,
+                 create_province_tasks: bool = False, checkpoint: bool = False,
+                 max_age_hours: Optional[float] = None):
+        """
+        Args:
+            task_id: 主任务ID（进度写入该任务）
+            task_manager: 任务管理器实例
+            province_concurrency: 省份阶段并发数（默认 CASCADE_PROVINCE_CONCURRENCY）
+            city_concurrency: 城市阶段并发数（默认 CASCADE_CITY_CONCURRENCY）
+            hospital_concurrency: 医院阶段并发数（默认 MAX_CONCURRENT_DISTRICT_REFRESHES）
+            queue_size: 阶段间队列容量（默认 CASCADE_QUEUE_SIZE）
+            create_province_tasks: 是否为每个省份创建子任务记录（全国扫描时使用）
+            checkpoint: 是否按主任务ID记录断点并跳过已完成的单元（全国扫描时使用）
+            max_age_hours: 新鲜度阈值（小时），该时间内刷新过的省份/城市/区县不再调用LLM；None 表示全部刷新
+        """
+        self.task_id = task_id
+        self.task_manager = task_manager
+        self.province_concurrency = max(1, province_concurrency or CASCADE_PROVINCE_CONCURRENCY)
+        self.city_concurrency = max(1, city_concurrency or CASCADE_CITY_CONCURRENCY)
+        self.hospital_concurrency = max(1, hospital_concurrency or int(os.getenv("MAX_CONCURRENT_DISTRICT_REFRESHES", "3")))
+        self.queue_size = max(1, queue_size or CASCADE_QUEUE_SIZE)
+        self.create_province_tasks = create_province_tasks
+        self.checkpoint = checkpoint
+        self.max_age_hours = max_age_hours
+        self._cutoff: Optional[str] = None
+        self._bypass_cache = False
+        self._checkpoints: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # 城市ID -> [未完成的阶段任务数, 失败数]，归零且无失败时记录城市完成断点
+        self._city_pending: Dict[int, List[int]] = {}
+
+        self._province_queue: asyncio.Queue = asyncio.Queue()
+        self._city_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._district_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._db = None
+        self._llm_client = None
+        self.provinces: List[ProvinceState] = []
+        self.progress = {
+            "provinces_total": 0, "provinces_completed": 0, "provinces_failed": 0, "provinces_checkpoint_skipped": 0,
+            "provinces_fresh_skipped": 0,
+            "cities_queued": 0, "cities_done": 0,
+            "districts_queued": 0, "districts_done": 0,
+        }
+
+    async def run(self, province_names: List[str]) -> Dict[str, Any]:
+        """运行流水线直到所有省份的城市、区县、医院处理完成，返回汇总统计"""
+        from llm_client import LLMClient
+        self._db = await get_db()
+        self._llm_client = LLMClient()
+        self._cutoff = freshness_cutoff(self.max_age_hours)
+        # 增量刷新时被判定为过期的单元必须重新查询LLM：响应缓存期（城市/区县30天、医院7天）可能长于max_age，
+        # 读取缓存只会把旧回复重新标记为刚刷新
+        self._bypass_cache = self._cutoff is not None
+        if self._cutoff:
+            logger.info(f"🕒 [流水线] 增量刷新: 跳过 {self.max_age_hours} 小时内（{self._cutoff} 之后）刷新过的省份/城市/区县")
+        if self.checkpoint:
+            self._checkpoints = await self._db.get_refresh_checkpoints(self.task_id)
+            completed = {unit_type: sum(1 for item in units.values() if item["status"] == "completed")
+                         for unit_type, units in self._checkpoints.items()}
+            if completed:
+                logger.info(f"♻️ [流水线] 断点续跑: 已完成 省份 {completed.get('province', 0)} 个，"
+                            f"城市 {completed.get('city', 0)} 个，区县 {completed.get('district', 0)} 个，将跳过")
+
+        self.progress["provinces_total"] = len(province_names)
+        for index, name in enumerate(province_names, 1):
+            self._province_queue.put_nowait((index, name))
+        for _ in range(self.province_concurrency):
+            self._province_queue.put_nowait(None)
+
+        logger.info(f"🚀 [流水线] 启动级联刷新: {len(province_names)} 个省份，并发数 省份/城市/医院 = "
+                    f"{self.province_concurrency}/{self.city_concurrency}/{self.hospital_concurrency}，队列容量 {self.queue_size}")
+
+        province_workers = [asyncio.create_task(self._province_worker()) for _ in range(self.province_concurrency)]
+        city_workers = [asyncio.create_task(self._city_worker()) for _ in range(self.city_concurrency)]
+        hospital_workers = [asyncio.create_task(self._hospital_worker()) for _ in range(self.hospital_concurrency)]
+        all_workers = province_workers + city_workers + hospital_workers
+        try:
+            # 上游阶段全部结束后向下游发送结束标记，逐级关闭
+            await asyncio.gather(*province_workers)
+            for _ in city_workers:
+                await self._city_queue.put(None)
+            await asyncio.gather(*city_workers)
+            for _ in hospital_workers:
+                await self._district_queue.put(None)
+            await asyncio.gather(*hospital_workers)
+        finally:
+            for worker in all_workers:
+                worker.cancel()
+            await asyncio.gather(*all_workers, return_exceptions=True)
+
+        return self.summary()
+
+    def summary(self) -> Dict[str, Any]:
+        """汇总所有省份的统计"""
+        totals: Dict[str, Any] = dict(self.progress)
+        for state in self.provinces:
+            for key, value in state.stats.items():
+                totals[key] = totals.get(key, 0) + value
+        totals["failed_provinces"] = [
+            {"name": state.name, "error": state.error} for state in self.provinces if state.error
+        ]
+        return totals
+
+    # ===== 阶段工作协程 =====
+
+    async def _province_worker(self):
+        while True:
+            item = await self._province_queue.get()
+            if item is None:
+                return
+            index, name = item
+            name = (name or "").strip()
+            task_id = f"{self.task_id}_province_{index}" if self.create_province_tasks else None
+            state = ProvinceState(index, name, task_id)
+            self.provinces.append(state)
+            if name and self._checkpoint_status("province", name) == "completed":
+                self.progress["provinces_completed"] += 1
+                self.progress["provinces_checkpoint_skipped"] += 1
+                logger.info(f"⏭️ [流水线] [省份 {index}/{self.progress['provinces_total']}] {name} 已完成（断点），跳过")
+                continue
+            try:
+                if not name:
+                    raise ValueError(f"省份名称为空，跳过处理 [省份 {index}/{self.progress['provinces_total']}]")
+                await self._process_province(state)
+            except Exception as e:
+                state.error = str(e)
+                logger.error(f"❌ [流水线] 省份 {name or index} 处理失败: {e}")
+            finally:
+                await self._release(state)
+
+    async def _city_worker(self):
+        while True:
+            item = await self._city_queue.get()
+            if item is None:
+                return
+            state, city = item
+            try:
+                await self._process_city(state, city)
+            except Exception as e:
+                state.stats["cities_failed"] += 1
+                state.failures += 1
+                self._city_pending[city['id']][1] += 1
+                logger.error(f"❌ [流水线] 城市 {city['name']} 处理失败: {e}")
+            finally:
+                self.progress["cities_done"] += 1
+                await self._release_city(city['id'])
+                await self._release(state)
+
+    async def _hospital_worker(self):
+        while True:
+            item = await self._district_queue.get()
+            if item is None:
+                return
+            state, city_id, district_id, district_name = item
+            succeeded = False
+            try:
+                result = await refresh_district_hospitals_internal(district_name, self.task_manager, district_id=district_id,
+                                                                   bypass_cache=self._bypass_cache)
+                if result["success"]:
+                    succeeded = True
+                    state.stats["hospital_refreshes_success"] += 1
+                    state.stats["hospitals_saved"] += result["saved_count"]
+                    state.stats["hospitals_updated"] += result["updated_count"]
+                    state.stats["hospitals_unchanged"] += result["unchanged_count"]
+                    await self._save_checkpoint("district", district_id, "completed")
+                else:
+                    state.stats["hospital_refreshes_failed"] += 1
+                    logger.error(f"❌ [流水线] 区县 {district_name} 医院数据刷新失败: {result['error_message']}")
+            except Exception as e:
+                state.stats["hospital_refreshes_failed"] += 1
+                logger.error(f"❌ [流水线] 区县 {district_name} 医院数据刷新异常: {e}")
+            finally:
+                if not succeeded:
+                    state.failures += 1
+                    self._city_pending[city_id][1] += 1
+                self.progress["districts_done"] += 1
+                await self._release_city(city_id)
+                await self._release(state)
+                await self._report_progress(f"区县 {district_name} 医院数据刷新完成")
+
+    # ===== 各阶段处理逻辑 =====
+
+    async def _process_province(self, state: ProvinceState):
+        """省份阶段：检查/创建省份，获取并存储城市，再把该省城市放入城市队列"""
+        # 续跑时子任务记录可能已存在（上次中断时未结束），直接沿用
+        if state.task_id and not await self._db.get_task(state.task_id):
+            await self.task_manager.create_task(ScanTaskRequest(
+                hospital_name=f"省级级联刷新 - {state.name}",
+                query=f"级联刷新省份 {state.name} 的所有城市、区县和医院数据",
+                task_type=TaskType.PROVINCE
+            ), state.task_id)
+        if state.task_id:
+            await self.task_manager.update_task_status(state.task_id, TaskStatus.RUNNING, f"开始处理 {state.name} 的级联刷新...")
+
+        existing_province = await self._db.get_province_by_name(state.name)
+        if existing_province:
+            state.province_id = existing_province['id']
+        else:
+            state.province_id = await self._db.create_province(state.name)
+            logger.info(f"✅ 创建新省份: {state.name}, ID: {state.province_id}")
+
+        if self._checkpoint_status("province", state.name) == "listed":
+            logger.info(f"⏭️ [流水线] 省份 {state.name}: 城市列表已入库（断点），从数据库读取")
+        elif is_fresh(existing_province, self._cutoff):
+            self.progress["provinces_fresh_skipped"] += 1
+            logger.info(f"⏭️ [流水线] 省份 {state.name}: 城市列表于 {existing_province['last_refreshed_at']} 刷新过，从数据库读取")
+        else:
+            cities_data = await self._llm_client.get_cities_by_province(state.name, bypass_cache=self._bypass_cache)
+            cities_list = cities_data.get('cities', [])
+            logger.info(f"✅ [流水线] 省份 {state.name}: 获取到 {len(cities_list)} 个城市")
+
+            for city_name in cities_list:
+                try:
+                    if await self._db.get_city_by_name(city_name):
+                        state.stats["cities_skipped"] += 1
+                    else:
+                        await self._db.create_city(city_name, state.province_id)
+                        state.stats["cities_created"] += 1
+                except Exception as city_error:
+                    state.failures += 1
+                    logger.error(f"❌ 处理城市 {city_name} 时出错: {city_error}")
+            # 城市全部入库后才记录 listed 和刷新时间，之后从数据库读取的城市列表才是完整的
+            if not state.failures:
+                await self._save_checkpoint("province", state.name, "listed")
+                await self._db.mark_refreshed("provinces", state.province_id)
+
+        cities, _ = await self._db.get_cities(province_id=state.province_id, page=1, page_size=1000, include_total=False)
+        state.stats["cities_total"] = len(cities)
+        for city in cities:
+            if self._checkpoint_status("city", city['id']) == "completed":
+                state.stats["cities_checkpoint_skipped"] += 1
+                continue
+            state.pending += 1
+            self._city_pending[city['id']] = [1, 0]
+            self.progress["cities_queued"] += 1
+            await self._city_queue.put((state, city))
+        await self._report_progress(f"省份 {state.name} 的 {len(cities)} 个城市已进入队列")
+
+    async def _process_city(self, state: ProvinceState, city: Dict[str, Any]):
+        """城市阶段：获取并存储区县，再把该城市的区县放入区县队列"""
+        city_name, city_id = city['name'], city['id']
+        if self._checkpoint_status("city", city_id) == "listed":
+            reason = "区县列表已入库（断点）"
+        elif is_fresh(city, self._cutoff):
+            reason = f"区县列表于 {city['last_refreshed_at']} 刷新过"
+            state.stats["cities_fresh_skipped"] += 1
+        else:
+            reason = None
+        if reason:
+            districts, _ = await self._db.get_districts(city_id, page=1, page_size=1000, include_total=False)
+            logger.info(f"⏭️ [流水线] 城市 {city_name}: {reason}，从数据库读取 {len(districts)} 个区县")
+            for district in districts:
+                state.stats["districts_skipped"] += 1
+                await self._enqueue_district(state, city_id, district['id'], district['name'], district.get('last_refreshed_at'))
+            return
+
+        districts_data = await self._llm_client.get_districts_by_city(city_name, bypass_cache=self._bypass_cache)
+        districts_list = districts_data.get('items', [])
+        logger.info(f"✅ [流水线] 城市 {city_name}: 获取到 {len(districts_list)} 个区县")
+
+        listed_districts = []
+        for district_item in districts_list:
+            district_name = district_item.get('name') if isinstance(district_item, dict) else district_item
+            try:
+                existing_district = await self._db.get_district_by_name_and_city(district_name, city_id)
+                last_refreshed_at = None
+                if existing_district:
+                    district_id = existing_district['id']
+                    last_refreshed_at = existing_district.get('last_refreshed_at')
+                    state.stats["districts_skipped"] += 1
+                else:
+                    global_district = await self._db.get_district_by_name(district_name)
+                    if global_district:
+                        logger.warning(f"⚠️ 发现跨城市同名区县冲突: '{district_name}' 已存在于城市 {global_district.get('city_id')}，当前城市: {city_id}")
+                    district_id = await self._db.create_district(district_name, city_id)
+                    if not district_id:
+                        self._city_pending[city_id][1] += 1
+                        state.failures += 1
+                        continue
+                    state.stats["districts_created"] += 1
+            except Exception as district_error:
+                self._city_pending[city_id][1] += 1
+                state.failures += 1
+                logger.error(f"❌ 处理区县 {district_name} 时出错: {district_error}")
+                continue
+            listed_districts.append((district_id, district_name, last_refreshed_at))
+
+        # 区县全部入库后才记录 listed 和刷新时间，之后从数据库读取的区县列表才是完整的
+        if not self._city_pending[city_id][1]:
+            await self._save_checkpoint("city", city_id, "listed")
+            await self._db.mark_refreshed("cities", city_id)
+        for district_id, district_name, last_refreshed_at in listed_districts:
+            await self._enqueue_district(state, city_id, district_id, district_name, last_refreshed_at)
+
+    async def _enqueue_district(self, state: ProvinceState, city_id: int, district_id: int, district_name: str,
+                                last_refreshed_at: Optional[str] = None):
+        """区县放入区县队列；已完成（断点）或最近刷新过的区县直接跳过"""
+        state.stats["districts_total"] += 1
+        if self._checkpoint_status("district", district_id) == "completed":
+            state.stats["districts_checkpoint_skipped"] += 1
+            return
+        if is_fresh({"last_refreshed_at": last_refreshed_at}, self._cutoff):
+            state.stats["districts_fresh_skipped"] += 1
+            return
+        state.pending += 1
+        self._city_pending[city_id][0] += 1
+        self.progress["districts_queued"] += 1
+        await self._district_queue.put((state, city_id, district_id, district_name))
+
+    # ===== 断点 =====
+
+    def _checkpoint_status(self, unit_type: str, unit_key: Any) -> Optional[str]:
+        if not self.checkpoint:
+            return None
+        item = self._checkpoints.get(unit_type, {}).get(str(unit_key))
+        return item["status"] if item else None
+
+    async def _save_checkpoint(self, unit_type: str, unit_key: Any, status: str):
+        """记录断点；失败只影响续跑时能跳过的范围，不影响本次刷新"""
+        if not self.checkpoint:
+            return
+        try:
+            await self._db.save_refresh_checkpoint(self.task_id, unit_type, unit_key, status)
+        except Exception as e:
+            logger.warning(f"⚠️ 记录断点失败 ({unit_type} {unit_key} -> {status}): {e}")
+
+    # ===== 进度与完成 =====
+
+    async def _release_city(self, city_id: int):
+        """城市的一个阶段任务结束；城市及其全部区县都成功时记录城市完成断点"""
+        counters = self._city_pending[city_id]
+        counters[0] -= 1
+        if counters[0] > 0:
+            return
+        self._city_pending.pop(city_id, None)
+        if not counters[1]:
+            await self._save_checkpoint("city", city_id, "completed")
+
+    async def _release(self, state: ProvinceState):
+        """一个阶段任务结束；省份的所有阶段任务都结束时标记该省完成"""
+        state.pending -= 1
+        if state.pending > 0:
+            return
+
+        stats = state.stats
+        elapsed = time.time() - state.start_time
+        if state.error:
+            self.progress["provinces_failed"] += 1
+        else:
+            self.progress["provinces_completed"] += 1
+            if not state.failures:
+                await self._save_checkpoint("province", state.name, "completed")
+        summary = (f"{state.name} 级联刷新完成: {stats['cities_total']} 个城市，区县 {stats['districts_total']} 个"
+                   f"（新建 {stats['districts_created']}），医院刷新成功 {stats['hospital_refreshes_success']} 个区县，"
+                   f"失败 {stats['hospital_refreshes_failed']} 个区县，耗时 {elapsed:.1f}秒")
+        if stats["districts_fresh_skipped"]:
+            summary += f"，{stats['districts_fresh_skipped']} 个区县近期已刷新跳过"
+        if state.error:
+            logger.error(f"❌ [流水线] [省份 {state.index}/{self.progress['provinces_total']}] {state.name} 失败: {state.error}")
+        else:
+            logger.info(f"🎉 [流水线] [省份 {state.index}/{self.progress['provinces_total']}] {summary}")
+
+        if state.task_id:
+            try:
+                if state.error:
+                    await self.task_manager.update_task_status(state.task_id, TaskStatus.FAILED, f"{state.name} 级联刷新失败: {state.error}")
+                else:
+                    await self.task_manager.update_task_status(state.task_id, TaskStatus.COMPLETED, summary)
+            except Exception as status_error:
+                logger.warning(f"⚠️ 无法更新子任务 {state.task_id} 状态: {status_error}")
+
+    async def _report_progress(self, detail: str):
+        """上报主任务进度（内存记录，由TaskManager按间隔落库）；完成比例和预计剩余时间按区县计算"""
+        progress = self.progress
+        message = (f"级联刷新进行中: 省份 {progress['provinces_completed'] + progress['provinces_failed']}/{progress['provinces_total']}，"
+                   f"城市 {progress['cities_done']}/{progress['cities_queued']}，"
+                   f"区县 {progress['districts_done']}/{progress['districts_queued']} - {detail}")
+        try:
+            await self.task_manager.update_progress(
+                self.task_id, message, current=detail,
+                done=progress["districts_done"], total=progress["districts_queued"], **progress)
+        except Exception as status_error:
+            logger.warning(f"⚠️ 更新任务进度失败: {status_error}")
+
+
+# ===== dry-run：估算LLM调用数 =====
+
+def _new_plan(max_age_hours: Optional[float]) -> Dict[str, Any]:
+    return {
+        "max_age_hours": max_age_hours,
+        "provinces": 0, "cities": 0, "districts": 0, "new_provinces": 0,
+        "llm_calls": {"provinces": 0, "cities": 0, "districts": 0, "hospitals": 0, "total": 0},
+        "skipped": {"provinces": 0, "cities": 0, "districts": 0},
+    }
+
+
+def _finish_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
+    calls = plan["llm_calls"]
+    calls["total"] = calls["provinces"] + calls["cities"] + calls["districts"] + calls["hospitals"]
+    return plan
+
+
+async def _plan_city(db, city: Dict[str, Any], cutoff: Optional[str], plan: Dict[str, Any], list_districts: bool = True):
+    plan["cities"] += 1
+    if list_districts:
+        if is_fresh(city, cutoff):
+            plan["skipped"]["cities"] += 1
+        else:
+            plan["llm_calls"]["districts"] += 1
+    districts, _ = await db.get_districts(city['id'], page=1, page_size=1000, include_total=False)
+    for district in districts:
+        plan["districts"] += 1
+        if is_fresh(district, cutoff):
+            plan["skipped"]["districts"] += 1
+        else:
+            plan["llm_calls"]["hospitals"] += 1
+
+
+async def plan_cascade_refresh(province_names: List[str], max_age_hours: Optional[float] = None,
+                               include_province_list: bool = False) -> Dict[str, Any]:
+    """
+    dry-run：按数据库现有的省/市/区县及刷新时间，估算级联刷新会发起的LLM调用数（不调用LLM、不写数据库）。
+    新省份、需重新获取列表的省份/城市可能带来数据库中还没有的下级单元，实际调用数以执行结果为准。
+    """
+    db = await get_db()
+    cutoff = freshness_cutoff(max_age_hours)
+    plan = _new_plan(max_age_hours)
+    if include_province_list:
+        plan["llm_calls"]["provinces"] += 1
+    for name in province_names:
+        plan["provinces"] += 1
+        province = await db.get_province_by_name(name)
+        if is_fresh(province, cutoff):
+            plan["skipped"]["provinces"] += 1
+        else:
+            plan["llm_calls"]["cities"] += 1
+        if not province:
+            plan["new_provinces"] += 1
+            continue
+        cities, _ = await db.get_cities(province_id=province['id'], page=1, page_size=1000, include_total=False)
+        for city in cities:
+            await _plan_city(db, city, cutoff, plan)
+    return _finish_plan(plan)
+
+
+async def plan_city_refresh(city: Dict[str, Any], max_age_hours: Optional[float] = None) -> Dict[str, Any]:
+    """dry-run：估算城市医院刷新会发起的LLM调用数（城市刷新只刷新已有区县的医院，不重新获取区县列表）"""
+    db = await get_db()
+    plan = _new_plan(max_age_hours)
+    await _plan_city(db, city, freshness_cutoff(max_age_hours), plan, list_districts=False)
+    return _finish_plan(plan)
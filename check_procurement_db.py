@@ -24,9 +24,13 @@ def check_procurement_links():
         if total_count > 0:
             # 查看最近的记录
             cursor.execute("""
-                SELECT base_url, url, link_text, first_seen_at, last_seen_at, is_latest
-                FROM procurement_links
-                ORDER BY last_seen_at DESC
+                SELECT p.base_url, p.url, p.link_text, p.first_seen_at, p.last_seen_at,
+                       p.last_run_id IS NOT NULL AND p.last_run_id = (
+                           SELECT MAX(r.id) FROM crawl_runs r
+                           WHERE r.base_url = p.base_url AND r.status = 'completed'
+                       ) AS is_latest
+                FROM procurement_links p
+                ORDER BY p.last_seen_at DESC
                 LIMIT 5
             """)
             records = cursor.fetchall()
@@ -9,6 +9,8 @@ import time
 from typing import Dict, Set, Any
 from urllib.parse import urlparse, urljoin
 
+from db import ensure_procurement_schema, sync_procurement_link_fts
+
 # 配置爬虫专用日志器
 crawler_logger = logging.getLogger('crawler')
 
@@ -225,6 +227,40 @@ def _is_html_page(url: str, unlimited_mode: bool = False) -> bool:
         return False
 
 
+def start_crawl_run(conn: sqlite3.Connection, base_url: str, started_at: str) -> int:
+    """创建一个进行中的抓取批次并立即提交，返回run_id"""
+    cursor = conn.execute(
+        "INSERT INTO crawl_runs (base_url, status, started_at) VALUES (?, 'running', ?)",
+        (base_url, started_at),
+    )
+    conn.commit()
+    return cursor.lastrowid
+
+
+def finish_crawl_run(
+    conn: sqlite3.Connection,
+    run_id: int,
+    links_seen: int,
+    status: str = "completed",
+) -> None:
+    """结束抓取批次（与链接写入同一事务提交，提交后该批次即成为站点的最新批次）"""
+    conn.execute(
+        "UPDATE crawl_runs SET status = ?, finished_at = ?, links_seen = ? WHERE id = ?",
+        (status, datetime.datetime.utcnow().isoformat(timespec="seconds"), links_seen, run_id),
+    )
+
+
+def fail_crawl_run(conn: sqlite3.Connection, run_id: int) -> None:
+    """抓取或写入失败时回滚未提交的链接写入，把批次标记为failed并提交（站点的最新批次保持不变）"""
+    try:
+        conn.rollback()
+        finish_crawl_run(conn, run_id, 0, status="failed")
+        conn.commit()
+        logging.info(f"🛑 [DATABASE] 抓取批次已标记为失败: run_id={run_id}")
+    except sqlite3.Error as e:
+        logging.error(f"❌ [DATABASE] 标记抓取批次失败状态时出错: run_id={run_id}, {e}")
+
+
 def init_db(db_path: str) -> sqlite3.Connection:
     """Initialize SQLite database and links table."""
     try:
@@ -263,21 +299,8 @@ def init_db(db_path: str) -> sqlite3.Connection:
         else:
             logging.info("🏗️ [DATABASE] 创建procurement_links表")
 
-        # Create table if not exists (full schema for new DBs)
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS procurement_links (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                base_url TEXT NOT NULL,
-                url TEXT NOT NULL,
-                link_text TEXT,
-                first_seen_at TEXT,
-                last_seen_at TEXT,
-                is_latest INTEGER DEFAULT 0,
-                UNIQUE(base_url, url)
-            )
-            """
-        )
+        # 建表及迁移（last_run_id、first_seen_epoch、crawl_runs及索引），与主应用共用同一套定义
+        ensure_procurement_schema(cursor)
 
         if not table_exists:
             logging.info("✅ [DATABASE] procurement_links表创建成功")
@@ -299,6 +322,77 @@ def init_db(db_path: str) -> sqlite3.Connection:
         logging.error(f"❌ [DATABASE] 初始化过程发生意外错误: {e}")
         raise
 
+
+# 每次executemany写入的行数，可通过环境变量调整
+CRAWL_UPSERT_CHUNK_SIZE = int(os.getenv("CRAWL_UPSERT_CHUNK_SIZE", "500"))
+
+# 依赖 UNIQUE(base_url, url) 约束的单语句写入：新链接插入，已有链接刷新文本/时间并记录本次run_id
+# （is_latest 列仅为兼容旧库保留，不再维护）
+UPSERT_PROCUREMENT_LINK_SQL = """
+    INSERT INTO procurement_links (
+        base_url,
+        url,
+        link_text,
+        first_seen_at,
+        last_seen_at,
+        last_run_id,
+        first_seen_epoch
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(base_url, url) DO UPDATE SET
+        link_text = COALESCE(excluded.link_text, procurement_links.link_text),
+        last_seen_at = excluded.last_seen_at,
+        last_run_id = excluded.last_run_id
+"""
+
+
+def upsert_procurement_links(
+    conn: sqlite3.Connection,
+    base_url: str,
+    links: list[tuple[str, str | None]],
+    seen_at: str,
+    run_id: int,
+    chunk_size: int | None = None,
+) -> int:
+    """
+    批量写入采购链接（INSERT ... ON CONFLICT DO UPDATE + executemany 分块执行）。
+    某个分块失败时逐行重试，只跳过出错的记录。不负责提交事务。
+
+    Returns:
+        int: 成功写入（新增或更新）的记录数
+    """
+    chunk_size = max(1, chunk_size or CRAWL_UPSERT_CHUNK_SIZE)
+    # first_seen_epoch 只在插入时写入（冲突更新不改变首次发现时间）
+    seen_epoch = int(datetime.datetime.fromisoformat(seen_at).replace(tzinfo=datetime.timezone.utc).timestamp())
+    rows = [(base_url, url, link_text, seen_at, seen_at, run_id, seen_epoch) for url, link_text in links]
+    written = 0
+    start_time = time.time()
+
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        try:
+            conn.executemany(UPSERT_PROCUREMENT_LINK_SQL, chunk)
+            written += len(chunk)
+        except sqlite3.Error as e:
+            logging.warning(f"⚠️ [DATABASE] 批量写入失败，改为逐行写入: {e}")
+            for row in chunk:
+                try:
+                    conn.execute(UPSERT_PROCUREMENT_LINK_SQL, row)
+                    written += 1
+                except sqlite3.Error as row_error:
+                    logging.error(f"❌ [DATABASE] 数据库写入失败 - URL: {row[1]}")
+                    logging.error(f"   错误详情: {row_error}")
+
+        # 增量维护链接文本全文索引：只有本次带文本的链接可能改变了link_text
+        try:
+            sync_procurement_link_fts(conn, base_url, [row[1] for row in chunk if row[2]])
+        except sqlite3.Error as e:
+            logging.error(f"❌ [DATABASE] 全文索引更新失败: {e}")
+
+    logging.info(f"💾 [DATABASE] 批量写入采购链接 {written}/{len(rows)} 条，"
+                 f"分块大小 {chunk_size}，耗时 {(time.time() - start_time) * 1000:.1f}ms")
+    return written
+
   
 
 async def fallback_crawl_procurement_links(
@@ -356,17 +450,12 @@ async def fallback_crawl_procurement_links(
     # Current run timestamp
     now = datetime.datetime.utcnow().isoformat(timespec="seconds")
 
-    # Before this run, mark previous "latest" records for this base_url as not latest
-    logging.info(f"🔄 [FALLBACK_CRAWLER] 标记之前的latest记录为非最新状态")
+    # 创建本次抓取批次，只有本次看到的链接会被写入，历史记录不再被整体改写
     try:
-        cursor.execute(
-            "UPDATE procurement_links SET is_latest = 0 WHERE base_url = ?",
-            (base_url,),
-        )
-        updated_count = cursor.rowcount
-        logging.info(f"✅ [FALLBACK_CRAWLER] 已标记 {updated_count} 条旧记录为非最新状态")
+        run_id = start_crawl_run(conn, base_url, now)
+        logging.info(f"🆕 [FALLBACK_CRAWLER] 创建抓取批次: run_id={run_id}")
     except sqlite3.Error as e:
-        logging.error(f"❌ [FALLBACK_CRAWLER] 更新latest状态失败: {e}")
+        logging.error(f"❌ [FALLBACK_CRAWLER] 创建抓取批次失败: {e}")
         raise
 
     # Store unique URLs and their link text（仅记录 html / htm 后缀的页面）
@@ -504,12 +593,14 @@ async def fallback_crawl_procurement_links(
             logging.info(f"   已访问页面数: {len(visited_pages)}")
             logging.info(f"   发现HTML页面总数: {len(all_raw_urls)}")
 
-    except Exception as e:
+    except BaseException as e:
         print(f"Fallback crawling failed: {e}")
+        fail_crawl_run(conn, run_id)
+        conn.close()
         raise
 
     # Write all unique URLs into database
-    new_or_updated = 0
+    pending_links: list[tuple[str, str | None]] = []
     for raw_url in sorted(all_raw_urls):
         link_text = url_to_text.get(raw_url)
 
@@ -543,54 +634,17 @@ async def fallback_crawl_procurement_links(
                     continue
                 else:
                     logging.info(f"✅ [KEYWORD_FILTER_DEBUG] _has_keyword返回True，通过: {raw_url}")
-        try:
-            # 先检查记录是否已存在
-            cursor.execute(
-                "SELECT COUNT(*) FROM procurement_links WHERE base_url = ? AND url = ?",
-                (base_url, raw_url)
-            )
-            exists = cursor.fetchone()[0] > 0
-
-            if exists:
-                # 记录已存在，执行UPDATE
-                cursor.execute(
-                    """
-                    UPDATE procurement_links SET
-                        link_text = COALESCE(?, procurement_links.link_text),
-                        last_seen_at = ?,
-                        is_latest = 1
-                    WHERE base_url = ? AND url = ?
-                    """,
-                    (link_text, now, base_url, raw_url),
-                )
-                print(f"🔄 更新记录: {raw_url[:80]}")
-            else:
-                # 记录不存在，执行INSERT
-                cursor.execute(
-                    """
-                    INSERT INTO procurement_links (
-                        base_url,
-                        url,
-                        link_text,
-                        first_seen_at,
-                        last_seen_at,
-                        is_latest
-                    )
-                    VALUES (?, ?, ?, ?, ?, 1)
-                    """,
-                    (base_url, raw_url, link_text, now, now),
-                )
-                print(f"➕ 新增记录: {raw_url[:80]}")
-
-            # 无论是INSERT还是UPDATE都算作更新
-            new_or_updated += 1
-
-        except sqlite3.Error as e:
-            print(f"DB write failed for {raw_url}: {e}")
-            import traceback
-            traceback.print_exc()
+        pending_links.append((raw_url, link_text))
 
-    conn.commit()
+    try:
+        new_or_updated = upsert_procurement_links(conn, base_url, pending_links, now, run_id)
+        finish_crawl_run(conn, run_id, new_or_updated)
+        conn.commit()
+    except BaseException as e:
+        logging.error(f"❌ [FALLBACK_CRAWLER] 数据库写入失败: {e}")
+        fail_crawl_run(conn, run_id)
+        conn.close()
+        raise
 
     # 验证写入结果
     cursor.execute("SELECT COUNT(*) FROM procurement_links")
@@ -608,6 +662,7 @@ async def fallback_crawl_procurement_links(
         "base_url": base_url,
         "total_urls": len(all_raw_urls),
         "new_or_updated": new_or_updated,
+        "run_id": run_id,
         "db_path": db_path,
     }
 
@@ -644,22 +699,16 @@ async def _crawl_procurement_links_impl(
     logging.info(f"🗄️ [CRAWLER] 数据库路径: {db_path}")
 
     conn = init_db(db_path)
-    cursor = conn.cursor()
 
     # Current run timestamp (ISO string)
     now = datetime.datetime.utcnow().isoformat(timespec="seconds")
 
-    # Before this run, mark previous "latest" records for this base_url as not latest
-    logging.info(f"🔄 [CRAWLER] 标记之前的latest记录为非最新状态")
+    # 创建本次抓取批次，只有本次看到的链接会被写入，历史记录不再被整体改写
     try:
-        cursor.execute(
-            "UPDATE procurement_links SET is_latest = 0 WHERE base_url = ?",
-            (base_url,),
-        )
-        updated_count = cursor.rowcount
-        logging.info(f"✅ [CRAWLER] 已标记 {updated_count} 条旧记录为非最新状态")
+        run_id = start_crawl_run(conn, base_url, now)
+        logging.info(f"🆕 [CRAWLER] 创建抓取批次: run_id={run_id}")
     except sqlite3.Error as e:
-        logging.error(f"❌ [CRAWLER] 更新latest状态失败: {e}")
+        logging.error(f"❌ [CRAWLER] 创建抓取批次失败: {e}")
         raise
 
     # Store unique URLs and their link text（仅记录 html / htm 后缀的页面）
@@ -710,79 +759,86 @@ async def _crawl_procurement_links_impl(
         stream=True,
     )
 
-    async with AsyncWebCrawler(config=browser_config) as crawler:
-        last_request_time = 0.0
-
-        print(f"Start crawling procurement page: {base_url}")
-
-        async for result in await crawler.arun(
-            url=base_url,
-            config=run_config,
-        ):
-            # Throttle requests
-            current_time = time.time()
-            if current_time - last_request_time < 1.0:
-                await asyncio.sleep(1.0 - (current_time - last_request_time))
-            last_request_time = current_time
-            print(result.url)
-            if result.success:
-                # 1. Page URL itself（仅记录 html / htm 页面）
-                if _is_html_page(result.url) and result.url not in all_raw_urls:
-                    all_raw_urls.add(result.url)
-                    print(f"New HTML URL: {result.url}")
-
-                # 2. Links from result.links（仅记录 html / htm 页面）
-                if hasattr(result, "links") and result.links:
-                    for link in result.links:
-                        if isinstance(link, str):
-                            link_url = link
-                            link_text = None
-                        else:
-                            # Support Link(url=..., text=...)
-                            link_url = getattr(link, "url", None)
-                            link_text = getattr(link, "text", None)
-
-                        if not link_url or domain not in link_url:
-                            continue
-
+    try:
+        async with AsyncWebCrawler(config=browser_config) as crawler:
+            last_request_time = 0.0
+
+            print(f"Start crawling procurement page: {base_url}")
+
+            async for result in await crawler.arun(
+                url=base_url,
+                config=run_config,
+            ):
+                # Throttle requests
+                current_time = time.time()
+                if current_time - last_request_time < 1.0:
+                    await asyncio.sleep(1.0 - (current_time - last_request_time))
+                last_request_time = current_time
+                print(result.url)
+                if result.success:
+                    # 1. Page URL itself（仅记录 html / htm 页面）
+                    if _is_html_page(result.url) and result.url not in all_raw_urls:
+                        all_raw_urls.add(result.url)
+                        print(f"New HTML URL: {result.url}")
+
+                    # 2. Links from result.links（仅记录 html / htm 页面）
+                    if hasattr(result, "links") and result.links:
+                        for link in result.links:
+                            if isinstance(link, str):
+                                link_url = link
+                                link_text = None
+                            else:
+                                # Support Link(url=..., text=...)
+                                link_url = getattr(link, "url", None)
+                                link_text = getattr(link, "text", None)
+
+                            if not link_url or domain not in link_url:
+                                continue
+
+                            # 只记录 html / htm 页面
+                            if not _is_html_page(link_url):
+                                continue
+
+                            if link_url not in all_raw_urls:
+                                all_raw_urls.add(link_url)
+                                print(f"New HTML URL: {link_url}")
+
+                            if link_text:
+                                clean_link_text = clean_text_encoding(link_text.strip())
+                                if clean_link_text:
+                                    url_to_text.setdefault(link_url, clean_link_text)
+
+                    # 3. Extract [text](url) from markdown（仅记录 html / htm 页面）
+                    markdown = result.markdown or ""
+                    pair_pattern = re.compile(
+                        r"\[([^\]]+)\]\((https?://" + re.escape(domain) + r"[^\)]*)\)"
+                    )
+                    for link_text, link_url in pair_pattern.findall(markdown):
                         # 只记录 html / htm 页面
                         if not _is_html_page(link_url):
                             continue
 
                         if link_url not in all_raw_urls:
                             all_raw_urls.add(link_url)
-                            print(f"New HTML URL: {link_url}")
-
-                        if link_text:
-                            clean_link_text = clean_text_encoding(link_text.strip())
-                            if clean_link_text:
-                                url_to_text.setdefault(link_url, clean_link_text)
-
-                # 3. Extract [text](url) from markdown（仅记录 html / htm 页面）
-                markdown = result.markdown or ""
-                pair_pattern = re.compile(
-                    r"\[([^\]]+)\]\((https?://" + re.escape(domain) + r"[^\)]*)\)"
-                )
-                for link_text, link_url in pair_pattern.findall(markdown):
-                    # 只记录 html / htm 页面
-                    if not _is_html_page(link_url):
-                        continue
-
-                    if link_url not in all_raw_urls:
-                        all_raw_urls.add(link_url)
-                        print(f"New HTML URL (markdown): {link_url}")
-
-                    clean_link_text = clean_text_encoding(link_text.strip())
-                    if clean_link_text:
-                        url_to_text.setdefault(link_url, clean_link_text)
+                            print(f"New HTML URL (markdown): {link_url}")
 
-            else:
-                print(
-                    f"Crawl failed: {getattr(result, 'url', '')} -> {result.error_message}"
-                )
+                        clean_link_text = clean_text_encoding(link_text.strip())
+                        if clean_link_text:
+                            url_to_text.setdefault(link_url, clean_link_text)
+
+                else:
+                    print(
+                        f"Crawl failed: {getattr(result, 'url', '')} -> {result.error_message}"
+                    )
+    except BaseException as e:
+        # 抓取失败（包括任务取消）时批次不能停留在running状态
+        logging.error(f"❌ [CRAWLER] 抓取失败: {e}")
+        fail_crawl_run(conn, run_id)
+        conn.close()
+        raise
 
     # Write all unique URLs into database
-    new_or_updated = 0
+    pending_links: list[tuple[str, str | None]] = []
     filtered_out = 0
 
     print(f"🔍 [DEBUG] 开始处理 {len(all_raw_urls)} 个发现的URL...")
@@ -852,64 +908,16 @@ async def _crawl_procurement_links_impl(
         if keyword_filter_pass:
             logging.info(f"💾 [CRAWLER] 关键词匹配通过，准备保存到数据库: {raw_url}")
 
-            try:
-                # 先检查记录是否已存在
-                logging.debug(f"🔍 [DATABASE] 检查记录是否存在: {raw_url}")
-                cursor.execute(
-                    "SELECT COUNT(*) FROM procurement_links WHERE base_url = ? AND url = ?",
-                    (base_url, raw_url)
-                )
-                exists = cursor.fetchone()[0] > 0
-                logging.debug(f"📋 [DATABASE] 记录存在性检查结果: {exists}")
-
-                if exists:
-                    # 记录已存在，执行UPDATE
-                    logging.debug(f"🔄 [DATABASE] 更新现有记录: {raw_url}")
-                    cursor.execute(
-                        """
-                        UPDATE procurement_links SET
-                            link_text = COALESCE(?, procurement_links.link_text),
-                            last_seen_at = ?,
-                            is_latest = 1
-                        WHERE base_url = ? AND url = ?
-                        """,
-                        (link_text, now, base_url, raw_url),
-                    )
-                    logging.info(f"✅ [DATABASE] 成功更新记录: {raw_url[:80]}")
-                else:
-                    # 记录不存在，执行INSERT
-                    logging.debug(f"➕ [DATABASE] 插入新记录: {raw_url}")
-                    cursor.execute(
-                        """
-                        INSERT INTO procurement_links (
-                            base_url,
-                            url,
-                            link_text,
-                            first_seen_at,
-                            last_seen_at,
-                            is_latest
-                        )
-                        VALUES (?, ?, ?, ?, ?, 1)
-                        """,
-                        (base_url, raw_url, link_text, now, now),
-                    )
-                    logging.info(f"✅ [DATABASE] 成功新增记录: {raw_url[:80]}")
-
-                # 无论是INSERT还是UPDATE都算作更新
-                new_or_updated += 1
-
-            except sqlite3.Error as e:
-                logging.error(f"❌ [DATABASE] 数据库写入失败 - URL: {raw_url}")
-                logging.error(f"   错误详情: {e}")
-                logging.debug(f"   链接文本: {link_text}")
-                import traceback
-                logging.debug(f"   堆栈跟踪: {traceback.format_exc()}")
+            pending_links.append((raw_url, link_text))
 
     try:
+        new_or_updated = upsert_procurement_links(conn, base_url, pending_links, now, run_id)
+        finish_crawl_run(conn, run_id, new_or_updated)
         conn.commit()
         logging.info(f"💾 [DATABASE] 数据库事务提交成功")
-    except sqlite3.Error as e:
+    except BaseException as e:
         logging.error(f"❌ [DATABASE] 数据库事务提交失败: {e}")
+        fail_crawl_run(conn, run_id)
         raise
     finally:
         try:
@@ -951,6 +959,7 @@ async def _crawl_procurement_links_impl(
         "new_or_updated": new_or_updated,
         "filtered_out": filtered_out,
         "execution_time": execution_time,
+        "run_id": run_id,
         "db_path": db_path,
     }
 
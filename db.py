@@ -6,19 +6,474 @@
 
 import sqlite3
 import asyncio
+import base64
+import hashlib
 import logging
 import uuid
 import time
+import threading
 from datetime import datetime
 from typing import Optional, Dict, Any
 import json
 import os
+import re
+from db_pool import SQLiteConnectionPool
+from db_executor import DatabaseExecutor, db_read, db_write
+from hierarchy_cache import HierarchyCache
 
 logger = logging.getLogger(__name__)
 
 # 数据库配置
 DB_PATH = "data/hospital_scanner_new.db"
 
+# 站点当前批次：最近一次完成的抓取批次（参数为base_url）
+CURRENT_CRAWL_RUN_SQL = "SELECT MAX(id) FROM crawl_runs WHERE base_url = ? AND status = 'completed'"
+
+# 采购链接历史数据回填版本（记录在 PRAGMA user_version 中），回填完成后启动时不再全表扫描
+PROCUREMENT_BACKFILL_VERSION = 1
+
+
+def encode_page_cursor(sort_value: Any, row_id: int) -> str:
+    """把分页键 (排序值, id) 编码为不透明的游标字符串"""
+    payload = json.dumps([sort_value, row_id], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_page_cursor(cursor: str) -> tuple:
+    """解析游标字符串，格式错误时抛出ValueError"""
+    try:
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+    except Exception:
+        raise ValueError(f"无效的分页游标: {cursor}")
+    if not isinstance(row_id, int):
+        raise ValueError(f"无效的分页游标: {cursor}")
+    return sort_value, row_id
+
+
+def ensure_procurement_schema(cursor: sqlite3.Cursor) -> None:
+    """创建/迁移采购链接相关的表和索引（爬虫和主应用启动时都会调用，可重复执行）"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS procurement_links (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            base_url TEXT NOT NULL,
+            url TEXT NOT NULL,
+            link_text TEXT,
+            first_seen_at TEXT,
+            last_seen_at TEXT,
+            is_latest INTEGER DEFAULT 0,
+            last_run_id INTEGER,
+            first_seen_epoch INTEGER,
+            UNIQUE(base_url, url)
+        )
+    """)
+
+    # 抓取批次表：每次抓取生成一个run_id，"最新"即 last_run_id 等于该站点最近一次完成的run_id
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS crawl_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            base_url TEXT NOT NULL,
+            status TEXT NOT NULL,
+            started_at TEXT NOT NULL,
+            finished_at TEXT,
+            links_seen INTEGER DEFAULT 0
+        )
+    """)
+
+    cursor.execute("PRAGMA table_info(procurement_links)")
+    columns = [row[1] for row in cursor.fetchall()]
+    if "last_run_id" not in columns:
+        cursor.execute("ALTER TABLE procurement_links ADD COLUMN last_run_id INTEGER")
+        logger.info("procurement_links表添加last_run_id列")
+    if "first_seen_epoch" not in columns:
+        # 可排序的首次发现时间（UTC秒），用于时间范围查询走索引
+        cursor.execute("ALTER TABLE procurement_links ADD COLUMN first_seen_epoch INTEGER")
+        logger.info("procurement_links表添加first_seen_epoch列")
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_crawl_runs_base_url_status ON crawl_runs(base_url, status, id)")
+    # (base_url, last_run_id, first_seen_at)：按站点取当前批次并按首次发现时间有序分页
+    cursor.execute("DROP INDEX IF EXISTS idx_procurement_links_base_url_run")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_procurement_links_run_first_seen ON procurement_links(base_url, last_run_id, first_seen_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_procurement_links_base_url_first_seen ON procurement_links(base_url, first_seen_epoch)")
+
+    cursor.execute("PRAGMA user_version")
+    if cursor.fetchone()[0] < PROCUREMENT_BACKFILL_VERSION:
+        _backfill_first_seen_epoch(cursor)
+        _backfill_crawl_runs(cursor)
+        cursor.execute(f"PRAGMA user_version = {PROCUREMENT_BACKFILL_VERSION}")
+    _ensure_procurement_fts(cursor)
+
+
+def _backfill_first_seen_epoch(cursor: sqlite3.Cursor, batch_size: int = 10000) -> None:
+    """按批回填历史记录的first_seen_epoch，每批单独提交，避免长时间占用写锁
+
+    只在 user_version 低于 PROCUREMENT_BACKFILL_VERSION 时执行一次；中途中断时下次启动继续回填。
+    """
+    total = 0
+    while True:
+        cursor.execute("""
+            UPDATE procurement_links
+            SET first_seen_epoch = CAST(strftime('%s', first_seen_at) AS INTEGER)
+            WHERE id IN (
+                SELECT id FROM procurement_links
+                WHERE first_seen_epoch IS NULL AND strftime('%s', first_seen_at) IS NOT NULL
+                LIMIT ?
+            )
+        """, (batch_size,))
+        if cursor.rowcount <= 0:
+            break
+        total += cursor.rowcount
+        cursor.connection.commit()
+    if total:
+        logger.info(f"回填first_seen_epoch完成: {total} 条")
+
+
+# 采购链接文本全文检索：中文按相邻二字切分（bigram）后写入 unicode61 分词的 FTS5 表，
+# 使"中标""器械"这类两字词也能命中；由爬虫写入路径（sync_procurement_link_fts）增量维护
+_CJK_PATTERN = re.compile(r"([\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+)")
+
+
+def cjk_bigram_text(text: Optional[str]) -> str:
+    """把文本中的连续汉字展开为重叠的二字词，非汉字部分原样保留（交给unicode61分词）"""
+    if not text:
+        return ""
+    tokens = []
+    for part in _CJK_PATTERN.split(text):
+        if not part:
+            continue
+        if _CJK_PATTERN.fullmatch(part):
+            if len(part) == 1:
+                tokens.append(part)
+            else:
+                tokens.extend(part[i:i + 2] for i in range(len(part) - 1))
+        else:
+            tokens.append(part)
+    return " ".join(tokens)
+
+
+def build_bigram_match(query: str) -> tuple:
+    """把检索词转换为 (FTS5 MATCH 表达式或None, 需要LIKE匹配的单个汉字列表)
+
+    每个空格分隔的词转换为其二字词组成的短语（相邻出现即为原词），多个词之间为AND关系。
+    单个汉字无法用二字词索引表示，退化为LIKE匹配。
+    """
+    phrases, single_chars = [], []
+    for term in query.split():
+        if len(term) == 1 and _CJK_PATTERN.fullmatch(term):
+            single_chars.append(term)
+            continue
+        grams = cjk_bigram_text(term)
+        if grams.strip():
+            phrases.append('"' + grams.replace('"', '""') + '"')
+    return (" AND ".join(phrases) or None), single_chars
+
+
+def _ensure_procurement_fts(cursor: sqlite3.Cursor, batch_size: int = 5000) -> None:
+    """创建采购链接文本全文索引，首次创建时从现有记录回填"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'procurement_links_fts'")
+    if cursor.fetchone() is not None:
+        return
+    cursor.execute("CREATE VIRTUAL TABLE procurement_links_fts USING fts5(link_text_grams, tokenize = 'unicode61')")
+    last_id, total = 0, 0
+    while True:
+        cursor.execute("""
+            SELECT id, link_text FROM procurement_links
+            WHERE id > ? AND link_text IS NOT NULL AND link_text != ''
+            ORDER BY id LIMIT ?
+        """, (last_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        cursor.executemany(
+            "INSERT INTO procurement_links_fts(rowid, link_text_grams) VALUES (?, ?)",
+            [(row_id, cjk_bigram_text(link_text)) for row_id, link_text in rows]
+        )
+        last_id = rows[-1][0]
+        total += len(rows)
+    logger.info(f"采购链接全文索引创建完成，回填 {total} 条")
+
+
+def sync_procurement_link_fts(conn: sqlite3.Connection, base_url: str, urls: list) -> int:
+    """刷新指定链接的全文索引（在链接写入后、同一事务内调用），返回索引的记录数
+
+    删除旧索引和写入新索引在同一个SAVEPOINT内完成，任一步失败都回滚到调用前的索引状态，
+    调用方吞掉异常继续提交事务时也不会丢失索引行。
+    （二字词切分在Python中完成，无法像医院全文索引那样用触发器维护）
+    """
+    if not urls:
+        return 0
+    placeholders = ','.join(['?' for _ in urls])
+    rows = conn.execute(f"""
+        SELECT id, link_text FROM procurement_links
+        WHERE base_url = ? AND url IN ({placeholders})
+    """, [base_url] + list(urls)).fetchall()
+    indexed = [(row_id, cjk_bigram_text(link_text)) for row_id, link_text in rows if link_text]
+    conn.execute("SAVEPOINT procurement_links_fts_sync")
+    try:
+        conn.executemany("DELETE FROM procurement_links_fts WHERE rowid = ?", [(row_id,) for row_id, _ in rows])
+        conn.executemany("INSERT INTO procurement_links_fts(rowid, link_text_grams) VALUES (?, ?)", indexed)
+    except Exception:
+        conn.execute("ROLLBACK TO procurement_links_fts_sync")
+        conn.execute("RELEASE procurement_links_fts_sync")
+        raise
+    conn.execute("RELEASE procurement_links_fts_sync")
+    return len(indexed)
+
+
+def _backfill_crawl_runs(cursor: sqlite3.Cursor) -> None:
+    """
+    为尚无抓取批次的站点补建一个已完成的批次，
+    并把旧的 is_latest=1 记录挂到该批次上，保证升级后"最新"结果不变。
+    """
+    cursor.execute("""
+        SELECT base_url, MAX(last_seen_at), COUNT(*)
+        FROM procurement_links
+        WHERE is_latest = 1 AND last_run_id IS NULL
+          AND base_url NOT IN (SELECT base_url FROM crawl_runs)
+        GROUP BY base_url
+    """)
+    for base_url, last_seen_at, links_seen in cursor.fetchall():
+        seen_at = last_seen_at or datetime.utcnow().isoformat(timespec="seconds")
+        cursor.execute("""
+            INSERT INTO crawl_runs (base_url, status, started_at, finished_at, links_seen)
+            VALUES (?, 'completed', ?, ?, ?)
+        """, (base_url, seen_at, seen_at, links_seen))
+        cursor.execute(
+            "UPDATE procurement_links SET last_run_id = ? WHERE base_url = ? AND is_latest = 1",
+            (cursor.lastrowid, base_url)
+        )
+        logger.info(f"为 {base_url} 补建抓取批次，迁移最新记录 {links_seen} 条")
+
+
+# 医院全文检索：FTS5 trigram 分词（对中文按连续3字切分，支持任意位置子串/前缀匹配），
+# 外部内容表指向 hospitals，由触发器保持同步
+HOSPITAL_FTS_TRIGGERS = {
+    "hospitals_fts_ai": """
+        CREATE TRIGGER IF NOT EXISTS hospitals_fts_ai AFTER INSERT ON hospitals BEGIN
+            INSERT INTO hospitals_fts(rowid, name, address, aliases)
+            VALUES (new.id, new.name, new.address, new.aliases);
+        END
+    """,
+    "hospitals_fts_ad": """
+        CREATE TRIGGER IF NOT EXISTS hospitals_fts_ad AFTER DELETE ON hospitals BEGIN
+            INSERT INTO hospitals_fts(hospitals_fts, rowid, name, address, aliases)
+            VALUES ('delete', old.id, old.name, old.address, old.aliases);
+        END
+    """,
+    "hospitals_fts_au": """
+        CREATE TRIGGER IF NOT EXISTS hospitals_fts_au AFTER UPDATE OF name, address, aliases ON hospitals BEGIN
+            INSERT INTO hospitals_fts(hospitals_fts, rowid, name, address, aliases)
+            VALUES ('delete', old.id, old.name, old.address, old.aliases);
+            INSERT INTO hospitals_fts(rowid, name, address, aliases)
+            VALUES (new.id, new.name, new.address, new.aliases);
+        END
+    """,
+}
+
+# trigram 分词要求每个检索词至少3个字符，更短的词退化为 LIKE 子串匹配
+FTS_MIN_TERM_LENGTH = 3
+
+
+def ensure_hospital_fts(cursor: sqlite3.Cursor) -> None:
+    """创建医院全文索引表和同步触发器，首次创建时从hospitals全量重建索引"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'hospitals_fts'")
+    exists = cursor.fetchone() is not None
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS hospitals_fts USING fts5(
+            name, address, aliases,
+            content = 'hospitals',
+            content_rowid = 'id',
+            tokenize = 'trigram'
+        )
+    """)
+    for trigger_sql in HOSPITAL_FTS_TRIGGERS.values():
+        cursor.execute(trigger_sql)
+    if not exists:
+        cursor.execute("INSERT INTO hospitals_fts(hospitals_fts) VALUES ('rebuild')")
+        logger.info("医院全文索引创建完成")
+
+
+# upsert_hospitals 写入/比较的医院字段（name、district_id 为唯一键）
+HOSPITAL_UPSERT_FIELDS = ("level", "address", "phone", "beds_count", "staff_count",
+                          "departments", "specializations", "website")
+HOSPITAL_LIST_FIELDS = ("departments", "specializations")
+
+# 其他路径修改上述字段时清空content_hash，下次upsert按字段值重新比较
+HOSPITAL_CONTENT_HASH_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS hospitals_content_hash_au
+    AFTER UPDATE OF level, address, phone, beds_count, staff_count, departments, specializations, website
+    ON hospitals
+    WHEN new.content_hash IS old.content_hash
+    BEGIN
+        UPDATE hospitals SET content_hash = NULL WHERE id = new.id;
+    END
+"""
+
+
+def _normalize_count(value: Any) -> Optional[int]:
+    """床位数/职工数规范化为整数：LLM可能返回 "1,200"、"约500张" 之类的文本，无法识别时为None"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value).replace(",", "").replace("，", "").strip()
+    try:
+        return int(float(text))
+    except ValueError:
+        match = re.search(r"\d+", text)
+        return int(match.group()) if match else None
+
+
+def normalize_hospital_payload(row: Dict[str, Any]) -> Dict[str, Any]:
+    """规范化医院字段：文本去首尾空白（None视为空串），列表字段序列化为JSON文本，床位数/职工数转为整数"""
+    values = {}
+    for field in HOSPITAL_UPSERT_FIELDS:
+        value = row.get(field)
+        if field in HOSPITAL_LIST_FIELDS:
+            if not isinstance(value, str):
+                value = json.dumps(value or [], ensure_ascii=False)
+        elif field in ("beds_count", "staff_count"):
+            value = _normalize_count(value)
+        else:
+            value = str(value).strip() if value is not None else ''
+        values[field] = value
+    return values
+
+
+def hospital_content_hash(values: Dict[str, Any]) -> str:
+    """计算规范化后医院字段的内容哈希"""
+    payload = json.dumps([values[field] for field in HOSPITAL_UPSERT_FIELDS], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def ensure_hospital_unique_key(cursor: sqlite3.Cursor) -> None:
+    """
+    为 hospitals(district_id, name) 建立唯一索引（批量upsert的冲突键）。
+    建索引前合并重复记录：优先保留未删除、已配置采购链接/关键词的记录，其次保留ID最小的记录；
+    保留记录中为空的字段用被合并记录的非空值补齐后，再删除被合并的记录。
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_hospitals_district_name_unique'")
+    if cursor.fetchone() is not None:
+        return
+    cursor.execute("""
+        SELECT district_id, name FROM hospitals
+        WHERE district_id IS NOT NULL
+        GROUP BY district_id, name
+        HAVING COUNT(*) > 1
+    """)
+    groups = cursor.fetchall()
+    if groups:
+        cursor.execute("PRAGMA table_info(hospitals)")
+        columns = [row[1] for row in cursor.fetchall()]
+        # 唯一键、主键和删除标记不参与补齐；补齐后内容哈希失效，由下次upsert重新计算
+        merge_columns = [column for column in columns
+                         if column not in ("id", "name", "district_id", "deleted_at", "content_hash")]
+        merged = 0
+        for district_id, name in groups:
+            cursor.execute(f"""
+                SELECT id, {', '.join(merge_columns)} FROM hospitals
+                WHERE district_id = ? AND name = ?
+                ORDER BY deleted_at IS NOT NULL,
+                         base_procurement_link IS NULL,
+                         procurement_keywords IS NULL,
+                         id
+            """, (district_id, name))
+            keeper, *duplicates = cursor.fetchall()
+            fills = {}
+            for index, column in enumerate(merge_columns, start=1):
+                if keeper[index] not in (None, ''):
+                    continue
+                value = next((row[index] for row in duplicates if row[index] not in (None, '')), None)
+                if value is not None:
+                    fills[column] = value
+            if fills:
+                cursor.execute(f"""
+                    UPDATE hospitals SET {', '.join(f'{column} = ?' for column in fills)}, content_hash = NULL
+                    WHERE id = ?
+                """, list(fills.values()) + [keeper[0]])
+            cursor.executemany("DELETE FROM hospitals WHERE id = ?", [(row[0],) for row in duplicates])
+            merged += len(duplicates)
+        logger.info(f"合并重复医院记录 {merged} 条（相同区县下同名，{len(groups)} 组）")
+    cursor.execute("CREATE UNIQUE INDEX idx_hospitals_district_name_unique ON hospitals(district_id, name)")
+
+
+def ensure_job_schema(cursor: sqlite3.Cursor) -> None:
+    """
+    持久化后台作业队列表（job_queue.JobQueue使用）。
+    status: queued / running / succeeded / failed；运行中的作业由 lease_owner 持有租约，
+    租约过期（进程崩溃或重启）后可被其他工作协程重新领取，attempts 记录已领取次数。
+    lease_token 每次领取重新生成，续租/结束/归还都按令牌校验，同一进程重新领取后旧的执行不再持有租约。
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            job_type TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            run_after REAL NOT NULL,
+            lease_owner TEXT,
+            lease_token TEXT,
+            lease_expires_at REAL,
+            heartbeat_at REAL,
+            last_error TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            finished_at TEXT
+        )
+    """)
+    try:
+        cursor.execute("ALTER TABLE jobs ADD COLUMN lease_token TEXT")
+        logger.info("Added lease_token column to jobs table")
+    except sqlite3.OperationalError as e:
+        logger.debug(f"lease_token column may already exist: {e}")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after ON jobs(status, run_after)")
+
+
+def ensure_refresh_checkpoint_schema(cursor: sqlite3.Cursor) -> None:
+    """
+    级联刷新断点表：按父任务ID记录省份/城市/区县单元的进度，断点续跑时跳过已完成的单元。
+    unit_type: provinces（省份列表，detail为JSON）/ province（省份名）/ city（城市ID）/ district（区县ID）
+    status: listed（下级列表已入库，续跑时从数据库读取而不再调用LLM）/ completed（单元及其下级全部完成）
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS refresh_checkpoints (
+            task_id TEXT NOT NULL,
+            unit_type TEXT NOT NULL,
+            unit_key TEXT NOT NULL,
+            status TEXT NOT NULL,
+            detail TEXT,
+            updated_at TEXT NOT NULL,
+            completed_at TEXT,
+            PRIMARY KEY (task_id, unit_type, unit_key)
+        )
+    """)
+
+
+def _job_from_row(cursor: sqlite3.Cursor, row: tuple) -> Dict[str, Any]:
+    columns = [description[0] for description in cursor.description]
+    job = dict(zip(columns, row))
+    try:
+        job["payload"] = json.loads(job["payload"]) if job.get("payload") else {}
+    except json.JSONDecodeError:
+        job["payload"] = {}
+    return job
+
+
+def build_fts_query(query: str) -> tuple:
+    """把用户输入拆分为 (FTS5 MATCH 表达式或None, 需要LIKE匹配的短词列表)
+
+    长度>=3的词作为短语加入MATCH（AND关系），双引号转义，避免用户输入被解释为FTS语法。
+    """
+    long_terms, short_terms = [], []
+    for term in query.split():
+        if len(term) >= FTS_MIN_TERM_LENGTH:
+            long_terms.append('"' + term.replace('"', '""') + '"')
+        else:
+            short_terms.append(term)
+    return (" AND ".join(long_terms) or None), short_terms
+
+
 class Database:
     """数据库管理类"""
     
@@ -26,14 +481,22 @@ class Database:
         self.db_path = db_path
         # 确保数据库目录存在
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # 长连接池：一个写连接 + 多个读连接，PRAGMA只在建立连接时设置一次
+        self.pool = SQLiteConnectionPool(db_path)
+        # 阻塞的sqlite3调用在执行器中运行：单写线程 + 读线程池，不占用事件循环
+        self.executor = DatabaseExecutor()
+        # 行政区划缓存：省/市/区县的名称、ID索引（创建时写穿，清空数据时失效）
+        self.hierarchy = HierarchyCache()
+        # 列表总数缓存：{(sql, params): (写代次, 总数)}
+        self._count_cache: Dict[tuple, tuple] = {}
+        self._count_cache_lock = threading.Lock()
         # 同步初始化数据库表
         self._init_tables_sync()
         
     def _init_tables_sync(self):
         """同步初始化数据库表"""
         try:
-            import sqlite3
-            with sqlite3.connect(self.db_path) as conn:
+            with self.pool.writer() as conn:
                 cursor = conn.cursor()
                 
                 # 创建任务表
@@ -58,6 +521,13 @@ class Database:
                 except Exception as e:
                     # 字段可能已存在，忽略错误
                     logger.debug(f"task_type column may already exist: {e}")
+
+                # 添加progress字段（结构化进度快照JSON，由TaskManager定时落库）
+                try:
+                    cursor.execute("ALTER TABLE tasks ADD COLUMN progress TEXT")
+                    logger.info("Added progress column to tasks table")
+                except Exception as e:
+                    logger.debug(f"progress column may already exist: {e}")
                 
                 # 创建医院信息表
                 cursor.execute("""
@@ -81,10 +551,11 @@ class Database:
         except Exception as e:
             print(f"初始化数据库表失败: {e}")
             
-    async def init_db(self):
+    @db_write
+    def init_db(self):
         """初始化数据库"""
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.writer() as conn:
                 cursor = conn.cursor()
                 
                 # 创建任务表
@@ -109,6 +580,13 @@ class Database:
                 except Exception as e:
                     # 字段可能已存在，忽略错误
                     logger.debug(f"task_type column may already exist: {e}")
+
+                # 添加progress字段（结构化进度快照JSON，由TaskManager定时落库）
+                try:
+                    cursor.execute("ALTER TABLE tasks ADD COLUMN progress TEXT")
+                    logger.info("Added progress column to tasks table")
+                except Exception as e:
+                    logger.debug(f"progress column may already exist: {e}")
                 
                 # 创建医院信息表
                 cursor.execute("""
@@ -227,6 +705,62 @@ class Database:
                     # 字段可能已存在，忽略错误
                     logger.debug(f"deleted_at column may already exist: {e}")
 
+                # 为现有数据库添加website字段（create_hospital/upsert_hospitals会写入）
+                try:
+                    cursor.execute("ALTER TABLE hospitals ADD COLUMN website TEXT")
+                    logger.info("Added website column to hospitals table")
+                except Exception as e:
+                    # 字段可能已存在，忽略错误
+                    logger.debug(f"website column may already exist: {e}")
+
+                # 为现有数据库添加content_hash字段（upsert_hospitals据此跳过无变化的写入）
+                try:
+                    cursor.execute("ALTER TABLE hospitals ADD COLUMN content_hash TEXT")
+                    logger.info("Added content_hash column to hospitals table")
+                except Exception as e:
+                    # 字段可能已存在，忽略错误
+                    logger.debug(f"content_hash column may already exist: {e}")
+                cursor.execute(HOSPITAL_CONTENT_HASH_TRIGGER)
+
+                # 为现有数据库添加aliases字段（医院别名，参与全文检索）
+                try:
+                    cursor.execute("ALTER TABLE hospitals ADD COLUMN aliases TEXT")
+                    logger.info("Added aliases column to hospitals table")
+                except Exception as e:
+                    # 字段可能已存在，忽略错误
+                    logger.debug(f"aliases column may already exist: {e}")
+
+                # 为省份/城市/区县添加last_refreshed_at字段（最近一次通过LLM刷新下级数据的时间，增量刷新据此跳过新鲜的单元）
+                for table_name in ("provinces", "cities", "districts"):
+                    try:
+                        cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN last_refreshed_at TEXT")
+                        logger.info(f"Added last_refreshed_at column to {table_name} table")
+                    except Exception as e:
+                        # 字段可能已存在，忽略错误
+                        logger.debug(f"last_refreshed_at column may already exist in {table_name}: {e}")
+
+                # 医院全文索引（FTS5 trigram）
+                ensure_hospital_fts(cursor)
+
+                # 列表键集分页索引：(父级id, name) 加上隐含的rowid，即 (父级id, name, id)
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_cities_province_name ON cities(province_id, name)")
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_districts_city_name ON districts(city_id, name)")
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_hospitals_active_name ON hospitals(name) WHERE deleted_at IS NULL")
+
+                # 医院唯一键 (district_id, name)：合并重复记录后建立唯一索引（同时用于区县内医院列表分页，
+                # 原部分索引 idx_hospitals_district_name 与之重复，删除）
+                ensure_hospital_unique_key(cursor)
+                cursor.execute("DROP INDEX IF EXISTS idx_hospitals_district_name")
+
+                # 采购链接及抓取批次表（建表、迁移与回填）
+                ensure_procurement_schema(cursor)
+
+                # 持久化后台作业队列
+                ensure_job_schema(cursor)
+
+                # 级联刷新断点
+                ensure_refresh_checkpoint_schema(cursor)
+
                 conn.commit()
                 logger.info("数据库初始化完成")
                 
@@ -234,10 +768,11 @@ class Database:
             logger.error(f"数据库初始化失败: {e}")
             raise
     
-    async def create_task(self, task_id: str, hospital_name: str, query: str, status: str, task_type: str = "hospital") -> bool:
+    @db_write(tables=("tasks",))
+    def create_task(self, task_id: str, hospital_name: str, query: str, status: str, task_type: str = "hospital") -> bool:
         """创建任务"""
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.writer() as conn:
                 cursor = conn.cursor()
                 now = datetime.now().isoformat()
 
@@ -254,13 +789,18 @@ class Database:
             logger.error(f"创建任务失败: {e}")
             return False
     
-    async def update_task_status(self, task_id: str, status: str, error_message: Optional[str] = None) -> bool:
-        """更新任务状态"""
+    @db_write(tables=("tasks",))
+    def update_task_status(self, task_id: str, status: str, error_message: Optional[str] = None,
+                           progress: Optional[Dict[str, Any]] = None) -> bool:
+        """更新任务状态（progress 为可选的进度快照，随状态一并写入）"""
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.writer() as conn:
                 cursor = conn.cursor()
                 now = datetime.now().isoformat()
-                
+
+                if progress is not None:
+                    cursor.execute("UPDATE tasks SET progress = ? WHERE task_id = ?",
+                                   (json.dumps(progress, ensure_ascii=False), task_id))
                 if error_message:
                     cursor.execute("""
                         UPDATE tasks 
@@ -280,11 +820,23 @@ class Database:
         except Exception as e:
             logger.error(f"更新任务状态失败: {e}")
             return False
-    
-    async def save_task_result(self, task_id: str, result: Dict[str, Any]) -> bool:
+
+    @db_write(tables=("tasks",))
+    def update_task_progress(self, task_id: str, message: Optional[str], progress: Dict[str, Any]) -> bool:
+        """写入任务进度快照和进度消息；已结束的任务不再覆盖（防止迟到的进度写回）"""
+        with self.pool.writer() as conn:
+            cursor = conn.execute("""
+                UPDATE tasks SET progress = ?, error_message = COALESCE(?, error_message), updated_at = ?
+                WHERE task_id = ? AND status NOT IN ('completed', 'failed')
+            """, (json.dumps(progress, ensure_ascii=False), message, datetime.now().isoformat(), task_id))
+            conn.commit()
+            return cursor.rowcount > 0
+
+    @db_write(tables=("tasks",))
+    def save_task_result(self, task_id: str, result: Dict[str, Any]) -> bool:
         """保存任务结果"""
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.writer() as conn:
                 cursor = conn.cursor()
                 now = datetime.now().isoformat()
                 
@@ -304,10 +856,11 @@ class Database:
             logger.error(f"保存任务结果失败: {e}")
             return False
     
-    async def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+    @db_read
+    def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
         """获取任务信息"""
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.reader() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,))
@@ -335,10 +888,11 @@ class Database:
             logger.error(f"获取任务结果失败: {e}")
             return None
     
-    async def list_tasks(self, limit: int = 100) -> list:
+    @db_read
+    def list_tasks(self, limit: int = 100) -> list:
         """获取任务列表"""
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.reader() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute("""
@@ -356,10 +910,11 @@ class Database:
             logger.error(f"获取任务列表失败: {e}")
             return []
     
-    async def save_hospital_info(self, task_id: str, hospital_info: Dict[str, Any]) -> bool:
+    @db_write(tables=("hospital_info",))
+    def save_hospital_info(self, task_id: str, hospital_info: Dict[str, Any]) -> bool:
         """保存医院信息"""
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.writer() as conn:
                 cursor = conn.cursor()
                 now = datetime.now().isoformat()
                 
@@ -389,11 +944,104 @@ class Database:
             logger.error(f"保存医院信息失败: {e}")
             return False
 
+    def _cached_count(self, cursor: sqlite3.Cursor, sql: str, params: tuple, tables: tuple) -> int:
+        """列表总数查询，结果按所涉及表的写代次缓存（期间这些表没有写操作时直接复用）"""
+        key = (sql, params)
+        generation = self.executor.generation_for(tables)
+        with self._count_cache_lock:
+            cached = self._count_cache.get(key)
+        if cached and cached[0] == generation:
+            return cached[1]
+        cursor.execute(sql, params)
+        total = cursor.fetchone()[0]
+        with self._count_cache_lock:
+            if len(self._count_cache) >= 1024:
+                self._count_cache.clear()
+            self._count_cache[key] = (generation, total)
+        return total
+
+    def _query_page(self, cursor: sqlite3.Cursor, select_sql: str, from_sql: str, conditions: list,
+                    params: tuple, name_column: str, id_column: str, page: int, page_size: int,
+                    after_name: Optional[str] = None, after_id: Optional[int] = None,
+                    include_total: bool = True, tables: tuple = (), probe_next: bool = False) -> tuple:
+        """列表分页查询的公共实现，按 (name, id) 排序
+
+        - 传入 after_name 时使用键集分页：(name, id) > (after_name, after_id)，耗时与翻页深度无关；
+          只传 after_name 时按 name > after_name 翻页（同名记录需同时传 after_id 才不会跳过）
+        - 否则使用原有的页码分页（LIMIT/OFFSET）
+        - include_total=False 时不计算总数，返回的 total 为 None；tables 为总数缓存依赖的表
+        - probe_next=True 时多取一行（最多 page_size + 1 条），调用方据此判断是否还有下一页
+        """
+        # 处理边界值
+        if page < 1:
+            page = 1
+        if page_size < 1:
+            page_size = 20
+        if page_size > 1000:  # 限制最大页面大小
+            page_size = 1000
+
+        where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        total = None
+        if include_total:
+            total = self._cached_count(cursor, f"SELECT COUNT(*) {from_sql} {where_sql}", params, tables)
+        limit = page_size + 1 if probe_next else page_size
+
+        if after_name is not None:
+            if after_id is not None:
+                keyset_conditions = conditions + [f"({name_column}, {id_column}) > (?, ?)"]
+                keyset_params = (after_name, after_id)
+            else:
+                keyset_conditions = conditions + [f"{name_column} > ?"]
+                keyset_params = (after_name,)
+            cursor.execute(f"""
+                {select_sql} {from_sql}
+                WHERE {' AND '.join(keyset_conditions)}
+                ORDER BY {name_column}, {id_column}
+                LIMIT ?
+            """, params + keyset_params + (limit,))
+        else:
+            # 计算有效页面数
+            if total:
+                total_pages = (total + page_size - 1) // page_size
+                if page > total_pages:
+                    page = total_pages
+            offset = (page - 1) * page_size
+            cursor.execute(f"""
+                {select_sql} {from_sql}
+                {where_sql}
+                ORDER BY {name_column}, {id_column}
+                LIMIT ? OFFSET ?
+            """, params + (limit, offset))
+
+        rows = cursor.fetchall()
+        columns = [description[0] for description in cursor.description]
+        items = [dict(zip(columns, row)) for row in rows]
+        return items, total
+
+    @staticmethod
+    def _fetch_row(cursor: sqlite3.Cursor, table: str, row_id: int) -> Dict[str, Any]:
+        """按ID读取一行并转换为字典（与 SELECT * 的结果结构一致）"""
+        cursor.execute(f"SELECT * FROM {table} WHERE id = ?", (row_id,))
+        row = cursor.fetchone()
+        return dict(zip([column[0] for column in cursor.description], row))
+
     # 省份数据操作
-    async def create_province(self, name: str, code: str = None) -> int:
+    @db_read
+    def warm_hierarchy_cache(self) -> bool:
+        """从数据库加载行政区划缓存（启动时预热，失效后按需重新加载）"""
+        with self.pool.reader() as conn:
+            return self.hierarchy.load(conn)
+
+    async def _ensure_hierarchy_cache(self):
+        """确保行政区划缓存已加载；加载与写操作交错时结果被丢弃，重新加载"""
+        while not self.hierarchy.loaded:
+            await self.warm_hierarchy_cache()
+
+    @db_write(tables=("provinces",))
+    def create_province(self, name: str, code: str = None) -> int:
         """创建省份"""
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.writer() as conn:
                 cursor = conn.cursor()
                 now = datetime.now().isoformat()
                 
@@ -404,6 +1052,7 @@ class Database:
                 
                 province_id = cursor.lastrowid
                 conn.commit()
+                self.hierarchy.add_province(self._fetch_row(cursor, "provinces", province_id))
                 logger.info(f"创建省份成功: {name} (ID: {province_id})")
                 return province_id
                 
@@ -412,106 +1061,42 @@ class Database:
             return 0
 
     async def get_province_by_name(self, province_name: str):
-        """根据省份名称获取省份信息"""
-        try:
-            logger.info(f"🔍 查询省份: {province_name}")
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-
-                cursor.execute(
-                    "SELECT * FROM provinces WHERE name = ? LIMIT 1",
-                    (province_name,)
-                )
-
-                result = cursor.fetchone()
-                logger.info(f"📊 查询省份结果: {'找到' if result else '未找到'} {province_name}")
-
-                if result:
-                    logger.info(f"✅ 省份信息: ID={result['id']}, 名称={result['name']}")
-                    return dict(result)
-                else:
-                    logger.info(f"❌ 省份不存在: {province_name}")
-                    return None
-
-        except Exception as e:
-            logger.error(f"根据名称获取省份信息失败: {e}")
-            return None
+        """根据省份名称获取省份信息（行政区划缓存）"""
+        await self._ensure_hierarchy_cache()
+        result = self.hierarchy.get_province_by_name(province_name)
+        logger.debug(f"🔍 查询省份: {province_name} -> {'ID=' + str(result['id']) if result else '未找到'}")
+        return result
 
     async def get_province_by_id(self, province_id: int):
-        """根据省份ID获取省份信息"""
+        """根据省份ID获取省份信息（行政区划缓存）"""
+        await self._ensure_hierarchy_cache()
+        result = self.hierarchy.get_province_by_id(province_id)
+        logger.debug(f"🔍 查询省份ID: {province_id} -> {result['name'] if result else '未找到'}")
+        return result
+
+    @db_read
+    def get_provinces(self, page: int = 1, page_size: int = 20, after_name: Optional[str] = None,
+                      after_id: Optional[int] = None, include_total: bool = True, probe_next: bool = False) -> tuple:
+        """获取省份列表（分页，传入after_name/after_id时为键集分页）"""
         try:
-            logger.info(f"🔍 查询省份ID: {province_id}")
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
+            with self.pool.reader() as conn:
                 cursor = conn.cursor()
-
-                cursor.execute(
-                    "SELECT * FROM provinces WHERE id = ? LIMIT 1",
-                    (province_id,)
+                return self._query_page(
+                    cursor, "SELECT *", "FROM provinces", [], (), "name", "id",
+                    page, page_size, after_name, after_id, include_total, ("provinces",), probe_next
                 )
 
-                result = cursor.fetchone()
-                logger.info(f"📊 查询省份结果: {'找到' if result else '未找到'} ID={province_id}")
-
-                if result:
-                    logger.info(f"✅ 省份信息: ID={result['id']}, 名称={result['name']}")
-                    return dict(result)
-                else:
-                    logger.info(f"❌ 省份不存在: ID={province_id}")
-                    return None
-
-        except Exception as e:
-            logger.error(f"根据ID获取省份信息失败: {e}")
-            return None
-
-    async def get_provinces(self, page: int = 1, page_size: int = 20) -> tuple:
-        """获取省份列表（分页）"""
-        try:
-            # 处理边界值
-            if page < 1:
-                page = 1
-            if page_size < 1:
-                page_size = 20
-            if page_size > 1000:  # 限制最大页面大小
-                page_size = 1000
-                
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # 获取总数
-                cursor.execute("SELECT COUNT(*) FROM provinces")
-                total = cursor.fetchone()[0]
-                
-                # 计算有效页面数
-                total_pages = (total + page_size - 1) // page_size if total > 0 else 1
-                if page > total_pages and total > 0:
-                    page = total_pages
-                
-                # 获取分页数据
-                offset = (page - 1) * page_size
-                cursor.execute("""
-                    SELECT * FROM provinces 
-                    ORDER BY name 
-                    LIMIT ? OFFSET ?
-                """, (page_size, offset))
-                
-                rows = cursor.fetchall()
-                columns = [description[0] for description in cursor.description]
-                items = [dict(zip(columns, row)) for row in rows]
-                
-                return items, total
-                
         except Exception as e:
             logger.error(f"获取省份列表失败: {e}")
             return [], 0
 
     # 城市数据操作
-    async def create_city(self, name: str, province_id: int, code: str = None) -> int:
+    @db_write(tables=("cities",))
+    def create_city(self, name: str, province_id: int, code: str = None) -> int:
         """创建城市"""
         try:
             logger.info(f"🏙️ 开始创建城市: {name} (省份ID: {province_id})")
-            with sqlite3.connect(self.db_path) as conn:
+            with self.pool.writer() as conn:
                 cursor = conn.cursor()
                 now = datetime.now().isoformat()
 
@@ -522,6 +1107,7 @@ class Database:
 
                 city_id = cursor.lastrowid
                 conn.commit()
+                self.hierarchy.add_city(self._fetch_row(cursor, "cities", city_id))
                 logger.info(f"✅ 创建城市成功: {name} (ID: {city_id}, 省份ID: {province_id})")
                 return city_id
 
@@ -530,122 +1116,48 @@ class Database:
             return 0
 
     async def get_city_by_name(self, city_name: str):
-        """根据城市名称获取城市信息"""
-        try:
-            logger.info(f"🔍 查询城市: {city_name}")
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-
-                cursor.execute(
-                    "SELECT * FROM cities WHERE name = ? LIMIT 1",
-                    (city_name,)
-                )
-
-                result = cursor.fetchone()
-                logger.info(f"📊 查询城市结果: {'找到' if result else '未找到'} {city_name}")
-
-                if result:
-                    logger.info(f"✅ 城市信息: ID={result['id']}, 名称={result['name']}, 省份ID={result['province_id']}")
-                    return dict(result)
-                else:
-                    logger.info(f"❌ 城市不存在: {city_name}")
-                    return None
-
-        except Exception as e:
-            logger.error(f"根据名称获取城市信息失败: {e}")
-            return None
+        """根据城市名称获取城市信息（行政区划缓存）"""
+        await self._ensure_hierarchy_cache()
+        result = self.hierarchy.get_city_by_name(city_name)
+        logger.debug(f"🔍 查询城市: {city_name} -> {'ID=' + str(result['id']) if result else '未找到'}")
+        return result
 
     async def get_city_by_id(self, city_id: int):
-        """根据城市ID获取城市信息"""
-        try:
-            logger.info(f"🔍 查询城市ID: {city_id}")
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-
-                cursor.execute(
-                    "SELECT * FROM cities WHERE id = ? LIMIT 1",
-                    (city_id,)
-                )
-
-                result = cursor.fetchone()
-                logger.info(f"📊 查询城市结果: {'找到' if result else '未找到'} ID={city_id}")
-
-                if result:
-                    logger.info(f"✅ 城市信息: ID={result['id']}, 名称={result['name']}, 省份ID={result['province_id']}")
-                    return dict(result)
-                else:
-                    logger.info(f"❌ 城市不存在: ID={city_id}")
-                    return None
-
-        except Exception as e:
-            logger.error(f"根据ID获取城市信息失败: {e}")
-            return None
-
-    async def get_cities(self, province_id: int = None, page: int = 1, page_size: int = 20) -> tuple:
-        """获取城市列表"""
+        """根据城市ID获取城市信息（行政区划缓存）"""
+        await self._ensure_hierarchy_cache()
+        result = self.hierarchy.get_city_by_id(city_id)
+        logger.debug(f"🔍 查询城市ID: {city_id} -> {result['name'] if result else '未找到'}")
+        return result
+
+    @db_read
+    def get_cities(self, province_id: int = None, page: int = 1, page_size: int = 20,
+                   after_name: Optional[str] = None, after_id: Optional[int] = None,
+                   include_total: bool = True, probe_next: bool = False) -> tuple:
+        """获取城市列表（分页，传入after_name/after_id时为键集分页）"""
         try:
-            # 处理边界值
-            if page < 1:
-                page = 1
-            if page_size < 1:
-                page_size = 20
-            if page_size > 1000:  # 限制最大页面大小
-                page_size = 1000
-                
-            with sqlite3.connect(self.db_path) as conn:
+            with self.pool.reader() as conn:
                 cursor = conn.cursor()
-                
                 if province_id:
                     # 获取指定省份的城市
-                    cursor.execute("SELECT COUNT(*) FROM cities WHERE province_id = ?", (province_id,))
-                    total = cursor.fetchone()[0]
-                    
-                    # 计算有效页面数
-                    total_pages = (total + page_size - 1) // page_size if total > 0 else 1
-                    if page > total_pages and total > 0:
-                        page = total_pages
-                    
-                    offset = (page - 1) * page_size
-                    cursor.execute("""
-                        SELECT * FROM cities 
-                        WHERE province_id = ? 
-                        ORDER BY name 
-                        LIMIT ? OFFSET ?
-                    """, (province_id, page_size, offset))
+                    conditions, params = ["province_id = ?"], (province_id,)
                 else:
                     # 获取所有城市
-                    cursor.execute("SELECT COUNT(*) FROM cities")
-                    total = cursor.fetchone()[0]
-                    
-                    # 计算有效页面数
-                    total_pages = (total + page_size - 1) // page_size if total > 0 else 1
-                    if page > total_pages and total > 0:
-                        page = total_pages
-                    
-                    offset = (page - 1) * page_size
-                    cursor.execute("""
-                        SELECT * FROM cities 
-                        ORDER BY name 
-                        LIMIT ? OFFSET ?
-                    """, (page_size, offset))
-                
-                rows = cursor.fetchall()
-                columns = [description[0] for description in cursor.description]
-                items = [dict(zip(columns, row)) for row in rows]
-                
-                return items, total
-                
+                    conditions, params = [], ()
+                return self._query_page(
+                    cursor, "SELECT *", "FROM cities", conditions, params, "name", "id",
+                    page, page_size, after_name, after_id, include_total, ("cities",), probe_next
+                )
+
         except Exception as e:
             logger.error(f"获取城市列表失败: {e}")
             return [], 0
 
     # 区县数据操作
-    async def create_district(self, name: str, city_id: int, code: str = None) -> int:
+    @db_write(tables=("districts",))
+    def create_district(self, name: str, city_id: int, code: str = None) -> int:
         """创建区县"""
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.writer() as conn:
                 cursor = conn.cursor()
                 now = datetime.now().isoformat()
                 
@@ -656,6 +1168,7 @@ class Database:
                 
                 district_id = cursor.lastrowid
                 conn.commit()
+                self.hierarchy.add_district(self._fetch_row(cursor, "districts", district_id))
                 logger.info(f"创建区县成功: {name} (ID: {district_id})")
                 return district_id
                 
@@ -663,126 +1176,76 @@ class Database:
             logger.error(f"创建区县失败: {e}")
             return 0
 
-    async def get_district_by_name(self, district_name: str):
-        """根据区县名称获取区县信息（全局查询，可能返回多个同名区县）"""
-        try:
-            logger.info(f"🔍 查询区县: {district_name}")
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-
-                cursor.execute(
-                    "SELECT * FROM districts WHERE name = ? ORDER BY id LIMIT 1",
-                    (district_name,)
-                )
-
-                result = cursor.fetchone()
-                logger.info(f"📊 查询区县结果: {'找到' if result else '未找到'} {district_name}")
+    async def get_district_by_id(self, district_id: int):
+        """根据区县ID获取区县信息（行政区划缓存）"""
+        await self._ensure_hierarchy_cache()
+        result = self.hierarchy.get_district_by_id(district_id)
+        logger.debug(f"🔍 查询区县ID: {district_id} -> {result['name'] if result else '未找到'}")
+        return result
 
-                if result:
-                    logger.info(f"✅ 区县信息: ID={result['id']}, 名称={result['name']}, 城市ID={result['city_id']}")
-                    return dict(result)
-                else:
-                    logger.info(f"❌ 区县不存在: {district_name}")
-                    return None
-
-        except Exception as e:
-            logger.error(f"根据名称获取区县信息失败: {e}")
-            return None
+    async def get_district_by_name(self, district_name: str):
+        """根据区县名称获取区县信息（全局查询，同名区县返回ID最小的一个；行政区划缓存）"""
+        await self._ensure_hierarchy_cache()
+        result = self.hierarchy.get_district_by_name(district_name)
+        logger.debug(f"🔍 查询区县: {district_name} -> {'ID=' + str(result['id']) if result else '未找到'}")
+        return result
 
     async def get_district_by_name_and_city(self, district_name: str, city_id: int):
-        """根据区县名称和城市ID获取区县信息（精确查询）"""
-        try:
-            logger.info(f"🔍 精确查询区县: {district_name} (城市ID: {city_id})")
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-
-                cursor.execute(
-                    "SELECT * FROM districts WHERE name = ? AND city_id = ? LIMIT 1",
-                    (district_name, city_id)
-                )
-
-                result = cursor.fetchone()
-                logger.info(f"📊 精确查询区县结果: {'找到' if result else '未找到'} {district_name} (城市ID: {city_id})")
-
-                if result:
-                    logger.info(f"✅ 区县信息: ID={result['id']}, 名称={result['name']}, 城市ID={result['city_id']}")
-                    return dict(result)
-                else:
-                    logger.info(f"❌ 区县不存在: {district_name} (城市ID: {city_id})")
-                    return None
-
-        except Exception as e:
-            logger.error(f"❌ 精确查询区县失败: {e}")
-            return None
-
-    async def get_districts(self, city_id: int = None, page: int = 1, page_size: int = 20) -> tuple:
-        """获取区县列表"""
+        """根据区县名称和城市ID获取区县信息（精确查询；行政区划缓存）"""
+        await self._ensure_hierarchy_cache()
+        result = self.hierarchy.get_district_by_name_and_city(district_name, city_id)
+        logger.debug(f"🔍 精确查询区县: {district_name} (城市ID: {city_id}) -> {'ID=' + str(result['id']) if result else '未找到'}")
+        return result
+
+    @db_write(tables=("provinces", "cities", "districts"))
+    def mark_refreshed(self, table_name: str, row_id: int) -> str:
+        """记录省份/城市/区县的最近刷新时间（下级数据已通过LLM刷新并入库），返回记录的时间"""
+        update_cache = {
+            "provinces": self.hierarchy.update_province,
+            "cities": self.hierarchy.update_city,
+            "districts": self.hierarchy.update_district,
+        }.get(table_name)
+        if update_cache is None:
+            raise ValueError(f"不支持的表: {table_name}")
+        now = datetime.now().isoformat()
+        with self.pool.writer() as conn:
+            conn.execute(f"UPDATE {table_name} SET last_refreshed_at = ? WHERE id = ?", (now, row_id))
+            conn.commit()
+        update_cache(row_id, {"last_refreshed_at": now})
+        return now
+
+    @db_read
+    def get_districts(self, city_id: int = None, page: int = 1, page_size: int = 20,
+                      after_name: Optional[str] = None, after_id: Optional[int] = None,
+                      include_total: bool = True, probe_next: bool = False) -> tuple:
+        """获取区县列表（分页，传入after_name/after_id时为键集分页）"""
         try:
-            # 处理边界值
-            if page < 1:
-                page = 1
-            if page_size < 1:
-                page_size = 20
-            if page_size > 1000:  # 限制最大页面大小
-                page_size = 1000
-                
-            with sqlite3.connect(self.db_path) as conn:
+            with self.pool.reader() as conn:
                 cursor = conn.cursor()
-                
                 if city_id:
                     # 获取指定城市的区县
-                    cursor.execute("SELECT COUNT(*) FROM districts WHERE city_id = ?", (city_id,))
-                    total = cursor.fetchone()[0]
-                    
-                    # 计算有效页面数
-                    total_pages = (total + page_size - 1) // page_size if total > 0 else 1
-                    if page > total_pages and total > 0:
-                        page = total_pages
-                    
-                    offset = (page - 1) * page_size
-                    cursor.execute("""
-                        SELECT * FROM districts 
-                        WHERE city_id = ? 
-                        ORDER BY name 
-                        LIMIT ? OFFSET ?
-                    """, (city_id, page_size, offset))
+                    conditions, params = ["city_id = ?"], (city_id,)
                 else:
                     # 获取所有区县
-                    cursor.execute("SELECT COUNT(*) FROM districts")
-                    total = cursor.fetchone()[0]
-                    
-                    # 计算有效页面数
-                    total_pages = (total + page_size - 1) // page_size if total > 0 else 1
-                    if page > total_pages and total > 0:
-                        page = total_pages
-                    
-                    offset = (page - 1) * page_size
-                    cursor.execute("""
-                        SELECT * FROM districts 
-                        ORDER BY name 
-                        LIMIT ? OFFSET ?
-                    """, (page_size, offset))
-                
-                rows = cursor.fetchall()
-                columns = [description[0] for description in cursor.description]
-                items = [dict(zip(columns, row)) for row in rows]
-                
-                return items, total
-                
+                    conditions, params = [], ()
+                return self._query_page(
+                    cursor, "SELECT *", "FROM districts", conditions, params, "name", "id",
+                    page, page_size, after_name, after_id, include_total, ("districts",), probe_next
+                )
+
         except Exception as e:
             logger.error(f"获取区县列表失败: {e}")
             return [], 0
 
     # 医院数据操作
-    async def create_hospital(self, name: str, district_id: int = None, level: str = None,
+    @db_write(tables=("hospitals",))
+    def create_hospital(self, name: str, district_id: int = None, level: str = None,
                             address: str = None, phone: str = None, beds_count: int = None,
                             staff_count: int = None, departments: list = None,
                             specializations: list = None, website: str = None) -> int:
         """创建医院"""
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.writer() as conn:
                 cursor = conn.cursor()
                 now = datetime.now().isoformat()
 
@@ -807,144 +1270,212 @@ class Database:
             logger.error(f"创建医院失败: {e}")
             return 0
 
-    async def get_hospitals(self, district_id: int = None, page: int = 1, page_size: int = 20) -> tuple:
-        """获取医院列表"""
+    @db_write(tables=("hospitals",))
+    def upsert_hospitals(self, district_id: int, rows: list, keep_existing_on_empty: bool = False) -> dict:
+        """
+        在一个事务内批量写入某个区县的医院（以 (district_id, name) 为唯一键）
+
+        Args:
+            district_id: 区县ID
+            rows: 医院数据列表（LLM返回的字典，含name/level/address/phone/beds_count/
+                  staff_count/departments/specializations/website）
+            keep_existing_on_empty: 为True时新值为空的字段保留原值（只用非空信息更新）；
+                  无论是否指定，未提供（None）的字段都保留原值
+
+        Returns:
+            dict: {"inserted": 新增数, "updated": 更新数, "unchanged": 无变化数, "skipped": 名称为空跳过数}
+
+        规范化后的字段内容哈希保存在content_hash中，内容无变化的医院不写入、不修改updated_at。
+        """
+        result = {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+
+        fields = list(HOSPITAL_UPSERT_FIELDS)
+
+        # 规范化，名称为空的跳过，同名的以最后一条为准；记录LLM未提供（None）的字段，更新时保留原值
+        incoming = {}
+        for row in rows:
+            name = (row.get('name') or '').strip()
+            if not name:
+                result["skipped"] += 1
+                continue
+            incoming[name] = (normalize_hospital_payload(row), {field for field in fields if row.get(field) is None})
+        if not incoming:
+            return result
+
+        now = datetime.now().isoformat()
+        with self.pool.writer() as conn:
+            cursor = conn.cursor()
+
+            existing = {}
+            names = list(incoming)
+            for start in range(0, len(names), 500):
+                chunk = names[start:start + 500]
+                placeholders = ','.join(['?' for _ in chunk])
+                cursor.execute(f"""
+                    SELECT id, name, content_hash, {', '.join(fields)} FROM hospitals
+                    WHERE district_id = ? AND name IN ({placeholders})
+                """, [district_id] + chunk)
+                for row in cursor.fetchall():
+                    existing[row[1]] = (row[0], row[2], row[3:])
+
+            inserts, updates = [], []
+            for name, (values, missing) in incoming.items():
+                content_hash = hospital_content_hash(values)
+                if name not in existing:
+                    inserts.append([name, district_id] + [values[field] for field in fields] + [content_hash, now, now])
+                    continue
+                hospital_id, stored_hash, stored_values = existing[name]
+                if content_hash == stored_hash:
+                    result["unchanged"] += 1
+                    continue
+                # 哈希不一致（或旧记录/被其他路径修改过，哈希为空）时按规范化后的字段值比较
+                current = normalize_hospital_payload(dict(zip(fields, stored_values)))
+                keep = set(missing)
+                if keep_existing_on_empty:
+                    keep.update(field for field, value in values.items() if value in (None, '', '[]'))
+                if keep:
+                    values = {field: current[field] if field in keep else value for field, value in values.items()}
+                    content_hash = hospital_content_hash(values)
+                if content_hash == hospital_content_hash(current):
+                    result["unchanged"] += 1
+                    if stored_hash != content_hash:
+                        # 只补记哈希，不修改updated_at
+                        cursor.execute("UPDATE hospitals SET content_hash = ? WHERE id = ?", (content_hash, hospital_id))
+                    continue
+                updates.append([values[field] for field in fields] + [content_hash, now, hospital_id])
+
+            if inserts:
+                cursor.executemany(f"""
+                    INSERT INTO hospitals (name, district_id, {', '.join(fields)}, content_hash, created_at, updated_at)
+                    VALUES ({', '.join(['?'] * (len(fields) + 5))})
+                """, inserts)
+            if updates:
+                cursor.executemany(f"""
+                    UPDATE hospitals SET {', '.join(f'{field} = ?' for field in fields)}, content_hash = ?, updated_at = ?
+                    WHERE id = ?
+                """, updates)
+            conn.commit()
+
+        result["inserted"] = len(inserts)
+        result["updated"] = len(updates)
+        logger.info(f"批量写入医院完成 (区县ID: {district_id}): 新增 {result['inserted']}, "
+                    f"更新 {result['updated']}, 无变化 {result['unchanged']}, 跳过 {result['skipped']}")
+        return result
+
+    @db_read
+    def get_hospitals(self, district_id: int = None, page: int = 1, page_size: int = 20,
+                      after_name: Optional[str] = None, after_id: Optional[int] = None,
+                      include_total: bool = True, probe_next: bool = False) -> tuple:
+        """获取医院列表（分页，传入after_name/after_id时为键集分页）"""
         try:
-            # 处理边界值
-            if page < 1:
-                page = 1
-            if page_size < 1:
-                page_size = 20
-            if page_size > 1000:  # 限制最大页面大小
-                page_size = 1000
-                
-            with sqlite3.connect(self.db_path) as conn:
+            with self.pool.reader() as conn:
                 cursor = conn.cursor()
-
                 if district_id:
                     # 获取指定区县的医院（排除已删除的）
-                    cursor.execute("SELECT COUNT(*) FROM hospitals WHERE district_id = ? AND deleted_at IS NULL", (district_id,))
-                    total = cursor.fetchone()[0]
-
-                    # 计算有效页面数
-                    total_pages = (total + page_size - 1) // page_size if total > 0 else 1
-                    if page > total_pages and total > 0:
-                        page = total_pages
-
-                    offset = (page - 1) * page_size
-                    cursor.execute("""
-                        SELECT * FROM hospitals
-                        WHERE district_id = ? AND deleted_at IS NULL
-                        ORDER BY name
-                        LIMIT ? OFFSET ?
-                    """, (district_id, page_size, offset))
+                    conditions, params = ["district_id = ?", "deleted_at IS NULL"], (district_id,)
                 else:
                     # 获取所有医院（排除已删除的）
-                    cursor.execute("SELECT COUNT(*) FROM hospitals WHERE deleted_at IS NULL")
-                    total = cursor.fetchone()[0]
-
-                    # 计算有效页面数
-                    total_pages = (total + page_size - 1) // page_size if total > 0 else 1
-                    if page > total_pages and total > 0:
-                        page = total_pages
+                    conditions, params = ["deleted_at IS NULL"], ()
+                return self._query_page(
+                    cursor, "SELECT *", "FROM hospitals", conditions, params, "name", "id",
+                    page, page_size, after_name, after_id, include_total, ("hospitals",), probe_next
+                )
 
-                    offset = (page - 1) * page_size
-                    cursor.execute("""
-                        SELECT * FROM hospitals
-                        WHERE deleted_at IS NULL
-                        ORDER BY name
-                        LIMIT ? OFFSET ?
-                    """, (page_size, offset))
-                
-                rows = cursor.fetchall()
-                columns = [description[0] for description in cursor.description]
-                items = [dict(zip(columns, row)) for row in rows]
-                
-                return items, total
-                
         except Exception as e:
             logger.error(f"获取医院列表失败: {e}")
             return [], 0
 
-    async def get_hospitals_by_city(self, city_id: int = None, page: int = 1, page_size: int = 20) -> tuple:
+    @db_read
+    def get_hospitals_by_city(self, city_id: int = None, page: int = 1, page_size: int = 20,
+                              after_name: Optional[str] = None, after_id: Optional[int] = None,
+                              include_total: bool = True, probe_next: bool = False) -> tuple:
         """通过城市获取所有医院（包括该城市下所有区县的医院）"""
         try:
-            # 处理边界值
-            if page < 1:
-                page = 1
-            if page_size < 1:
-                page_size = 20
-            if page_size > 1000:  # 限制最大页面大小
-                page_size = 1000
-
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-
-                if city_id:
-                    # 获取指定城市下所有区县的医院（通过JOIN连接districts表）
-                    cursor.execute("""
-                        SELECT COUNT(*)
-                        FROM hospitals h
-                        INNER JOIN districts d ON h.district_id = d.id
-                        WHERE d.city_id = ? AND h.deleted_at IS NULL
-                    """, (city_id,))
-                    total = cursor.fetchone()[0]
-
-                    # 计算有效页面数
-                    total_pages = (total + page_size - 1) // page_size if total > 0 else 1
-                    if page > total_pages and total > 0:
-                        page = total_pages
+            # 如果没有提供city_id，返回空结果
+            if not city_id:
+                return [], 0
 
-                    offset = (page - 1) * page_size
-                    cursor.execute("""
-                        SELECT h.*
-                        FROM hospitals h
-                        INNER JOIN districts d ON h.district_id = d.id
-                        WHERE d.city_id = ? AND h.deleted_at IS NULL
-                        ORDER BY h.name
-                        LIMIT ? OFFSET ?
-                    """, (city_id, page_size, offset))
-                else:
-                    # 如果没有提供city_id，返回空结果
-                    return [], 0
-
-                rows = cursor.fetchall()
-                columns = [description[0] for description in cursor.description]
-                items = [dict(zip(columns, row)) for row in rows]
-
-                return items, total
+            with self.pool.reader() as conn:
+                cursor = conn.cursor()
+                # 获取指定城市下所有区县的医院（通过JOIN连接districts表）
+                return self._query_page(
+                    cursor, "SELECT h.*",
+                    "FROM hospitals h INNER JOIN districts d ON h.district_id = d.id",
+                    ["d.city_id = ?", "h.deleted_at IS NULL"], (city_id,), "h.name", "h.id",
+                    page, page_size, after_name, after_id, include_total, ("hospitals", "districts"), probe_next
+                )
 
         except Exception as e:
             logger.error(f"通过城市获取医院列表失败: {e}")
             return [], 0
 
-    async def search_hospitals(self, query: str, limit: int = 20) -> list:
-        """搜索医院"""
+    def _match_hospital_ids(self, cursor: sqlite3.Cursor, query: str, limit: int,
+                            exclude_deleted: bool = True) -> list:
+        """全文检索医院，按相关度返回医院ID列表
+
+        长词走 FTS5 MATCH 并按 bm25 排序（名称权重最高，其次别名、地址）；
+        只有短词（少于3个字符）时在索引列上做 LIKE 子串匹配，名称前缀匹配优先。
+        """
+        match_expr, short_terms = build_fts_query(query)
+        if not match_expr and not short_terms:
+            return []
+
+        conditions, params = [], []
+        if match_expr:
+            conditions.append("hospitals_fts MATCH ?")
+            params.append(match_expr)
+        for term in short_terms:
+            conditions.append("(f.name LIKE ? OR f.aliases LIKE ? OR f.address LIKE ?)")
+            params.extend([f"%{term}%"] * 3)
+        if exclude_deleted:
+            conditions.append("h.deleted_at IS NULL")
+
+        if match_expr:
+            order_sql = "bm25(hospitals_fts, 10.0, 1.0, 5.0), length(h.name), h.id"
+        else:
+            order_sql = "h.name NOT LIKE ?, length(h.name), h.id"
+            params.append(f"{short_terms[0]}%")
+
+        cursor.execute(f"""
+            SELECT h.id
+            FROM hospitals_fts f
+            JOIN hospitals h ON h.id = f.rowid
+            WHERE {' AND '.join(conditions)}
+            ORDER BY {order_sql}
+            LIMIT ?
+        """, params + [limit])
+        return [row[0] for row in cursor.fetchall()]
+
+    @db_read
+    def search_hospitals(self, query: str, limit: int = 20) -> list:
+        """搜索医院（全文检索，按相关度排序）"""
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.reader() as conn:
                 cursor = conn.cursor()
 
-                cursor.execute("""
-                    SELECT * FROM hospitals
-                    WHERE name LIKE ? AND deleted_at IS NULL
-                    ORDER BY name
-                    LIMIT ?
-                """, (f"%{query}%", limit))
+                hospital_ids = self._match_hospital_ids(cursor, query, limit)
+                if not hospital_ids:
+                    return []
+
+                placeholders = ','.join(['?' for _ in hospital_ids])
+                cursor.execute(f"SELECT * FROM hospitals WHERE id IN ({placeholders})", hospital_ids)
 
                 rows = cursor.fetchall()
                 columns = [description[0] for description in cursor.description]
-                items = [dict(zip(columns, row)) for row in rows]
+                items_by_id = {row[0]: dict(zip(columns, row)) for row in rows}
 
-                return items
+                # 保持相关度顺序
+                return [items_by_id[hospital_id] for hospital_id in hospital_ids if hospital_id in items_by_id]
 
         except Exception as e:
             logger.error(f"搜索医院失败: {e}")
             return []
 
-    async def get_hospital_by_name_and_district(self, hospital_name: str, district_id: int) -> dict:
+    @db_read
+    def get_hospital_by_name_and_district(self, hospital_name: str, district_id: int) -> dict:
         """根据医院名称和区县ID获取医院信息"""
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.reader() as conn:
                 cursor = conn.cursor()
 
                 cursor.execute("""
@@ -964,7 +1495,8 @@ class Database:
             logger.error(f"根据名称和区县查询医院失败: {e}")
             return None
 
-    async def get_hospital_by_name(self, hospital_name: str) -> dict:
+    @db_read
+    def get_hospital_by_name(self, hospital_name: str) -> dict:
         """
         根据医院名称查询医院信息
 
@@ -975,7 +1507,7 @@ class Database:
             dict: 医院信息，未找到返回None
         """
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.reader() as conn:
                 conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
 
@@ -995,7 +1527,8 @@ class Database:
             logger.error(f"根据名称查询医院失败: {e}")
             return None
 
-    async def update_hospital_base_procurement_link(self, hospital_id: int, base_procurement_link: str) -> dict:
+    @db_write(tables=("hospitals",))
+    def update_hospital_base_procurement_link(self, hospital_id: int, base_procurement_link: str) -> dict:
         """
         更新医院基础采购链接
 
@@ -1007,7 +1540,7 @@ class Database:
             dict: 更新结果
         """
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.writer() as conn:
                 cursor = conn.cursor()
 
                 # 更新基础采购链接和更新时间
@@ -1051,7 +1584,8 @@ class Database:
                 "affected_rows": 0
             }
 
-    async def update_hospital_keywords(self, hospital_id: int, keywords: list) -> dict:
+    @db_write(tables=("hospitals",))
+    def update_hospital_keywords(self, hospital_id: int, keywords: list) -> dict:
         """
         更新医院个性化采购关键词
 
@@ -1063,7 +1597,7 @@ class Database:
             dict: 更新结果
         """
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.writer() as conn:
                 cursor = conn.cursor()
 
                 # 将关键词列表转换为逗号分隔的字符串
@@ -1111,7 +1645,8 @@ class Database:
                 "affected_rows": 0
             }
 
-    async def get_hospital_keywords(self, hospital_id: int, default_keywords: list = None) -> dict:
+    @db_read
+    def get_hospital_keywords(self, hospital_id: int, default_keywords: list = None) -> dict:
         """
         获取医院采购关键词
 
@@ -1123,7 +1658,7 @@ class Database:
             dict: 关键词信息
         """
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.reader() as conn:
                 cursor = conn.cursor()
 
                 # 查询医院信息
@@ -1180,7 +1715,8 @@ class Database:
                 "default_keywords": default_keywords or []
             }
 
-    async def reset_hospital_keywords(self, hospital_id: int) -> dict:
+    @db_write(tables=("hospitals",))
+    def reset_hospital_keywords(self, hospital_id: int) -> dict:
         """
         重置医院关键词为默认值
 
@@ -1191,7 +1727,7 @@ class Database:
             dict: 重置结果
         """
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.writer() as conn:
                 cursor = conn.cursor()
 
                 # 清空关键词（设置为NULL）
@@ -1232,7 +1768,8 @@ class Database:
                 "affected_rows": 0
             }
 
-    async def get_hospital_with_keywords(self, hospital_id: int, default_keywords: list = None) -> dict:
+    @db_read
+    def get_hospital_with_keywords(self, hospital_id: int, default_keywords: list = None) -> dict:
         """
         获取医院完整信息（包含关键词）
 
@@ -1244,7 +1781,7 @@ class Database:
             dict: 医院完整信息
         """
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.reader() as conn:
                 cursor = conn.cursor()
 
                 # 查询医院完整信息
@@ -1296,56 +1833,107 @@ class Database:
                 "hospital": None
             }
 
-    async def search_procurement_links(self, base_url: str, time_start: str, time_end: str) -> dict:
+    @staticmethod
+    def _procurement_page(rows: list, limit: Optional[int]) -> tuple:
+        """把多取一行的查询结果转换为 (链接列表, 是否还有下一页, 下一页游标)
+
+        rows 的最后一列为排序键（first_seen_epoch 或 first_seen_at），不出现在返回结果中。
         """
-        搜索采购信息
+        has_more = limit is not None and len(rows) > limit
+        if has_more:
+            rows = rows[:limit]
+        procurement_links = []
+        for row in rows:
+            procurement_links.append({
+                "id": row[0],
+                "base_url": row[1],
+                "url": row[2],
+                "link_text": row[3],
+                "first_seen_at": row[4],
+                "last_seen_at": row[5],
+                "is_latest": bool(row[6])
+            })
+        next_cursor = encode_page_cursor(rows[-1][7], rows[-1][0]) if has_more else None
+        return procurement_links, has_more, next_cursor
+
+    @staticmethod
+    def _first_seen_keyset(after: Optional[tuple]) -> tuple:
+        """生成按 (first_seen_at DESC, id DESC) 翻页的键集条件，返回 (SQL片段, 参数列表)
+
+        first_seen_at 可为空，降序时空值排在最后：游标落在空值区间时只在空值内按id继续，
+        否则还要带上全部空值记录，避免元组比较遇到NULL时漏掉这些行。
+        """
+        if not after:
+            return "", []
+        sort_value, row_id = after
+        if sort_value is None:
+            return "AND p.first_seen_at IS NULL AND p.id < ?", [row_id]
+        return ("AND (p.first_seen_at < ? OR (p.first_seen_at = ? AND p.id < ?) OR p.first_seen_at IS NULL)",
+                [sort_value, sort_value, row_id])
+
+    @db_read
+    def search_procurement_links(self, base_url: str, time_start: str, time_end: str,
+                                 limit: Optional[int] = None, cursor: Optional[str] = None) -> dict:
+        """
+        搜索采购信息（按首次发现时间倒序，支持游标分页）
 
         Args:
             base_url: 采购基础URL
             time_start: 开始时间 (YYYY-MM-DD 格式)
             time_end: 结束时间 (YYYY-MM-DD 格式)
+            limit: 每页条数，None 表示不分页
+            cursor: 上一页返回的 next_cursor
 
         Returns:
             dict: 包含搜索结果和统计信息的字典
         """
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
-                cursor = conn.cursor()
-
-                # 查询采购链接
-                cursor.execute("""
-                    SELECT id, base_url, url, link_text, first_seen_at, last_seen_at, is_latest
-                    FROM procurement_links
-                    WHERE base_url = ?
-                    AND DATE(first_seen_at) >= DATE(?)
-                    AND DATE(first_seen_at) <= DATE(?)
-                    ORDER BY first_seen_at DESC
-                """, (base_url, time_start, time_end))
-
-                rows = cursor.fetchall()
-
-                # 转换为字典列表
-                procurement_links = []
-                for row in rows:
-                    procurement_links.append({
-                        "id": row[0],
-                        "base_url": row[1],
-                        "url": row[2],
-                        "link_text": row[3],
-                        "first_seen_at": row[4],
-                        "last_seen_at": row[5],
-                        "is_latest": bool(row[6])
-                    })
+            after = decode_page_cursor(cursor) if cursor else None
+            with self.pool.reader() as conn:
+                db_cursor = conn.cursor()
+
+                # 查询采购链接：按 (base_url, first_seen_epoch) 索引做范围扫描，(first_seen_epoch, id) 作为分页键
+                # （is_latest 由 last_run_id 是否等于站点当前批次得出）
+                params = [base_url, base_url, time_start, time_end]
+                keyset = ""
+                if after:
+                    keyset = "AND (p.first_seen_epoch, p.id) < (?, ?)"
+                    params.extend(after)
+                params.append(limit + 1 if limit else -1)
+                db_cursor.execute(f"""
+                    SELECT p.id, p.base_url, p.url, p.link_text, p.first_seen_at, p.last_seen_at,
+                           p.last_run_id IS NOT NULL AND p.last_run_id = ({CURRENT_CRAWL_RUN_SQL}) AS is_latest,
+                           p.first_seen_epoch
+                    FROM procurement_links p
+                    WHERE p.base_url = ?
+                    AND p.first_seen_epoch >= CAST(strftime('%s', DATE(?)) AS INTEGER)
+                    AND p.first_seen_epoch < CAST(strftime('%s', DATE(?), '+1 day') AS INTEGER)
+                    {keyset}
+                    ORDER BY p.first_seen_epoch DESC, p.id DESC
+                    LIMIT ?
+                """, params)
 
+                procurement_links, has_more, next_cursor = self._procurement_page(db_cursor.fetchall(), limit)
                 total_count = len(procurement_links)
-
-                logger.info(f"采购链接搜索完成: base_url={base_url}, time_start={time_start}, time_end={time_end}, 找到 {total_count} 条记录")
+                if after or has_more:
+                    # 分页时单独统计全部匹配数（同一索引范围内计数，无需回表）
+                    db_cursor.execute("""
+                        SELECT COUNT(*) FROM procurement_links p
+                        WHERE p.base_url = ?
+                        AND p.first_seen_epoch >= CAST(strftime('%s', DATE(?)) AS INTEGER)
+                        AND p.first_seen_epoch < CAST(strftime('%s', DATE(?), '+1 day') AS INTEGER)
+                    """, (base_url, time_start, time_end))
+                    total_count = db_cursor.fetchone()[0]
+
+                logger.info(f"采购链接搜索完成: base_url={base_url}, time_start={time_start}, time_end={time_end}, 找到 {total_count} 条记录, 本页 {len(procurement_links)} 条, has_more={has_more}")
 
                 return {
                     "success": True,
                     "message": f"搜索完成，找到 {total_count} 条匹配记录",
                     "total_count": total_count,
                     "procurement_links": procurement_links,
+                    "has_more": has_more,
+                    "next_cursor": next_cursor,
                     "search_params": {
                         "base_url": base_url,
                         "time_start": time_start,
@@ -1361,6 +1949,8 @@ class Database:
                 "message": error_msg,
                 "total_count": 0,
                 "procurement_links": [],
+                "has_more": False,
+                "next_cursor": None,
                 "search_params": {
                     "base_url": base_url,
                     "time_start": time_start,
@@ -1368,40 +1958,172 @@ class Database:
                 }
             }
 
-    async def get_latest_procurement_links(self, base_url: str = None) -> dict:
-        """获取is_latest=1的采购链接记录
+    @db_read
+    def get_latest_procurement_links(self, base_url: str = None, limit: Optional[int] = None,
+                                     cursor: Optional[str] = None) -> dict:
+        """获取最新的采购链接记录（即站点最近一次完成的抓取批次中出现的链接）
 
         Args:
-            base_url: 可选的采购基础URL，如果为空则搜索所有is_latest=1的记录
+            base_url: 可选的采购基础URL，如果为空则搜索所有站点的最新记录
+            limit: 每页条数，None 表示不分页
+            cursor: 上一页返回的 next_cursor，分页键为 (first_seen_at, id)，first_seen_at 为空的记录排在最后
 
         Returns:
             包含搜索结果的字典
         """
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
-                cursor = conn.cursor()
+            after = decode_page_cursor(cursor) if cursor else None
+            keyset, keyset_params = self._first_seen_keyset(after)
+            limit_param = limit + 1 if limit else -1
+
+            with self.pool.reader() as conn:
+                db_cursor = conn.cursor()
 
                 if base_url:
-                    # 搜索指定base_url且is_latest=1的记录
-                    cursor.execute("""
-                        SELECT id, base_url, url, link_text, first_seen_at, last_seen_at, is_latest
-                        FROM procurement_links
-                        WHERE base_url = ? AND is_latest = 1
-                        ORDER BY first_seen_at DESC
-                    """, (base_url,))
+                    # 搜索指定base_url当前批次的记录（走 (base_url, last_run_id, first_seen_at) 索引，无需排序）
+                    db_cursor.execute(f"""
+                        SELECT p.id, p.base_url, p.url, p.link_text, p.first_seen_at, p.last_seen_at, 1 AS is_latest,
+                               p.first_seen_at
+                        FROM procurement_links p
+                        WHERE p.base_url = ? AND p.last_run_id = ({CURRENT_CRAWL_RUN_SQL})
+                        {keyset}
+                        ORDER BY p.first_seen_at DESC, p.id DESC
+                        LIMIT ?
+                    """, [base_url, base_url] + keyset_params + [limit_param])
                 else:
-                    # 搜索所有is_latest=1的记录
-                    cursor.execute("""
-                        SELECT id, base_url, url, link_text, first_seen_at, last_seen_at, is_latest
-                        FROM procurement_links
-                        WHERE is_latest = 1
-                        ORDER BY first_seen_at DESC
-                    """)
+                    # 搜索所有站点当前批次的记录：先取各站点最近完成的批次，再按(base_url, last_run_id)连接
+                    db_cursor.execute(f"""
+                        SELECT p.id, p.base_url, p.url, p.link_text, p.first_seen_at, p.last_seen_at, 1 AS is_latest,
+                               p.first_seen_at
+                        FROM (
+                            SELECT base_url, MAX(id) AS run_id
+                            FROM crawl_runs
+                            WHERE status = 'completed'
+                            GROUP BY base_url
+                        ) r
+                        JOIN procurement_links p ON p.base_url = r.base_url AND p.last_run_id = r.run_id
+                        WHERE 1 = 1 {keyset}
+                        ORDER BY p.first_seen_at DESC, p.id DESC
+                        LIMIT ?
+                    """, keyset_params + [limit_param])
+
+                procurement_links, has_more, next_cursor = self._procurement_page(db_cursor.fetchall(), limit)
+                total_count = len(procurement_links)
+                if after or has_more:
+                    # 分页时单独统计当前批次的全部记录数
+                    if base_url:
+                        db_cursor.execute(f"""
+                            SELECT COUNT(*) FROM procurement_links p
+                            WHERE p.base_url = ? AND p.last_run_id = ({CURRENT_CRAWL_RUN_SQL})
+                        """, (base_url, base_url))
+                    else:
+                        db_cursor.execute("""
+                            SELECT COUNT(*)
+                            FROM (
+                                SELECT base_url, MAX(id) AS run_id
+                                FROM crawl_runs
+                                WHERE status = 'completed'
+                                GROUP BY base_url
+                            ) r
+                            JOIN procurement_links p ON p.base_url = r.base_url AND p.last_run_id = r.run_id
+                        """)
+                    total_count = db_cursor.fetchone()[0]
 
-                rows = cursor.fetchall()
+                return {
+                    "success": True,
+                    "message": f"成功获取 {len(procurement_links)} 条最新采购链接记录（共 {total_count} 条）",
+                    "total_count": total_count,
+                    "procurement_links": procurement_links,
+                    "has_more": has_more,
+                    "next_cursor": next_cursor
+                }
+
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"获取最新采购链接失败: {str(e)}",
+                "total_count": 0,
+                "procurement_links": [],
+                "has_more": False,
+                "next_cursor": None
+            }
+
+    @db_read
+    def fulltext_search_procurement_links(self, query: str, base_url: Optional[str] = None,
+                                          hospital_id: Optional[int] = None,
+                                          time_start: Optional[str] = None, time_end: Optional[str] = None,
+                                          page: int = 1, page_size: int = 20) -> dict:
+        """
+        全文检索采购链接文本（按bm25相关度排序，分页）
+
+        Args:
+            query: 检索词，多个词以空格分隔（AND关系）
+            base_url: 可选，限定采购基础URL
+            hospital_id: 可选，限定为该医院的采购基础URL（base_procurement_link）
+            time_start: 可选，首次发现时间起 (YYYY-MM-DD)
+            time_end: 可选，首次发现时间止 (YYYY-MM-DD)
+            page: 页码，从1开始
+            page_size: 每页条数（最大100）
+
+        Returns:
+            dict: 包含检索结果和统计信息的字典
+        """
+        page = max(1, page)
+        page_size = min(max(1, page_size), 100)
+        try:
+            match_expr, single_chars = build_bigram_match(query or "")
+            if not match_expr and not single_chars:
+                raise ValueError("检索词不能为空")
+
+            conditions, params = [], []
+            if match_expr:
+                conditions.append("procurement_links_fts MATCH ?")
+                params.append(match_expr)
+            for char in single_chars:
+                conditions.append("p.link_text LIKE ?")
+                params.append(f"%{char}%")
+            if base_url:
+                conditions.append("p.base_url = ?")
+                params.append(base_url)
+            if hospital_id:
+                conditions.append("p.base_url = (SELECT base_procurement_link FROM hospitals WHERE id = ?)")
+                params.append(hospital_id)
+            if time_start:
+                conditions.append("p.first_seen_epoch >= CAST(strftime('%s', DATE(?)) AS INTEGER)")
+                params.append(time_start)
+            if time_end:
+                conditions.append("p.first_seen_epoch < CAST(strftime('%s', DATE(?), '+1 day') AS INTEGER)")
+                params.append(time_end)
+            where_sql = " AND ".join(conditions)
+            # bm25越小越相关，取反后得分越大越相关；只有单字LIKE条件时不计算相关度
+            score_sql = "-bm25(procurement_links_fts)" if match_expr else "0.0"
+
+            with self.pool.reader() as conn:
+                cursor = conn.cursor()
+
+                cursor.execute(f"""
+                    SELECT COUNT(*)
+                    FROM procurement_links_fts f
+                    JOIN procurement_links p ON p.id = f.rowid
+                    WHERE {where_sql}
+                """, params)
+                total_count = cursor.fetchone()[0]
+
+                cursor.execute(f"""
+                    SELECT p.id, p.base_url, p.url, p.link_text, p.first_seen_at, p.last_seen_at,
+                           p.last_run_id IS NOT NULL AND p.last_run_id = (
+                               SELECT MAX(id) FROM crawl_runs WHERE base_url = p.base_url AND status = 'completed'
+                           ) AS is_latest,
+                           {score_sql} AS score
+                    FROM procurement_links_fts f
+                    JOIN procurement_links p ON p.id = f.rowid
+                    WHERE {where_sql}
+                    ORDER BY score DESC, p.first_seen_epoch DESC, p.id DESC
+                    LIMIT ? OFFSET ?
+                """, params + [page_size, (page - 1) * page_size])
 
                 procurement_links = []
-                for row in rows:
+                for row in cursor.fetchall():
                     procurement_links.append({
                         "id": row[0],
                         "base_url": row[1],
@@ -1409,31 +2131,44 @@ class Database:
                         "link_text": row[3],
                         "first_seen_at": row[4],
                         "last_seen_at": row[5],
-                        "is_latest": bool(row[6])
+                        "is_latest": bool(row[6]),
+                        "score": round(row[7], 4)
                     })
 
-                return {
-                    "success": True,
-                    "message": f"成功获取 {len(procurement_links)} 条最新采购链接记录",
-                    "total_count": len(procurement_links),
-                    "procurement_links": procurement_links
-                }
+            logger.info(f"采购链接全文检索完成: query='{query}', base_url={base_url}, hospital_id={hospital_id}, "
+                        f"time_start={time_start}, time_end={time_end}, 共 {total_count} 条, 本页 {len(procurement_links)} 条")
+
+            return {
+                "success": True,
+                "message": f"检索完成，共 {total_count} 条匹配记录",
+                "total_count": total_count,
+                "page": page,
+                "page_size": page_size,
+                "has_more": page * page_size < total_count,
+                "procurement_links": procurement_links
+            }
 
         except Exception as e:
+            error_msg = f"全文检索采购链接失败: {e}"
+            logger.error(error_msg)
             return {
                 "success": False,
-                "message": f"获取最新采购链接失败: {str(e)}",
+                "message": error_msg,
                 "total_count": 0,
+                "page": page,
+                "page_size": page_size,
+                "has_more": False,
                 "procurement_links": []
             }
 
-    async def update_hospital(self, hospital_id: int, name: str = None, level: str = None,
+    @db_write(tables=("hospitals",))
+    def update_hospital(self, hospital_id: int, name: str = None, level: str = None,
                             address: str = None, phone: str = None, beds_count: int = None,
                             staff_count: int = None, departments: list = None,
                             specializations: list = None, website: str = None) -> bool:
         """更新医院信息"""
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.writer() as conn:
                 cursor = conn.cursor()
 
                 # 构建更新字段列表
@@ -1494,63 +2229,60 @@ class Database:
             logger.error(f"更新医院信息失败: {e}")
             return False
 
-    async def update_hospital_website(self, hospital_id: int, website: str) -> dict:
+    @db_write(tables=("hospitals",))
+    def update_hospital_website(self, hospital_id: int, website: str) -> dict:
         """专门更新医院网站信息"""
         request_id = f"DB-{uuid.uuid4().hex[:8]}"
         logger.info(f"[{request_id}] 数据库操作开始: update_hospital_website")
         logger.info(f"[{request_id}] 参数: hospital_id={hospital_id}, website='{website}'")
 
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30.0)
-            conn.execute("PRAGMA journal_mode=WAL")
-            cursor = conn.cursor()
+            # 写连接串行化所有写事务，锁等待由busy_timeout处理，无需手动重试
+            with self.pool.writer() as conn:
+                cursor = conn.cursor()
 
                 # 首先获取医院当前信息
-            logger.info(f"[{request_id}] 步骤1: 查询当前医院信息")
-            cursor.execute("""
-                SELECT id, name, website FROM hospitals WHERE id = ?
-            """, (hospital_id,))
+                logger.info(f"[{request_id}] 步骤1: 查询当前医院信息")
+                cursor.execute("""
+                    SELECT id, name, website FROM hospitals WHERE id = ?
+                """, (hospital_id,))
 
-            hospital_info = cursor.fetchone()
-            if not hospital_info:
-                error_msg = f"医院ID {hospital_id} 不存在"
-                logger.error(f"[{request_id}] 数据库错误: {error_msg}")
-                conn.close()
-                return {"success": False, "error": error_msg, "request_id": request_id}
+                hospital_info = cursor.fetchone()
+                if not hospital_info:
+                    error_msg = f"医院ID {hospital_id} 不存在"
+                    logger.error(f"[{request_id}] 数据库错误: {error_msg}")
+                    return {"success": False, "error": error_msg, "request_id": request_id}
 
-            current_hospital = {
-                "id": hospital_info[0],
-                "name": hospital_info[1],
-                "current_website": hospital_info[2]
-            }
+                current_hospital = {
+                    "id": hospital_info[0],
+                    "name": hospital_info[1],
+                    "current_website": hospital_info[2]
+                }
 
-            logger.info(f"[{request_id}] 当前医院信息: name='{current_hospital['name']}', current_website='{current_hospital['current_website']}'")
+                logger.info(f"[{request_id}] 当前医院信息: name='{current_hospital['name']}', current_website='{current_hospital['current_website']}'")
 
-            # 检查是否需要更新
-            if current_hospital['current_website'] == website:
-                logger.info(f"[{request_id}] 网站信息无变化，跳过更新")
-                conn.close()
-                return {
-                    "success": True,
-                    "updated": False,
-                    "message": "网站信息无变化",
-                    "hospital_name": current_hospital['name'],
-                    "previous_website": current_hospital['current_website'],
-                    "new_website": website,
-                    "request_id": request_id
-                }
+                # 检查是否需要更新
+                if current_hospital['current_website'] == website:
+                    logger.info(f"[{request_id}] 网站信息无变化，跳过更新")
+                    return {
+                        "success": True,
+                        "updated": False,
+                        "message": "网站信息无变化",
+                        "hospital_name": current_hospital['name'],
+                        "previous_website": current_hospital['current_website'],
+                        "new_website": website,
+                        "request_id": request_id
+                    }
 
-            # 执行更新操作
-            logger.info(f"[{request_id}] 步骤2: 执行网站更新操作")
-            cursor.execute("""
-                UPDATE hospitals
-                SET website = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            """, (website, hospital_id))
+                # 执行更新操作
+                logger.info(f"[{request_id}] 步骤2: 执行网站更新操作")
+                cursor.execute("""
+                    UPDATE hospitals
+                    SET website = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """, (website, hospital_id))
 
-            rows_affected = cursor.rowcount
-            conn.commit()
-            conn.close()
+                rows_affected = cursor.rowcount
 
             if rows_affected > 0:
                 logger.info(f"[{request_id}] 数据库更新成功: 影响行数={rows_affected}")
@@ -1570,29 +2302,8 @@ class Database:
             else:
                 error_msg = f"更新失败，影响行数为0"
                 logger.error(f"[{request_id}] 数据库错误: {error_msg}")
-                conn.close()
                 return {"success": False, "error": error_msg, "request_id": request_id}
 
-        except sqlite3.OperationalError as e:
-            if "database is locked" in str(e):
-                # 数据库锁定时重试
-                logger.warning(f"[{request_id}] 数据库锁定，等待重试...")
-                import time
-                time.sleep(0.5)  # 等待0.5秒后重试
-                try:
-                    # 重试一次
-                    return await self.update_hospital_website(hospital_id, website)
-                except:
-                    error_msg = f"数据库锁定重试失败: {str(e)}"
-                    logger.error(f"[{request_id}] {error_msg}")
-                    return {"success": False, "error": error_msg, "request_id": request_id}
-            else:
-                error_msg = f"更新医院网站失败: {str(e)}"
-                logger.error(f"[{request_id}] 数据库异常: {error_msg}")
-                logger.error(f"[{request_id}] 异常详情: {type(e).__name__}: {str(e)}")
-                import traceback
-                logger.error(f"[{request_id}] 完整堆栈: {traceback.format_exc()}")
-                return {"success": False, "error": error_msg, "request_id": request_id}
         except Exception as e:
             error_msg = f"更新医院网站失败: {str(e)}"
             logger.error(f"[{request_id}] 数据库异常: {error_msg}")
@@ -1600,22 +2311,16 @@ class Database:
             import traceback
             logger.error(f"[{request_id}] 完整堆栈: {traceback.format_exc()}")
             return {"success": False, "error": error_msg, "request_id": request_id}
-        finally:
-            # 确保连接被关闭
-            try:
-                if 'conn' in locals():
-                    conn.close()
-            except:
-                pass
-
-    async def find_hospital_by_name(self, hospital_name: str, exact_match: bool = True) -> dict:
+
+    @db_read
+    def find_hospital_by_name(self, hospital_name: str, exact_match: bool = True) -> dict:
         """根据医院名称查找医院信息"""
         request_id = f"DB-{uuid.uuid4().hex[:8]}"
         logger.info(f"[{request_id}] 数据库查询开始: find_hospital_by_name")
         logger.info(f"[{request_id}] 参数: hospital_name='{hospital_name}', exact_match={exact_match}")
 
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.reader() as conn:
                 cursor = conn.cursor()
 
                 if exact_match:
@@ -1635,8 +2340,9 @@ class Database:
                         LIMIT 1
                     """, (hospital_name.strip(),))
                 else:
-                    # 模糊匹配
+                    # 模糊匹配：全文检索取相关度最高的医院
                     logger.info(f"[{request_id}] 执行模糊匹配查询")
+                    hospital_ids = self._match_hospital_ids(cursor, hospital_name.strip(), 1, exclude_deleted=False)
                     cursor.execute("""
                         SELECT h.id, h.name, h.level, h.district_id, h.address, h.phone,
                                h.website, h.beds_count, h.staff_count, h.departments,
@@ -1646,10 +2352,8 @@ class Database:
                         LEFT JOIN districts d ON h.district_id = d.id
                         LEFT JOIN cities c ON d.city_id = c.id
                         LEFT JOIN provinces p ON c.province_id = p.id
-                        WHERE h.name LIKE ?
-                        ORDER BY h.name
-                        LIMIT 5
-                    """, (f"%{hospital_name.strip()}%",))
+                        WHERE h.id = ?
+                    """, (hospital_ids[0] if hospital_ids else None,))
 
                 result = cursor.fetchone()
 
@@ -1700,14 +2404,15 @@ class Database:
                 "request_id": request_id
             }
 
-    async def get_task_info(self, task_id: str) -> dict:
+    @db_read
+    def get_task_info(self, task_id: str) -> dict:
         """获取任务基本信息"""
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.reader() as conn:
                 cursor = conn.cursor()
 
                 cursor.execute("""
-                    SELECT task_id, hospital_name, query, status, created_at, updated_at, result, error_message
+                    SELECT task_id, hospital_name, query, status, created_at, updated_at, result, error_message, progress
                     FROM tasks
                     WHERE task_id = ?
                 """, (task_id,))
@@ -1718,12 +2423,12 @@ class Database:
                     task_info = dict(zip(columns, row))
 
                     # 如果有结果，尝试解析JSON
-                    if task_info.get('result'):
-                        try:
-                            import json
-                            task_info['result'] = json.loads(task_info['result'])
-                        except json.JSONDecodeError:
-                            pass
+                    for field in ('result', 'progress'):
+                        if task_info.get(field):
+                            try:
+                                task_info[field] = json.loads(task_info[field])
+                            except json.JSONDecodeError:
+                                pass
 
                     return task_info
 
@@ -1733,14 +2438,16 @@ class Database:
             logger.error(f"获取任务信息失败: {e}")
             return None
 
-    async def clear_all_tasks(self) -> bool:
+    @db_write(tables=("tasks", "refresh_checkpoints"))
+    def clear_all_tasks(self) -> bool:
         """删除所有任务记录"""
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.writer() as conn:
                 cursor = conn.cursor()
 
-                # 删除所有任务记录
+                # 删除所有任务记录及其级联刷新断点
                 cursor.execute("DELETE FROM tasks")
+                cursor.execute("DELETE FROM refresh_checkpoints")
 
                 # 重置自增ID（如果有的话）
                 cursor.execute("DELETE FROM sqlite_sequence WHERE name='tasks'")
@@ -1753,10 +2460,11 @@ class Database:
             logger.error(f"删除所有任务失败: {e}")
             return False
 
-    async def delete_completed_task(self, task_id: str) -> bool:
+    @db_write(tables=("tasks", "hospital_info"))
+    def delete_completed_task(self, task_id: str) -> bool:
         """删除已完成的任务记录"""
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.writer() as conn:
                 cursor = conn.cursor()
 
                 # 先删除相关的医院信息记录（如果有外键关系）
@@ -1782,10 +2490,11 @@ class Database:
             logger.error(f"❌ 删除完成任务记录失败: {e}")
             return False
 
-    async def cleanup_completed_tasks(self, older_than_hours: int = 1) -> int:
+    @db_write(tables=("tasks", "hospital_info"))
+    def cleanup_completed_tasks(self, older_than_hours: int = 1) -> int:
         """清理指定时间前已完成的任务"""
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.writer() as conn:
                 cursor = conn.cursor()
 
                 # 计算时间边界
@@ -1819,10 +2528,264 @@ class Database:
             logger.error(f"❌ 清理完成任务记录失败: {e}")
             return 0
 
-    async def clear_all_tables_data(self) -> bool:
+    # 后台作业队列
+    @db_write(tables=("jobs",))
+    def enqueue_job(self, job_id: str, job_type: str, payload: Dict[str, Any], max_attempts: int = 3,
+                    delay_seconds: float = 0.0, replace_finished: bool = False) -> bool:
+        """
+        作业入队（job_id与任务ID相同）；job_id已存在时返回False。
+        replace_finished=True 时已结束（succeeded/failed）的同ID作业重新入队（尝试次数清零），排队或运行中的仍返回False。
+        """
+        with self.pool.writer() as conn:
+            cursor = conn.cursor()
+            now = datetime.now().isoformat()
+            conflict_sql = """
+                ON CONFLICT(job_id) DO UPDATE SET
+                    job_type = excluded.job_type, payload = excluded.payload, status = 'queued',
+                    attempts = 0, max_attempts = excluded.max_attempts, run_after = excluded.run_after,
+                    lease_owner = NULL, lease_token = NULL, lease_expires_at = NULL, heartbeat_at = NULL,
+                    last_error = NULL, updated_at = excluded.updated_at, finished_at = NULL
+                WHERE jobs.status IN ('succeeded', 'failed')
+            """ if replace_finished else "ON CONFLICT(job_id) DO NOTHING"
+            cursor.execute(f"""
+                INSERT INTO jobs (job_id, job_type, payload, status, attempts, max_attempts,
+                                  run_after, created_at, updated_at)
+                VALUES (?, ?, ?, 'queued', 0, ?, ?, ?, ?)
+                {conflict_sql}
+            """, (job_id, job_type, json.dumps(payload, ensure_ascii=False, default=str),
+                  max(1, max_attempts), time.time() + delay_seconds, now, now))
+            conn.commit()
+            return cursor.rowcount > 0
+
+    @db_read
+    def count_claimable_jobs(self) -> Dict[str, int]:
+        """
+        统计可领取的作业数（claimable）和租约过期且次数用尽的作业数（exhausted）。
+        工作协程空闲轮询时先走只读查询，避免每次轮询都产生写操作（作业表的写操作只使依赖jobs表的缓存失效）。
+        """
+        with self.pool.reader() as conn:
+            cursor = conn.cursor()
+            now = time.time()
+            cursor.execute("""
+                SELECT
+                    SUM(CASE WHEN status = 'queued' OR attempts < max_attempts THEN 1 ELSE 0 END),
+                    SUM(CASE WHEN status = 'running' AND attempts >= max_attempts THEN 1 ELSE 0 END)
+                FROM jobs
+                WHERE (status = 'queued' AND run_after <= ?)
+                   OR (status = 'running' AND lease_expires_at < ?)
+            """, (now, now))
+            claimable, exhausted = cursor.fetchone()
+            return {"claimable": claimable or 0, "exhausted": exhausted or 0}
+
+    @db_write(tables=("jobs",))
+    def claim_job(self, worker_id: str, lease_seconds: float,
+                  exclude_job_ids: Optional[list] = None) -> Optional[Dict[str, Any]]:
+        """
+        领取一个可运行的作业并加租约：到期的排队作业，或租约已过期且仍有剩余次数的运行中作业。
+        更新时校验状态、租约令牌和次数未变（比较并交换），多进程共用数据库时不会重复领取；
+        每次领取生成新的 lease_token，exclude_job_ids 为本进程仍在执行的作业（租约过期也不重新领取）。
+        """
+        exclude = set(exclude_job_ids or ())
+        with self.pool.writer() as conn:
+            cursor = conn.cursor()
+            now = time.time()
+            cursor.execute("""
+                SELECT * FROM jobs
+                WHERE (status = 'queued' AND run_after <= ?)
+                   OR (status = 'running' AND lease_expires_at < ? AND attempts < max_attempts)
+                ORDER BY run_after, created_at
+                LIMIT ?
+            """, (now, now, 5 + len(exclude)))
+            candidates = [job for job in (_job_from_row(cursor, row) for row in cursor.fetchall())
+                          if job["job_id"] not in exclude]
+
+            for job in candidates:
+                lease_token = uuid.uuid4().hex
+                cursor.execute("""
+                    UPDATE jobs
+                    SET status = 'running', attempts = attempts + 1, lease_owner = ?, lease_token = ?,
+                        lease_expires_at = ?, heartbeat_at = ?, updated_at = ?
+                    WHERE job_id = ? AND status = ? AND attempts = ? AND lease_token IS ?
+                """, (worker_id, lease_token, now + lease_seconds, now, datetime.now().isoformat(),
+                      job["job_id"], job["status"], job["attempts"], job["lease_token"]))
+                if cursor.rowcount == 0:
+                    continue
+                conn.commit()
+                job["recovered_from"] = job["lease_owner"] if job["status"] == "running" else None
+                job["status"] = "running"
+                job["attempts"] += 1
+                job["lease_owner"] = worker_id
+                job["lease_token"] = lease_token
+                job["lease_expires_at"] = now + lease_seconds
+                return job
+            return None
+
+    @db_write(tables=("jobs",))
+    def heartbeat_job(self, job_id: str, lease_token: str, lease_seconds: float) -> bool:
+        """续租；返回False表示该次领取的租约已失效（已过期被重新领取或作业被删除）"""
+        with self.pool.writer() as conn:
+            cursor = conn.cursor()
+            now = time.time()
+            cursor.execute("""
+                UPDATE jobs SET lease_expires_at = ?, heartbeat_at = ?
+                WHERE job_id = ? AND status = 'running' AND lease_token = ?
+            """, (now + lease_seconds, now, job_id, lease_token))
+            conn.commit()
+            return cursor.rowcount > 0
+
+    @db_write(tables=("jobs",))
+    def finish_job(self, job_id: str, lease_token: str, error: Optional[str] = None) -> bool:
+        """作业结束：error为空时标记succeeded，否则标记failed；只有持有该次租约令牌的执行可以结束作业"""
+        with self.pool.writer() as conn:
+            cursor = conn.cursor()
+            now = datetime.now().isoformat()
+            cursor.execute("""
+                UPDATE jobs
+                SET status = ?, last_error = ?, lease_owner = NULL, lease_token = NULL, lease_expires_at = NULL,
+                    updated_at = ?, finished_at = ?
+                WHERE job_id = ? AND status = 'running' AND lease_token = ?
+            """, ("failed" if error else "succeeded", error, now, now, job_id, lease_token))
+            conn.commit()
+            return cursor.rowcount > 0
+
+    @db_write(tables=("jobs",))
+    def release_job(self, job_id: str, lease_token: str) -> bool:
+        """归还租约（服务正常关闭时），作业回到队列且不计入尝试次数"""
+        with self.pool.writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE jobs
+                SET status = 'queued', attempts = MAX(attempts - 1, 0), run_after = ?,
+                    lease_owner = NULL, lease_token = NULL, lease_expires_at = NULL, updated_at = ?
+                WHERE job_id = ? AND status = 'running' AND lease_token = ?
+            """, (time.time(), datetime.now().isoformat(), job_id, lease_token))
+            conn.commit()
+            return cursor.rowcount > 0
+
+    @db_write(tables=("jobs",))
+    def expire_job_leases(self, lease_owners: list) -> int:
+        """使指定持有者（已退出的进程）的租约立即过期，作业可被马上重新领取"""
+        if not lease_owners:
+            return 0
+        with self.pool.writer() as conn:
+            cursor = conn.cursor()
+            placeholders = ",".join("?" * len(lease_owners))
+            cursor.execute(f"""
+                UPDATE jobs SET lease_expires_at = 0
+                WHERE status = 'running' AND lease_owner IN ({placeholders})
+            """, tuple(lease_owners))
+            conn.commit()
+            return cursor.rowcount
+
+    @db_write(tables=("jobs",))
+    def fail_exhausted_jobs(self) -> list:
+        """租约已过期且尝试次数用尽的运行中作业标记为failed（反复导致进程崩溃的作业），返回这些作业"""
+        with self.pool.writer() as conn:
+            cursor = conn.cursor()
+            now = time.time()
+            cursor.execute("""
+                SELECT * FROM jobs
+                WHERE status = 'running' AND lease_expires_at < ? AND attempts >= max_attempts
+            """, (now,))
+            jobs = [_job_from_row(cursor, row) for row in cursor.fetchall()]
+            for job in jobs:
+                job["last_error"] = f"作业执行中断 {job['attempts']} 次（租约过期），已达到最大尝试次数"
+                cursor.execute("""
+                    UPDATE jobs
+                    SET status = 'failed', last_error = ?, lease_owner = NULL, lease_token = NULL,
+                        lease_expires_at = NULL, updated_at = ?, finished_at = ?
+                    WHERE job_id = ? AND status = 'running' AND attempts = ?
+                """, (job["last_error"], datetime.now().isoformat(), datetime.now().isoformat(),
+                      job["job_id"], job["attempts"]))
+            conn.commit()
+            return jobs
+
+    @db_read
+    def list_jobs(self, status: Optional[str] = None, limit: int = 100) -> list:
+        """获取作业列表（按创建时间倒序）"""
+        with self.pool.reader() as conn:
+            cursor = conn.cursor()
+            if status:
+                cursor.execute("SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?", (status, limit))
+            else:
+                cursor.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))
+            return [_job_from_row(cursor, row) for row in cursor.fetchall()]
+
+    @db_read
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """获取单个作业"""
+        with self.pool.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,))
+            row = cursor.fetchone()
+            return _job_from_row(cursor, row) if row else None
+
+    @db_read
+    def get_job_counts(self) -> Dict[str, int]:
+        """各状态的作业数量"""
+        with self.pool.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+            return {status: count for status, count in cursor.fetchall()}
+
+    # 级联刷新断点
+    @db_write(tables=("refresh_checkpoints",))
+    def save_refresh_checkpoint(self, task_id: str, unit_type: str, unit_key: Any, status: str,
+                                detail: Any = None) -> bool:
+        """记录级联刷新单元的进度（同一单元重复记录时覆盖）"""
+        with self.pool.writer() as conn:
+            cursor = conn.cursor()
+            now = datetime.now().isoformat()
+            cursor.execute("""
+                INSERT INTO refresh_checkpoints (task_id, unit_type, unit_key, status, detail, updated_at, completed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(task_id, unit_type, unit_key) DO UPDATE SET
+                    status = excluded.status, detail = COALESCE(excluded.detail, refresh_checkpoints.detail),
+                    updated_at = excluded.updated_at, completed_at = excluded.completed_at
+            """, (task_id, unit_type, str(unit_key), status,
+                  json.dumps(detail, ensure_ascii=False) if detail is not None else None,
+                  now, now if status == "completed" else None))
+            conn.commit()
+            return True
+
+    @db_read
+    def get_refresh_checkpoints(self, task_id: str) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """获取任务的全部断点: {unit_type: {unit_key: {status, detail, updated_at, completed_at}}}"""
+        with self.pool.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT unit_type, unit_key, status, detail, updated_at, completed_at
+                FROM refresh_checkpoints WHERE task_id = ?
+            """, (task_id,))
+            checkpoints: Dict[str, Dict[str, Dict[str, Any]]] = {}
+            for unit_type, unit_key, status, detail, updated_at, completed_at in cursor.fetchall():
+                checkpoints.setdefault(unit_type, {})[unit_key] = {
+                    "status": status,
+                    "detail": json.loads(detail) if detail else None,
+                    "updated_at": updated_at,
+                    "completed_at": completed_at,
+                }
+            return checkpoints
+
+    @db_read
+    def get_refresh_checkpoint_counts(self, task_id: str) -> Dict[str, Dict[str, int]]:
+        """按单元类型、状态统计任务的断点数量"""
+        with self.pool.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT unit_type, status, COUNT(*) FROM refresh_checkpoints
+                WHERE task_id = ? GROUP BY unit_type, status
+            """, (task_id,))
+            counts: Dict[str, Dict[str, int]] = {}
+            for unit_type, status, count in cursor.fetchall():
+                counts.setdefault(unit_type, {})[status] = count
+            return counts
+
+    @db_write
+    def clear_all_tables_data(self) -> bool:
         """清空所有表的数据，保留表结构"""
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.writer() as conn:
                 cursor = conn.cursor()
 
                 # 获取所有表名
@@ -1841,7 +2804,9 @@ class Database:
                     'districts',      # 依赖于 cities
                     'cities',         # 依赖于 provinces
                     'provinces',      # 无外键依赖
-                    'tasks'           # 无外键依赖
+                    'tasks',          # 无外键依赖
+                    'jobs',           # 无外键依赖
+                    'refresh_checkpoints'  # 无外键依赖
                 ]
 
                 # 按顺序清空存在的表
@@ -1856,6 +2821,7 @@ class Database:
                     cursor.execute(f"DELETE FROM sqlite_sequence WHERE name='{table_name}'")
 
                 conn.commit()
+                self.hierarchy.invalidate()
 
                 logger.info("所有数据库表数据清空完成，表结构保留")
                 return True
@@ -1864,7 +2830,8 @@ class Database:
             logger.error(f"清空数据库失败: {e}")
             return False
 
-    async def get_hospital_by_id(self, hospital_id: int) -> dict:
+    @db_read
+    def get_hospital_by_id(self, hospital_id: int) -> dict:
         """
         根据ID获取医院基本信息
 
@@ -1879,7 +2846,7 @@ class Database:
         logger.info(f"[{request_id}] 参数: hospital_id={hospital_id}")
 
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.reader() as conn:
                 cursor = conn.cursor()
 
                 # 查询医院基本信息
@@ -1917,7 +2884,8 @@ class Database:
             logger.error(f"[{request_id}] 异常堆栈: {traceback.format_exc()}")
             return None
 
-    async def soft_delete_hospital(self, hospital_id: int) -> dict:
+    @db_write(tables=("hospitals",))
+    def soft_delete_hospital(self, hospital_id: int) -> dict:
         """
         软删除医院（标记为已删除）
 
@@ -1932,7 +2900,7 @@ class Database:
         logger.info(f"[{request_id}] 参数: hospital_id={hospital_id}")
 
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.writer() as conn:
                 cursor = conn.cursor()
 
                 # 检查医院是否存在且未被删除
@@ -1993,7 +2961,8 @@ class Database:
                 "hospital_id": hospital_id
             }
 
-    async def clear_hospital_website(self, hospital_id: int) -> dict:
+    @db_write(tables=("hospitals",))
+    def clear_hospital_website(self, hospital_id: int) -> dict:
         """
         清除医院网站（设置为"无"）
 
@@ -2008,7 +2977,7 @@ class Database:
         logger.info(f"[{request_id}] 参数: hospital_id={hospital_id}")
 
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.writer() as conn:
                 cursor = conn.cursor()
 
                 # 检查医院是否存在
@@ -2069,7 +3038,8 @@ class Database:
                 "hospital_id": hospital_id
             }
 
-    async def clear_hospital_procurement_link(self, hospital_id: int) -> dict:
+    @db_write(tables=("hospitals",))
+    def clear_hospital_procurement_link(self, hospital_id: int) -> dict:
         """
         清除医院基础采购链接（设置为"无"）
 
@@ -2084,7 +3054,7 @@ class Database:
         logger.info(f"[{request_id}] 参数: hospital_id={hospital_id}")
 
         try:
-            with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            with self.pool.writer() as conn:
                 cursor = conn.cursor()
 
                 # 检查医院是否存在
@@ -2145,6 +3115,53 @@ class Database:
                 "hospital_id": hospital_id
             }
 
+    @db_read
+    def get_hospital_websites_by_ids(self, hospital_ids: list) -> list:
+        """根据ID列表获取医院的id、名称和官网"""
+        if not hospital_ids:
+            return []
+        placeholders = ','.join(['?' for _ in hospital_ids])
+        with self.pool.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT id, name, website FROM hospitals
+                WHERE id IN ({placeholders})
+                ORDER BY id
+            """, list(hospital_ids))
+            rows = cursor.fetchall()
+        return [{"id": row[0], "name": row[1], "website": row[2]} for row in rows]
+
+    @db_read
+    def get_hospital_websites(self, limit: Optional[int] = None) -> list:
+        """获取医院的id、名称和官网，limit为None时不限制数量"""
+        with self.pool.reader() as conn:
+            cursor = conn.cursor()
+            if limit is None:
+                cursor.execute("""
+                    SELECT id, name, website FROM hospitals
+                    ORDER BY id
+                """)
+            else:
+                cursor.execute("""
+                    SELECT id, name, website FROM hospitals
+                    ORDER BY id
+                    LIMIT ?
+                """, (limit,))
+            rows = cursor.fetchall()
+        return [{"id": row[0], "name": row[1], "website": row[2]} for row in rows]
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """获取数据库连接池、执行器及行政区划缓存使用指标"""
+        stats = self.pool.get_stats()
+        stats["executor"] = self.executor.get_stats()
+        stats["hierarchy_cache"] = self.hierarchy.get_stats()
+        return stats
+
+    def close(self):
+        """关闭执行器（等待排队中的写操作完成）和数据库连接池"""
+        self.executor.shutdown(wait=True)
+        self.pool.close()
+
 # 全局数据库实例
 _db_instance = None
 
@@ -2159,8 +3176,16 @@ async def init_db():
     """初始化数据库"""
     db = await get_db()
     await db.init_db()
+    await db.warm_hierarchy_cache()
     return db
 
+async def close_db():
+    """关闭数据库连接池（应用关闭时调用）"""
+    global _db_instance
+    if _db_instance is not None:
+        _db_instance.close()
+        _db_instance = None
+
 # 清空数据库的方法
 async def clear_all_data():
     """清空所有表的数据，保留表结构"""
@@ -2174,7 +3199,8 @@ async def clear_all_tasks():
     return await db.clear_all_tasks()
 
 # 搜索采购信息的方法
-async def search_procurement_links(base_url: str, time_start: str, time_end: str) -> dict:
+async def search_procurement_links(base_url: str, time_start: str, time_end: str,
+                                   limit: Optional[int] = None, cursor: Optional[str] = None) -> dict:
     """
     搜索采购信息
 
@@ -2182,23 +3208,52 @@ async def search_procurement_links(base_url: str, time_start: str, time_end: str
         base_url: 采购基础URL
         time_start: 开始时间 (YYYY-MM-DD 格式)
         time_end: 结束时间 (YYYY-MM-DD 格式)
+        limit: 每页条数，None 表示不分页
+        cursor: 上一页返回的 next_cursor
 
     Returns:
         dict: 包含搜索结果和统计信息的字典
     """
     db = await get_db()
-    return await db.search_procurement_links(base_url, time_start, time_end)
+    return await db.search_procurement_links(base_url, time_start, time_end, limit=limit, cursor=cursor)
 
 # 获取最新采购链接的方法
-async def get_latest_procurement_links(base_url: str = None) -> dict:
+async def get_latest_procurement_links(base_url: str = None, limit: Optional[int] = None,
+                                       cursor: Optional[str] = None) -> dict:
     """
-    获取is_latest=1的采购链接记录
+    获取最新的采购链接记录
 
     Args:
-        base_url: 可选的采购基础URL，如果为空则搜索所有is_latest=1的记录
+        base_url: 可选的采购基础URL，如果为空则搜索所有站点的最新记录
+        limit: 每页条数，None 表示不分页
+        cursor: 上一页返回的 next_cursor
 
     Returns:
         dict: 包含搜索结果和统计信息的字典
     """
     db = await get_db()
-    return await db.get_latest_procurement_links(base_url)
\ No newline at end of file
+    return await db.get_latest_procurement_links(base_url, limit=limit, cursor=cursor)
+
+# 全文检索采购链接的方法
+async def fulltext_search_procurement_links(query: str, base_url: str = None, hospital_id: int = None,
+                                            time_start: str = None, time_end: str = None,
+                                            page: int = 1, page_size: int = 20) -> dict:
+    """
+    全文检索采购链接文本
+
+    Args:
+        query: 检索词，多个词以空格分隔（AND关系）
+        base_url: 可选，限定采购基础URL
+        hospital_id: 可选，限定为该医院的采购基础URL
+        time_start: 可选，首次发现时间起 (YYYY-MM-DD)
+        time_end: 可选，首次发现时间止 (YYYY-MM-DD)
+        page: 页码
+        page_size: 每页条数
+
+    Returns:
+        dict: 包含检索结果和统计信息的字典
+    """
+    db = await get_db()
+    return await db.fulltext_search_procurement_links(query, base_url=base_url, hospital_id=hospital_id,
+                                                      time_start=time_start, time_end=time_end,
+                                                      page=page, page_size=page_size)
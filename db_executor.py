@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+医院层级扫查微服务 - 数据库执行器
+
+sqlite3 调用都是阻塞的，这里把它们移出事件循环：
+- 写操作：单个写线程按提交顺序依次执行（ThreadPoolExecutor内部队列即写队列）
+- 读操作：读线程池并发执行，线程数默认与读连接池大小一致
+- 写代次：写方法可声明写入的表（@db_write(tables=...)），读侧缓存按表判断是否失效；
+  未声明的写操作视为可能修改任意表
+"""
+
+import os
+import time
+import asyncio
+import logging
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, Iterable, Optional
+
+from db_pool import DB_READER_POOL_SIZE
+
+logger = logging.getLogger(__name__)
+
+DB_READER_THREADS = int(os.getenv("DB_READER_THREADS", str(DB_READER_POOL_SIZE)))
+
+
+class DatabaseExecutor:
+    """数据库执行器：单写线程 + 读线程池"""
+
+    def __init__(self, reader_threads: int = DB_READER_THREADS):
+        self.reader_threads = max(1, reader_threads)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._readers = ThreadPoolExecutor(max_workers=self.reader_threads, thread_name_prefix="db-reader")
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "read": {"submitted": 0, "completed": 0, "failed": 0, "pending": 0,
+                     "queue_wait_seconds": 0.0, "max_queue_wait_seconds": 0.0, "run_seconds": 0.0},
+            "write": {"submitted": 0, "completed": 0, "failed": 0, "pending": 0,
+                      "queue_wait_seconds": 0.0, "max_queue_wait_seconds": 0.0, "run_seconds": 0.0},
+        }
+        # 写代次：每完成一次写操作加一；按表的代次只在写入该表时加一，
+        # 未声明写入表的操作增加 _untracked_generation（使所有按表缓存失效）
+        self._write_generation = 0
+        self._untracked_generation = 0
+        self._table_generations: Dict[str, int] = {}
+
+    def _instrument(self, kind: str, func: Callable, args: tuple, kwargs: dict,
+                    tables: Optional[tuple] = None) -> Callable[[], Any]:
+        """包装调用，记录排队等待时间和执行时间"""
+        submitted_at = time.monotonic()
+        with self._stats_lock:
+            self._stats[kind]["submitted"] += 1
+            self._stats[kind]["pending"] += 1
+
+        def call():
+            started_at = time.monotonic()
+            waited = started_at - submitted_at
+            ok = False
+            try:
+                result = func(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                with self._stats_lock:
+                    if kind == "write":
+                        self._write_generation += 1
+                        if tables is None:
+                            self._untracked_generation += 1
+                        else:
+                            for table in tables:
+                                self._table_generations[table] = self._table_generations.get(table, 0) + 1
+                    stats = self._stats[kind]
+                    stats["pending"] -= 1
+                    stats["completed" if ok else "failed"] += 1
+                    stats["queue_wait_seconds"] += waited
+                    stats["max_queue_wait_seconds"] = max(stats["max_queue_wait_seconds"], waited)
+                    stats["run_seconds"] += time.monotonic() - started_at
+
+        return call
+
+    @property
+    def write_generation(self) -> int:
+        """已完成的写操作次数"""
+        with self._stats_lock:
+            return self._write_generation
+
+    def generation_for(self, tables: Iterable[str]) -> tuple:
+        """指定表的写代次（含未声明表的写操作），不变说明期间这些表没有被写入"""
+        with self._stats_lock:
+            return (self._untracked_generation,) + tuple(self._table_generations.get(table, 0) for table in tables)
+
+    async def run_read(self, func: Callable, *args, **kwargs) -> Any:
+        """在读线程池中执行只读操作"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, self._instrument("read", func, args, kwargs))
+
+    async def run_write(self, func: Callable, *args, _tables: Optional[tuple] = None, **kwargs) -> Any:
+        """在写线程中按顺序执行写操作；_tables 为写入的表（None 表示未知，视为可能写入任意表）"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, self._instrument("write", func, args, kwargs, _tables))
+
+    def shutdown(self, wait: bool = True):
+        """关闭执行器，默认等待已提交的写操作完成"""
+        self._writer.shutdown(wait=wait)
+        self._readers.shutdown(wait=wait)
+        logger.info("🔌 数据库执行器已关闭")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取执行器使用指标"""
+        with self._stats_lock:
+            stats = {kind: dict(values) for kind, values in self._stats.items()}
+        for values in stats.values():
+            done = values["completed"] + values["failed"]
+            values["avg_queue_wait_ms"] = round(values["queue_wait_seconds"] / done * 1000, 3) if done else 0.0
+            values["avg_run_ms"] = round(values["run_seconds"] / done * 1000, 3) if done else 0.0
+            for key in ("queue_wait_seconds", "max_queue_wait_seconds", "run_seconds"):
+                values[key] = round(values[key], 3)
+        stats["reader_threads"] = self.reader_threads
+        stats["write_generation"] = self.write_generation
+        return stats
+
+
+def db_read(func: Callable) -> Callable:
+    """将Database的同步只读方法包装为在读线程池执行的异步方法"""
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        return await self.executor.run_read(func, self, *args, **kwargs)
+    return wrapper
+
+
+def db_write(func: Optional[Callable] = None, *, tables: Optional[Iterable[str]] = None) -> Callable:
+    """
+    将Database的同步写方法包装为在写线程执行的异步方法。
+    可用 @db_write(tables=("jobs",)) 声明写入的表，只让这些表的读侧缓存失效。
+    """
+    written = tuple(tables) if tables is not None else None
+
+    def decorate(write_func: Callable) -> Callable:
+        @functools.wraps(write_func)
+        async def wrapper(self, *args, **kwargs):
+            return await self.executor.run_write(write_func, self, *args, _tables=written, **kwargs)
+        return wrapper
+
+    return decorate(func) if func is not None else decorate
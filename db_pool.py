@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+医院层级扫查微服务 - SQLite连接池
+
+一个写连接（串行化所有写事务）+ N个读连接（WAL模式下可与写并发），
+PRAGMA 在创建连接时只设置一次，并记录连接池使用指标。
+"""
+
+import os
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+DB_READER_POOL_SIZE = int(os.getenv("DB_READER_POOL_SIZE", "4"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "30000"))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "65536"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+DB_POOL_CHECKOUT_TIMEOUT = float(os.getenv("DB_POOL_CHECKOUT_TIMEOUT", "30"))
+
+
+class SQLiteConnectionPool:
+    """SQLite连接池：单写连接 + 多读连接"""
+
+    def __init__(self, db_path: str, reader_pool_size: int = DB_READER_POOL_SIZE):
+        self.db_path = db_path
+        self.reader_pool_size = max(1, reader_pool_size)
+        self._writer_lock = threading.RLock()
+        self._writer_conn: Optional[sqlite3.Connection] = None
+        self._readers: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        self._readers_created = 0
+        self._create_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "writer_checkouts": 0,
+            "writer_wait_seconds": 0.0,
+            "writer_max_wait_seconds": 0.0,
+            "writer_busy": False,
+            "reader_checkouts": 0,
+            "reader_wait_seconds": 0.0,
+            "reader_max_wait_seconds": 0.0,
+            "readers_in_use": 0,
+            "reader_timeouts": 0,
+            "connections_opened": 0,
+            "rollbacks": 0,
+        }
+
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        """创建连接并设置PRAGMA（每个连接只设置一次）"""
+        conn = sqlite3.connect(self.db_path, timeout=DB_BUSY_TIMEOUT_MS / 1000.0, check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        if not read_only:
+            # journal_mode是数据库级持久设置，由写连接设置即可
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        with self._stats_lock:
+            self._stats["connections_opened"] += 1
+        return conn
+
+    def _record_wait(self, kind: str, waited: float):
+        with self._stats_lock:
+            self._stats[f"{kind}_checkouts"] += 1
+            self._stats[f"{kind}_wait_seconds"] += waited
+            if waited > self._stats[f"{kind}_max_wait_seconds"]:
+                self._stats[f"{kind}_max_wait_seconds"] = waited
+
+    @staticmethod
+    def _reset(conn: sqlite3.Connection):
+        """归还前重置连接状态，避免调用方修改的row_factory影响下一个使用者"""
+        conn.row_factory = None
+
+    @contextmanager
+    def writer(self):
+        """获取写连接（互斥），退出时提交，异常时回滚"""
+        start = time.monotonic()
+        with self._writer_lock:
+            self._record_wait("writer", time.monotonic() - start)
+            if self._writer_conn is None:
+                self._writer_conn = self._connect()
+            conn = self._writer_conn
+            self._reset(conn)
+            with self._stats_lock:
+                self._stats["writer_busy"] = True
+            try:
+                yield conn
+                if conn.in_transaction:
+                    conn.commit()
+            except BaseException:
+                if conn.in_transaction:
+                    conn.rollback()
+                    with self._stats_lock:
+                        self._stats["rollbacks"] += 1
+                raise
+            finally:
+                self._reset(conn)
+                with self._stats_lock:
+                    self._stats["writer_busy"] = False
+
+    @contextmanager
+    def reader(self):
+        """获取读连接，用完归还连接池"""
+        start = time.monotonic()
+        conn = self._acquire_reader()
+        self._record_wait("reader", time.monotonic() - start)
+        with self._stats_lock:
+            self._stats["readers_in_use"] += 1
+        try:
+            yield conn
+        finally:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            finally:
+                self._reset(conn)
+                with self._stats_lock:
+                    self._stats["readers_in_use"] -= 1
+                self._readers.put(conn)
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._create_lock:
+            if self._readers_created < self.reader_pool_size:
+                self._readers_created += 1
+                try:
+                    return self._connect(read_only=True)
+                except Exception:
+                    self._readers_created -= 1
+                    raise
+        try:
+            return self._readers.get(timeout=DB_POOL_CHECKOUT_TIMEOUT)
+        except queue.Empty:
+            with self._stats_lock:
+                self._stats["reader_timeouts"] += 1
+            raise sqlite3.OperationalError(f"等待读连接超时（{DB_POOL_CHECKOUT_TIMEOUT}秒），连接池大小: {self.reader_pool_size}")
+
+    def close(self):
+        """关闭所有连接"""
+        with self._writer_lock:
+            if self._writer_conn is not None:
+                self._writer_conn.close()
+                self._writer_conn = None
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._create_lock:
+            self._readers_created = 0
+        logger.info("🔌 数据库连接池已关闭")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取连接池使用指标"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update({
+            "db_path": self.db_path,
+            "reader_pool_size": self.reader_pool_size,
+            "readers_created": self._readers_created,
+            "readers_idle": self._readers.qsize(),
+        })
+        for kind in ("writer", "reader"):
+            checkouts = stats[f"{kind}_checkouts"]
+            stats[f"{kind}_avg_wait_ms"] = round(stats[f"{kind}_wait_seconds"] / checkouts * 1000, 3) if checkouts else 0.0
+            stats[f"{kind}_wait_seconds"] = round(stats[f"{kind}_wait_seconds"], 3)
+            stats[f"{kind}_max_wait_seconds"] = round(stats[f"{kind}_max_wait_seconds"], 3)
+        return stats
@@ -5,6 +5,9 @@ import sqlite3
 import json
 from datetime import datetime, timedelta
 
+# 站点当前批次：最近一次完成的抓取批次（与 db.CURRENT_CRAWL_RUN_SQL 一致，参数为base_url）
+CURRENT_CRAWL_RUN_SQL = "SELECT MAX(id) FROM crawl_runs WHERE base_url = ? AND status = 'completed'"
+
 def debug_hospital_procurement(hospital_name):
     """调试医院的采购信息"""
 
@@ -36,12 +39,12 @@ def debug_hospital_procurement(hospital_name):
             continue
 
         # 2. 查找采购数据
-        cursor.execute('''
+        cursor.execute(f'''
             SELECT COUNT(*) as count
             FROM procurement_links
             WHERE base_url = ?
-            AND is_latest = 1
-        ''', (base_url,))
+            AND last_run_id = ({CURRENT_CRAWL_RUN_SQL})
+        ''', (base_url, base_url))
 
         total_count = cursor.fetchone()[0]
         print(f"采购数据总数: {total_count} 条")
@@ -54,27 +57,27 @@ def debug_hospital_procurement(hospital_name):
         today = datetime.now()
         one_week_ago = today - timedelta(days=7)
 
-        cursor.execute('''
+        cursor.execute(f'''
             SELECT COUNT(*) as count
             FROM procurement_links
             WHERE base_url = ?
-            AND is_latest = 1
+            AND last_run_id = ({CURRENT_CRAWL_RUN_SQL})
             AND DATE(first_seen_at) >= DATE(?)
             AND DATE(first_seen_at) <= DATE(?)
-        ''', (base_url, one_week_ago.strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d')))
+        ''', (base_url, base_url, one_week_ago.strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d')))
 
         week_count = cursor.fetchone()[0]
         print(f"一周内数据: {week_count} 条")
 
         # 4. 显示最近几条记录
-        cursor.execute('''
+        cursor.execute(f'''
             SELECT link_text, url, first_seen_at
             FROM procurement_links
             WHERE base_url = ?
-            AND is_latest = 1
+            AND last_run_id = ({CURRENT_CRAWL_RUN_SQL})
             ORDER BY first_seen_at DESC
             LIMIT 5
-        ''', (base_url,))
+        ''', (base_url, base_url))
 
         recent_records = cursor.fetchall()
         print("\n最近5条记录:")
@@ -96,10 +99,12 @@ def list_all_hospitals_with_data():
     print("=== 所有有采购数据的医院 ===")
 
     cursor.execute('''
-        SELECT DISTINCT base_url, COUNT(*) as count
-        FROM procurement_links
-        WHERE is_latest = 1
-        GROUP BY base_url
+        SELECT p.base_url, COUNT(*) as count
+        FROM procurement_links p
+        WHERE p.last_run_id = (
+            SELECT MAX(r.id) FROM crawl_runs r WHERE r.base_url = p.base_url AND r.status = 'completed'
+        )
+        GROUP BY p.base_url
         ORDER BY count DESC
     ''')
 
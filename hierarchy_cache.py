@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+医院层级扫查微服务 - 行政区划内存缓存
+
+省/市/区县数据量小（约34个省份、3000个区县）且很少变化，
+整体加载到内存并建立名称、ID索引，级联刷新时的名称→ID解析不再访问数据库。
+创建省/市/区县及更新刷新时间时写穿更新缓存，清空数据时整体失效，下次访问重新加载。
+"""
+
+import sqlite3
+import logging
+import threading
+from typing import Dict, Any, Optional, List
+
+logger = logging.getLogger(__name__)
+
+
+class HierarchyCache:
+    """省份、城市、区县的进程内缓存（ID索引 + 名称索引）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        # 每次写穿或失效加一，用于丢弃与写操作交错的加载结果
+        self._version = 0
+        self._provinces: Dict[int, Dict[str, Any]] = {}
+        self._cities: Dict[int, Dict[str, Any]] = {}
+        self._districts: Dict[int, Dict[str, Any]] = {}
+        # 名称 -> ID列表（按ID升序，同名时与 "ORDER BY id LIMIT 1" 一致返回最小ID）
+        self._province_ids_by_name: Dict[str, List[int]] = {}
+        self._city_ids_by_name: Dict[str, List[int]] = {}
+        self._district_ids_by_name: Dict[str, List[int]] = {}
+        self._stats = {"lookups": 0, "not_found": 0, "loads": 0, "discarded_loads": 0, "invalidations": 0}
+
+    @property
+    def loaded(self) -> bool:
+        with self._lock:
+            return self._loaded
+
+    @staticmethod
+    def _index(rows: List[Dict[str, Any]]) -> tuple:
+        by_id, ids_by_name = {}, {}
+        for row in sorted(rows, key=lambda item: item["id"]):
+            by_id[row["id"]] = row
+            ids_by_name.setdefault(row["name"], []).append(row["id"])
+        return by_id, ids_by_name
+
+    def load(self, conn: sqlite3.Connection) -> bool:
+        """从数据库加载全部省/市/区县；加载期间发生写穿或失效时丢弃结果并返回False"""
+        with self._lock:
+            start_version = self._version
+
+        conn.row_factory = sqlite3.Row
+        provinces = [dict(row) for row in conn.execute("SELECT * FROM provinces")]
+        cities = [dict(row) for row in conn.execute("SELECT * FROM cities")]
+        districts = [dict(row) for row in conn.execute("SELECT * FROM districts")]
+
+        province_maps = self._index(provinces)
+        city_maps = self._index(cities)
+        district_maps = self._index(districts)
+
+        with self._lock:
+            if self._version != start_version:
+                self._stats["discarded_loads"] += 1
+                return False
+            self._provinces, self._province_ids_by_name = province_maps
+            self._cities, self._city_ids_by_name = city_maps
+            self._districts, self._district_ids_by_name = district_maps
+            self._loaded = True
+            self._stats["loads"] += 1
+
+        logger.info(f"🗺️ 行政区划缓存已加载: {len(provinces)} 个省份, {len(cities)} 个城市, {len(districts)} 个区县")
+        return True
+
+    def invalidate(self):
+        """整体失效，下次访问时重新加载"""
+        with self._lock:
+            self._version += 1
+            self._loaded = False
+            self._provinces, self._cities, self._districts = {}, {}, {}
+            self._province_ids_by_name, self._city_ids_by_name, self._district_ids_by_name = {}, {}, {}
+            self._stats["invalidations"] += 1
+
+    def _add(self, by_id: Dict[int, Dict[str, Any]], ids_by_name: Dict[str, List[int]], row: Dict[str, Any]):
+        """写穿新增记录，调用方需持有锁；未加载时只推进版本号（加载时会从数据库读到）"""
+        self._version += 1
+        if not self._loaded:
+            return
+        by_id[row["id"]] = dict(row)
+        ids = ids_by_name.setdefault(row["name"], [])
+        if row["id"] not in ids:
+            ids.append(row["id"])
+            ids.sort()
+
+    def add_province(self, row: Dict[str, Any]):
+        with self._lock:
+            self._add(self._provinces, self._province_ids_by_name, row)
+
+    def add_city(self, row: Dict[str, Any]):
+        with self._lock:
+            self._add(self._cities, self._city_ids_by_name, row)
+
+    def add_district(self, row: Dict[str, Any]):
+        with self._lock:
+            self._add(self._districts, self._district_ids_by_name, row)
+
+    def _update(self, by_id: Dict[int, Dict[str, Any]], row_id: int, fields: Dict[str, Any]):
+        """写穿更新已有记录的字段（名称不变），调用方需持有锁；未加载时只推进版本号"""
+        self._version += 1
+        if self._loaded and row_id in by_id:
+            by_id[row_id].update(fields)
+
+    def update_province(self, province_id: int, fields: Dict[str, Any]):
+        with self._lock:
+            self._update(self._provinces, province_id, fields)
+
+    def update_city(self, city_id: int, fields: Dict[str, Any]):
+        with self._lock:
+            self._update(self._cities, city_id, fields)
+
+    def update_district(self, district_id: int, fields: Dict[str, Any]):
+        with self._lock:
+            self._update(self._districts, district_id, fields)
+
+    def _get(self, by_id: Dict[int, Dict[str, Any]], row_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        """按ID查找并返回副本，调用方需持有锁"""
+        row = by_id.get(row_id)
+        self._stats["lookups"] += 1
+        if row is None:
+            self._stats["not_found"] += 1
+            return None
+        return dict(row)
+
+    def get_province_by_id(self, province_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._get(self._provinces, province_id)
+
+    def get_province_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            ids = self._province_ids_by_name.get(name)
+            return self._get(self._provinces, ids[0] if ids else None)
+
+    def get_city_by_id(self, city_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._get(self._cities, city_id)
+
+    def get_city_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            ids = self._city_ids_by_name.get(name)
+            return self._get(self._cities, ids[0] if ids else None)
+
+    def get_district_by_id(self, district_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._get(self._districts, district_id)
+
+    def get_district_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            ids = self._district_ids_by_name.get(name)
+            return self._get(self._districts, ids[0] if ids else None)
+
+    def get_district_by_name_and_city(self, name: str, city_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            district_id = next(
+                (row_id for row_id in self._district_ids_by_name.get(name, [])
+                 if self._districts[row_id]["city_id"] == city_id),
+                None
+            )
+            return self._get(self._districts, district_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "loaded": self._loaded,
+                "provinces": len(self._provinces),
+                "cities": len(self._cities),
+                "districts": len(self._districts),
+            })
+        return stats
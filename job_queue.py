@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+医院层级扫查微服务 - 持久化后台作业队列
+
+后台刷新作业保存在主数据库的 jobs 表中（作业ID即任务ID），由本进程的工作协程池领取执行：
+- 领取时加租约（每次领取生成新的租约令牌），执行期间定时心跳续租；进程崩溃或重启后租约过期，作业被重新领取
+- attempts 记录领取次数，租约反复过期（作业导致进程崩溃）达到上限后标记失败，避免无限重试
+- 处理函数抛出异常，或返回 {"success": False, "error": ...}（已自行处理异常并把任务标记为失败），
+  视为业务失败，直接结束作业（任务状态由处理函数自己更新）
+- 服务正常关闭时归还租约，作业回到队列，下次启动立即继续
+"""
+
+import os
+import time
+import uuid
+import socket
+import asyncio
+import logging
+from typing import Dict, Any, Optional, Callable, Awaitable
+
+import psutil
+
+from db import get_db
+from schemas import TaskStatus
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "15"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# 处理函数签名: handler(job_id, payload)，job_id 即任务ID
+JobHandler = Callable[[str, Dict[str, Any]], Awaitable[Any]]
+
+
+def handler_error(result: Any) -> Optional[str]:
+    """处理函数返回值中的失败信息：返回 {"success": False, "error": ...} 表示作业失败"""
+    if isinstance(result, dict) and result.get("success") is False:
+        return str(result.get("error") or "作业执行失败")
+    return None
+
+
+class JobQueue:
+    """持久化作业队列 + 本地工作协程池"""
+
+    def __init__(self, task_manager, concurrency: int = JOB_WORKER_CONCURRENCY,
+                 lease_seconds: float = JOB_LEASE_SECONDS, heartbeat_seconds: float = JOB_HEARTBEAT_SECONDS,
+                 poll_seconds: float = JOB_POLL_SECONDS, max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.task_manager = task_manager
+        self.concurrency = max(1, concurrency)
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = min(heartbeat_seconds, lease_seconds / 2)
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max(1, max_attempts)
+        # 租约持有者: 主机名:进程号:随机后缀（容器内进程号可能在重启后复用）
+        self.host = socket.gethostname()
+        self.worker_id = f"{self.host}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._handlers: Dict[str, JobHandler] = {}
+        self._workers: list = []
+        self._wakeup = asyncio.Event()
+        self._running_jobs: Dict[str, str] = {}
+        self._stats = {"claimed": 0, "succeeded": 0, "failed": 0, "recovered": 0,
+                       "lease_lost": 0, "released": 0, "exhausted": 0}
+
+    def register(self, job_type: str, handler: JobHandler):
+        """注册作业类型的处理函数"""
+        self._handlers[job_type] = handler
+
+    async def enqueue(self, job_id: str, job_type: str, payload: Dict[str, Any],
+                      max_attempts: Optional[int] = None, replace_finished: bool = False) -> str:
+        """作业入队并唤醒空闲的工作协程；replace_finished=True 时已结束的同ID作业重新入队"""
+        if job_type not in self._handlers:
+            raise ValueError(f"未注册的作业类型: {job_type}")
+        db = await get_db()
+        if not await db.enqueue_job(job_id, job_type, payload, max_attempts or self.max_attempts,
+                                    replace_finished=replace_finished):
+            raise ValueError(f"作业已存在且尚未结束: {job_id}" if replace_finished else f"作业已存在: {job_id}")
+        logger.info(f"📥 作业已入队: {job_id} (类型: {job_type})")
+        self._wakeup.set()
+        return job_id
+
+    async def start(self):
+        """启动工作协程池；先让已退出进程持有的租约立即过期，未完成的作业马上被重新领取"""
+        db = await get_db()
+        running = await db.list_jobs(status="running", limit=10000)
+        dead_owners = {job["lease_owner"] for job in running
+                       if job.get("lease_owner") and self._is_dead_owner(job["lease_owner"])}
+        if dead_owners:
+            expired = await db.expire_job_leases(sorted(dead_owners))
+            logger.info(f"♻️ 发现 {expired} 个中断的作业（原进程已退出），将重新领取执行")
+        counts = await db.get_job_counts()
+        if counts.get("queued"):
+            logger.info(f"📋 队列中有 {counts['queued']} 个待执行作业")
+
+        self._workers = [asyncio.create_task(self._worker(index)) for index in range(self.concurrency)]
+        logger.info(f"🚀 作业队列已启动: {self.concurrency} 个工作协程，租约 {self.lease_seconds:.0f}秒，"
+                    f"心跳 {self.heartbeat_seconds:.0f}秒，最大尝试 {self.max_attempts} 次 (worker: {self.worker_id})")
+
+    async def stop(self):
+        """停止工作协程池，正在执行的作业归还租约"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info("🛑 作业队列已停止")
+
+    def _is_dead_owner(self, lease_owner: str) -> bool:
+        """租约持有者是否为本机上已退出的进程（其他主机的租约只能等待过期）"""
+        try:
+            host, pid, _ = lease_owner.rsplit(":", 2)
+            pid = int(pid)
+        except ValueError:
+            return False
+        if host != self.host or lease_owner == self.worker_id:
+            return False
+        return pid == os.getpid() or not psutil.pid_exists(pid)
+
+    async def _worker(self, index: int):
+        db = await get_db()
+        while True:
+            self._wakeup.clear()
+            try:
+                counts = await db.count_claimable_jobs()
+                if counts["exhausted"]:
+                    await self._fail_exhausted_jobs()
+                job = await db.claim_job(self.worker_id, self.lease_seconds,
+                                         exclude_job_ids=list(self._running_jobs)) if counts["claimable"] else None
+            except Exception as e:
+                logger.error(f"❌ [作业工作协程 {index}] 领取作业失败: {e}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._run_job(job)
+
+    async def _run_job(self, job: Dict[str, Any]):
+        db = await get_db()
+        job_id, job_type, lease_token = job["job_id"], job["job_type"], job["lease_token"]
+        self._stats["claimed"] += 1
+
+        handler = self._handlers.get(job_type)
+        if handler is None:
+            error = f"未注册的作业类型: {job_type}"
+            logger.error(f"❌ 作业 {job_id}: {error}")
+            await db.finish_job(job_id, lease_token, error)
+            await self._mark_task_failed(job_id, error)
+            self._stats["failed"] += 1
+            return
+
+        if job.get("recovered_from"):
+            self._stats["recovered"] += 1
+            logger.warning(f"♻️ 恢复中断的作业: {job_id} (类型: {job_type}, 第 {job['attempts']}/{job['max_attempts']} 次尝试, "
+                           f"原持有者: {job['recovered_from']})")
+            try:
+                await self.task_manager.update_task_status(
+                    job_id, TaskStatus.RUNNING, f"服务重启后恢复执行（第 {job['attempts']} 次尝试）")
+            except Exception as status_error:
+                logger.warning(f"⚠️ 更新任务 {job_id} 状态失败: {status_error}")
+        else:
+            logger.info(f"▶️ 开始执行作业: {job_id} (类型: {job_type})")
+
+        start_time = time.time()
+        lease_lost = asyncio.Event()
+        handler_task = asyncio.create_task(handler(job_id, job["payload"]))
+        heartbeat_task = asyncio.create_task(self._heartbeat(job_id, lease_token, handler_task, lease_lost))
+        self._running_jobs[job_id] = job_type
+        try:
+            error = handler_error(await handler_task)
+        except asyncio.CancelledError:
+            if not lease_lost.is_set():
+                # 服务关闭：归还租约，下次启动继续执行
+                await db.release_job(job_id, lease_token)
+                self._stats["released"] += 1
+                logger.info(f"↩️ 服务关闭，作业已归还队列: {job_id}")
+                raise
+            self._stats["lease_lost"] += 1
+            logger.warning(f"⚠️ 作业 {job_id} 的租约已失效（已被其他工作协程领取），停止执行")
+            return
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            heartbeat_task.cancel()
+            self._running_jobs.pop(job_id, None)
+
+        await db.finish_job(job_id, lease_token, error)
+        elapsed = time.time() - start_time
+        if error:
+            self._stats["failed"] += 1
+            logger.error(f"❌ 作业执行失败: {job_id} (类型: {job_type}, 耗时 {elapsed:.1f}秒): {error}")
+        else:
+            self._stats["succeeded"] += 1
+            logger.info(f"✅ 作业执行完成: {job_id} (类型: {job_type}, 耗时 {elapsed:.1f}秒)")
+
+    async def _heartbeat(self, job_id: str, lease_token: str, handler_task: asyncio.Task, lease_lost: asyncio.Event):
+        """定时续租；该次领取的租约已失效（作业被重新领取）时取消处理函数"""
+        db = await get_db()
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                still_owner = await db.heartbeat_job(job_id, lease_token, self.lease_seconds)
+            except Exception as e:
+                logger.warning(f"⚠️ 作业 {job_id} 心跳失败: {e}")
+                continue
+            if not still_owner:
+                lease_lost.set()
+                handler_task.cancel()
+                return
+
+    async def _fail_exhausted_jobs(self):
+        db = await get_db()
+        for job in await db.fail_exhausted_jobs():
+            self._stats["exhausted"] += 1
+            logger.error(f"❌ 作业 {job['job_id']} (类型: {job['job_type']}) {job['last_error']}")
+            await self._mark_task_failed(job["job_id"], job["last_error"])
+
+    async def _mark_task_failed(self, job_id: str, error: str):
+        try:
+            await self.task_manager.update_task_status(job_id, TaskStatus.FAILED, error)
+        except Exception as status_error:
+            logger.warning(f"⚠️ 更新任务 {job_id} 状态失败: {status_error}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取本进程工作协程池的统计信息"""
+        return {
+            "worker_id": self.worker_id,
+            "concurrency": self.concurrency,
+            "lease_seconds": self.lease_seconds,
+            "heartbeat_seconds": self.heartbeat_seconds,
+            "max_attempts": self.max_attempts,
+            "registered_job_types": sorted(self._handlers),
+            "running_jobs": dict(self._running_jobs),
+            **self._stats,
+        }
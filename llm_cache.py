@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+医院层级扫查微服务 - LLM响应持久化缓存
+
+以 (model, messages, max_tokens) 的哈希作为键，将LLM原始回复保存在独立的SQLite文件中，
+支持按调用方法设置TTL、按最近访问时间的LRU容量淘汰以及命中/未命中统计。
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger('llm_client')
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "data/llm_cache.db")
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+
+# 各调用方法的默认缓存有效期（秒），0 表示不缓存
+# 可通过环境变量 LLM_CACHE_TTL_<NAMESPACE> 覆盖，例如 LLM_CACHE_TTL_HOSPITALS=86400
+DEFAULT_CACHE_TTLS = {
+    "provinces": 90 * 86400,
+    "cities": 30 * 86400,
+    "districts": 30 * 86400,
+    "hospitals": 7 * 86400,
+    "website": 7 * 86400,
+    "website_batch": 7 * 86400,
+    "hierarchy": 86400,
+    "report": 0,
+}
+
+
+def get_cache_ttl(namespace: Optional[str]) -> int:
+    """获取指定命名空间的缓存TTL（秒）"""
+    if not namespace:
+        return 0
+    env_value = os.getenv(f"LLM_CACHE_TTL_{namespace.upper()}")
+    if env_value is not None:
+        try:
+            return int(env_value)
+        except ValueError:
+            logger.warning(f"⚠️ 无效的缓存TTL配置 LLM_CACHE_TTL_{namespace.upper()}={env_value}，使用默认值")
+    return DEFAULT_CACHE_TTLS.get(namespace, 0)
+
+
+def make_cache_key(model: str, messages: list, max_tokens: int) -> str:
+    """根据 (model, messages, max_tokens) 计算内容寻址的缓存键"""
+    payload = json.dumps(
+        {"model": model, "messages": messages, "max_tokens": max_tokens},
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """LLM响应持久化缓存（SQLite）"""
+
+    def __init__(self, db_path: str = LLM_CACHE_PATH, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "stores": 0, "evictions": 0}
+        self._writes_since_evict = 0
+
+    def _get_conn(self) -> sqlite3.Connection:
+        """获取（必要时创建）缓存数据库连接，调用方需持有锁"""
+        if self._conn is None:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    namespace TEXT,
+                    model TEXT,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_accessed_at REAL NOT NULL,
+                    hit_count INTEGER DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_accessed ON llm_cache(last_accessed_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, cache_key: str) -> Optional[str]:
+        """读取缓存，过期条目视为未命中并删除"""
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            row = conn.execute(
+                "SELECT response, expires_at FROM llm_cache WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            response, expires_at = row
+            if expires_at <= now:
+                conn.execute("DELETE FROM llm_cache WHERE cache_key = ?", (cache_key,))
+                conn.commit()
+                self._stats["misses"] += 1
+                self._stats["expired"] += 1
+                return None
+            conn.execute(
+                "UPDATE llm_cache SET last_accessed_at = ?, hit_count = hit_count + 1 WHERE cache_key = ?",
+                (now, cache_key)
+            )
+            conn.commit()
+            self._stats["hits"] += 1
+            return response
+
+    def set(self, cache_key: str, response: str, ttl: int, namespace: str = None, model: str = None):
+        """写入缓存，并按需执行LRU淘汰"""
+        if ttl <= 0:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute("""
+                INSERT INTO llm_cache (cache_key, namespace, model, response, created_at, expires_at, last_accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(cache_key) DO UPDATE SET
+                    response = excluded.response,
+                    created_at = excluded.created_at,
+                    expires_at = excluded.expires_at,
+                    last_accessed_at = excluded.last_accessed_at
+            """, (cache_key, namespace, model, response, now, now + ttl, now))
+            self._stats["stores"] += 1
+            self._writes_since_evict += 1
+            # 每100次写入检查一次容量，避免每次写入都做COUNT
+            if self._writes_since_evict >= 100:
+                self._evict(conn, now)
+                self._writes_since_evict = 0
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """删除过期条目，并按最近访问时间淘汰超出容量的条目，调用方需持有锁"""
+        cursor = conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+        evicted = cursor.rowcount
+        total = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        overflow = total - self.max_entries
+        if overflow > 0:
+            cursor = conn.execute("""
+                DELETE FROM llm_cache WHERE cache_key IN (
+                    SELECT cache_key FROM llm_cache ORDER BY last_accessed_at ASC LIMIT ?
+                )
+            """, (overflow,))
+            evicted += cursor.rowcount
+        if evicted > 0:
+            self._stats["evictions"] += evicted
+            logger.info(f"🧹 LLM缓存淘汰 {evicted} 条记录")
+
+    def invalidate(self, cache_key: str):
+        """删除单条缓存"""
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute("DELETE FROM llm_cache WHERE cache_key = ?", (cache_key,))
+            conn.commit()
+
+    def clear(self, namespace: str = None) -> int:
+        """清空缓存（可按命名空间）"""
+        with self._lock:
+            conn = self._get_conn()
+            if namespace:
+                cursor = conn.execute("DELETE FROM llm_cache WHERE namespace = ?", (namespace,))
+            else:
+                cursor = conn.execute("DELETE FROM llm_cache")
+            conn.commit()
+            return cursor.rowcount
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            conn = self._get_conn()
+            entries = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            by_namespace = {
+                row[0] or "unknown": row[1]
+                for row in conn.execute("SELECT namespace, COUNT(*) FROM llm_cache GROUP BY namespace")
+            }
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats.update({
+            "enabled": LLM_CACHE_ENABLED,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "entries_by_namespace": by_namespace,
+            "hit_rate": round(stats["hits"] / lookups, 4) if lookups else 0.0,
+            "db_path": self.db_path,
+        })
+        return stats
+
+
+_cache_instance: Optional[LLMResponseCache] = None
+_cache_instance_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """获取进程内共享的LLM缓存实例"""
+    global _cache_instance
+    with _cache_instance_lock:
+        if _cache_instance is None:
+            _cache_instance = LLMResponseCache()
+        return _cache_instance
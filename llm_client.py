@@ -9,22 +9,243 @@ import json
 import logging
 import time
 import uuid
-from typing import Dict, Any, Optional
-import requests
+import asyncio
+import threading
+import copy
+import functools
+from typing import Dict, Any, Optional, Tuple, Callable, Awaitable, List, AsyncIterator
+import httpx
 from datetime import datetime
+from llm_cache import get_llm_cache, get_cache_ttl, make_cache_key, LLM_CACHE_ENABLED
+from llm_rate_limiter import get_rate_limiter, estimate_tokens
+from llm_stream import IncrementalJSONArrayParser, extract_stream_delta, parse_sse_line
+from llm_resilience import (
+    RetryPolicy, CircuitBreaker, LLMRequestError, LLMCircuitOpenError, get_circuit_breaker, get_all_circuit_breaker_stats
+)
 
 # 使用主应用创建的LLM专用日志记录器
 logger = logging.getLogger('llm_client')
 main_logger = logging.getLogger(__name__)  # 主日志记录器用于关键错误
 
+# HTTP连接池配置（所有LLMClient实例共享同一个连接池）
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+
+# 区县医院查询是否使用流式响应（边接收边解析入库）
+LLM_STREAMING_ENABLED = os.getenv("LLM_STREAMING_ENABLED", "true").lower() in ("1", "true", "yes")
+
+_async_client: Optional[httpx.AsyncClient] = None
+_async_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_client_lock = threading.Lock()
+
+
+def _pool_limits() -> httpx.Limits:
+    """连接池限制参数"""
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+    )
+
+
+def get_async_http_client(timeout: float) -> httpx.AsyncClient:
+    """获取当前事件循环共享的异步HTTP客户端（keep-alive连接池）"""
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        # AsyncClient绑定创建时的事件循环，循环变化时重新创建
+        if _async_client is None or _async_client.is_closed or _async_client_loop is not loop:
+            _async_client = httpx.AsyncClient(limits=_pool_limits(), timeout=timeout)
+            _async_client_loop = loop
+            logger.info(f"🔌 创建LLM异步连接池: max_connections={LLM_MAX_CONNECTIONS}, "
+                        f"max_keepalive={LLM_MAX_KEEPALIVE_CONNECTIONS}")
+        return _async_client
+
+
+async def close_http_clients():
+    """关闭共享的HTTP连接池（应用关闭时调用）"""
+    global _async_client, _async_client_loop
+    with _client_lock:
+        async_client, _async_client, _async_client_loop = _async_client, None, None
+    if async_client is not None and not async_client.is_closed:
+        await async_client.aclose()
+    logger.info("🔌 LLM连接池已关闭")
+
+
+class _LeaderAbandoned(Exception):
+    """发起者被取消（或流式调用的消费方提前停止读取），没有完整结果可以共享，跟随者需自己重新发起"""
+
+
+class SingleFlight:
+    """进程内请求合并：相同参数的并发调用共享同一个进行中的Future"""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._stats = {"calls": 0, "executed": 0, "coalesced": 0, "in_flight": 0}
+
+    def _pending(self, key: str) -> Optional[asyncio.Future]:
+        pending = self._calls.get(key)
+        if pending is not None and not pending.done() and pending.get_loop() is asyncio.get_running_loop():
+            return pending
+        return None
+
+    async def _follow(self, key: str, pending: asyncio.Future) -> Any:
+        self._stats["coalesced"] += 1
+        logger.info(f"🔗 合并进行中的相同LLM请求: {key[:120]}")
+        # shield: 跟随者被取消时不影响发起者
+        result = await asyncio.shield(pending)
+        # 返回副本，避免调用方修改共享结果
+        return copy.deepcopy(result)
+
+    async def _follow_until_result(self, key: str) -> tuple:
+        """跟随进行中的相同调用，返回 (是否拿到结果, 结果)；发起者中途放弃时改为跟随新的发起者，
+        没有进行中的调用时返回 (False, None)，由调用方自己发起"""
+        pending = self._pending(key)
+        while pending is not None:
+            try:
+                return True, await self._follow(key, pending)
+            except _LeaderAbandoned:
+                pending = self._pending(key)
+        return False, None
+
+    @staticmethod
+    def _abandon(future: asyncio.Future):
+        """发起者被取消：不取消共享的Future（否则跟随者会收到并非针对它们的CancelledError），
+        而是设置哨兵异常让跟随者重新发起"""
+        future.set_exception(_LeaderAbandoned())
+        future.exception()
+
+    def _begin(self, key: str) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self._stats["executed"] += 1
+        self._stats["in_flight"] += 1
+        return future
+
+    def _end(self, key: str, future: asyncio.Future):
+        self._stats["in_flight"] -= 1
+        if self._calls.get(key) is future:
+            del self._calls[key]
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """执行fn；若相同key的调用正在进行，则等待其结果而不重复执行"""
+        self._stats["calls"] += 1
+
+        followed, result = await self._follow_until_result(key)
+        if followed:
+            return result
+
+        future = self._begin(key)
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            self._abandon(future)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # 标记异常已读取，避免没有跟随者时产生告警
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._end(key, future)
+
+    async def stream(self, key: str, fn: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """
+        流式调用的请求合并（与 do 共用key）：相同key的调用（流式或非流式）正在进行时，等待其完整结果后逐条产出；
+        自己发起时边产出边收集，结束后把完整结果（列表）交给跟随者。发起者被取消或消费方提前停止读取时跟随者改为自己发起。
+        """
+        self._stats["calls"] += 1
+
+        followed, result = await self._follow_until_result(key)
+        if followed and result is not None:
+            for item in result:
+                yield item
+            return
+
+        future = self._begin(key)
+        collected = []
+        try:
+            async for item in fn():
+                collected.append(copy.deepcopy(item))
+                yield item
+        except (GeneratorExit, asyncio.CancelledError):
+            self._abandon(future)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        else:
+            future.set_result(collected)
+        finally:
+            self._end(key, future)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取请求合并统计"""
+        stats = dict(self._stats)
+        stats["coalesce_rate"] = round(stats["coalesced"] / stats["calls"], 4) if stats["calls"] else 0.0
+        return stats
+
+
+_single_flight = SingleFlight()
+
+
+def _normalize_arg(value: Any) -> Any:
+    """规范化参数用于生成合并键（去除字符串首尾空白）"""
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def _single_flight_key(method_name: str, model: str, args: tuple, kwargs: dict) -> str:
+    """请求合并键：方法名 + 模型 + 规范化后的参数"""
+    return json.dumps(
+        {
+            "method": method_name,
+            "model": model,
+            "args": [_normalize_arg(a) for a in args],
+            "kwargs": {k: _normalize_arg(v) for k, v in sorted(kwargs.items())},
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str
+    )
+
+
+def single_flight(method):
+    """装饰LLMClient的公共方法，使相同参数的并发调用只发起一次LLM请求"""
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        key = _single_flight_key(method.__name__, self.model, args, kwargs)
+        return await _single_flight.do(key, lambda: method(self, *args, **kwargs))
+    return wrapper
+
+
+def get_llm_runtime_stats() -> Dict[str, Any]:
+    """获取LLM客户端运行时统计（进程内共享）"""
+    return {
+        "single_flight": _single_flight.get_stats(),
+        "rate_limiter": get_rate_limiter().get_stats(),
+        "circuit_breakers": get_all_circuit_breaker_stats(),
+        "retry_policy": RetryPolicy.from_env().to_dict(),
+    }
+
+
 class LLMClient:
     """大语言模型客户端"""
     
-    def __init__(self):
+    def __init__(self, retry_policy: Optional[RetryPolicy] = None, circuit_breaker: Optional[CircuitBreaker] = None):
         self.api_key = os.getenv("DASHSCOPE_API_KEY", "")
         self.base_url = os.getenv("LLM_BASE_URL", "https://dashscope.aliyuncs.com/api/v1/")
         self.model = os.getenv("LLM_MODEL", "deepseek-r1")
-        self.timeout = 300
+        self.timeout = int(os.getenv("LLM_TIMEOUT", "300"))
+
+        # 重试策略和熔断器（默认从环境变量读取，熔断器按API地址在进程内共享）
+        self.retry_policy = retry_policy or RetryPolicy.from_env()
+        self.circuit_breaker = circuit_breaker or get_circuit_breaker(self.base_url)
 
         # 初始化logger
         self.logger = logging.getLogger(__name__)
@@ -32,144 +253,380 @@ class LLMClient:
         if not self.api_key:
             logger.error("❌ DASHSCOPE_API_KEY未设置！请检查.env文件配置")
             raise ValueError("DASHSCOPE_API_KEY环境变量未设置，无法初始化LLM客户端")
-        
-    def _make_request(self, messages: list, max_tokens: int = 2000) -> Optional[str]:
-        """发起API请求"""
+
+    def _build_request(self, messages: list, max_tokens: int, stream: bool = False) -> Tuple[Dict[str, str], Dict[str, Any]]:
+        """构造请求头和请求体（stream=True时使用SSE流式输出）"""
         # 记录详细的提示词内容用于调试
         self.logger.info(f"📝 LLM API请求提示词内容:")
         for i, message in enumerate(messages):
             self.logger.info(f"  消息 {i+1} [{message.get('role', 'unknown')}]: {message.get('content', '')}")
 
-        try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-
-            # 根据不同的API提供商调整请求格式
-            if "dashscope" in self.base_url:
-                # 阿里云DashScope API格式
-                data = {
-                    "model": self.model,
-                    "input": {
-                        "messages": messages
-                    },
-                    "parameters": {
-                        "max_tokens": max_tokens,
-                        "temperature": 0.7,
-                        "stream": False
-                    }
-                }
-                response_field = "output"
-                content_field = "text"
-            else:
-                # 通用OpenAI兼容格式
-                data = {
-                    "model": self.model,
-                    "messages": messages,
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+        # 根据不同的API提供商调整请求格式
+        if "dashscope" in self.base_url:
+            # 阿里云DashScope API格式
+            data = {
+                "model": self.model,
+                "input": {
+                    "messages": messages
+                },
+                "parameters": {
                     "max_tokens": max_tokens,
                     "temperature": 0.7,
-                    "stream": False
+                    "stream": stream
                 }
-                response_field = "choices"
-                content_field = "message"
-
-            logger.info(f"🔄 正在调用LLM API: {self.base_url}")
-            logger.info(f"📝 使用模型: {self.model}")
-
-            response = requests.post(
-                self.base_url,
-                headers=headers,
-                json=data,
-                timeout=self.timeout
-            )
-
-            # 记录响应状态
-            logger.info(f"📊 API响应状态: {response.status_code}")
-
-            if response.status_code == 401:
-                main_logger.error(f"❌ API认证失败！请检查LLM_API_KEY是否正确配置。")
-                raise ValueError(f"❌ API认证失败！请检查LLM_API_KEY是否正确配置。API响应: {response.text}")
-            elif response.status_code == 429:
-                main_logger.error(f"❌ API调用频率超限！请稍后重试。")
-                raise ValueError(f"❌ API调用频率超限！请稍后重试。API响应: {response.text}")
-            elif response.status_code == 500:
-                main_logger.error(f"❌ API服务器内部错误！请联系API提供商。")
-                raise ValueError(f"❌ API服务器内部错误！请联系API提供商。API响应: {response.text}")
-            elif response.status_code != 200:
-                main_logger.error(f"❌ API调用失败！状态码: {response.status_code}")
-                raise ValueError(f"❌ API调用失败！状态码: {response.status_code}, 响应: {response.text}")
-
-            result = response.json()
-            # 记录完整的API响应内容用于调试
-            self.logger.info(f"📋 完整API响应 (状态码: {response.status_code}):\n{json.dumps(result, ensure_ascii=False, indent=2)}")
-            logger.debug(f"🔍 API原始响应: {result}")
-
-            # 智能解析API响应，兼容多种格式
-            logger.info(f"🔍 开始解析API响应，期望格式: {response_field}")
-            logger.debug(f"📥 完整响应结构: {json.dumps(result, ensure_ascii=False, indent=2)}")
-
-            # 尝试OpenAI兼容格式 (output.choices[0].message.content)
-            if ("output" in result and
-                isinstance(result["output"], dict) and
-                "choices" in result["output"] and
-                len(result["output"]["choices"]) > 0):
-                choice = result["output"]["choices"][0]
-                if ("message" in choice and
-                    "content" in choice["message"]):
-                    content = choice["message"]["content"]
-                    logger.info("🔍 使用OpenAI兼容格式解析: output.choices[0].message.content")
-                    logger.debug(f"📝 提取的内容长度: {len(content)} 字符")
-                    return content
-                else:
-                    logger.warning(f"⚠️ OpenAI格式结构不完整: {choice}")
-
-            # 尝试DashScope格式 (output.text)
-            if ("output" in result and
-                isinstance(result["output"], dict) and
-                "text" in result["output"]):
-                text = result["output"]["text"]
-                logger.info("🔍 使用DashScope格式解析: output.text")
-                logger.debug(f"📝 提取的文本长度: {len(text)} 字符")
-                return text
-
-            # 尝试标准OpenAI格式 (直接在根级别)
-            if ("choices" in result and
-                len(result["choices"]) > 0):
-                choice = result["choices"][0]
-                if ("message" in choice and
-                    "content" in choice["message"]):
-                    content = choice["message"]["content"]
-                    logger.info("🔍 使用标准OpenAI格式解析: choices[0].message.content")
-                    logger.debug(f"📝 提取的内容长度: {len(content)} 字符")
-                    return content
-                else:
-                    logger.warning(f"⚠️ 标准OpenAI格式结构不完整: {choice}")
-
-            # 如果所有格式都不匹配，记录详细错误信息
-            logger.error(f"❌ 无法解析API响应！响应结构分析:")
-            logger.error(f"   - 响应字段: {list(result.keys())}")
-            if "output" in result:
-                logger.error(f"   - output字段类型: {type(result['output'])}")
-                if isinstance(result["output"], dict):
-                    logger.error(f"   - output字段内容: {list(result['output'].keys())}")
-            logger.error(f"   - 完整响应: {json.dumps(result, ensure_ascii=False, indent=2)}")
-            raise ValueError(f"❌ API响应格式无法识别！期望output.text或choices格式，但得到: {list(result.keys())}")
-
-        except requests.exceptions.Timeout:
+            }
+            if stream:
+                # DashScope流式输出需开启SSE，并只返回增量内容
+                headers["X-DashScope-SSE"] = "enable"
+                data["parameters"]["incremental_output"] = True
+        else:
+            # 通用OpenAI兼容格式
+            data = {
+                "model": self.model,
+                "messages": messages,
+                "max_tokens": max_tokens,
+                "temperature": 0.7,
+                "stream": stream
+            }
+
+        logger.info(f"🔄 正在调用LLM API: {self.base_url}")
+        logger.info(f"📝 使用模型: {self.model}")
+        return headers, data
+
+    def _check_status(self, response: httpx.Response):
+        """检查HTTP状态码，非200时抛出LLMRequestError"""
+        # 记录响应状态
+        logger.info(f"📊 API响应状态: {response.status_code}")
+
+        retry_after = self._parse_retry_after(response)
+        if response.status_code == 401:
+            main_logger.error(f"❌ API认证失败！请检查LLM_API_KEY是否正确配置。")
+            raise LLMRequestError(f"❌ API认证失败！请检查LLM_API_KEY是否正确配置。API响应: {response.text}",
+                                  status_code=401)
+        elif response.status_code == 429:
+            main_logger.error(f"❌ API调用频率超限！请稍后重试。")
+            raise LLMRequestError(f"❌ API调用频率超限！请稍后重试。API响应: {response.text}",
+                                  status_code=429, retry_after=retry_after)
+        elif response.status_code == 500:
+            main_logger.error(f"❌ API服务器内部错误！请联系API提供商。")
+            raise LLMRequestError(f"❌ API服务器内部错误！请联系API提供商。API响应: {response.text}",
+                                  status_code=500, retry_after=retry_after)
+        elif response.status_code != 200:
+            main_logger.error(f"❌ API调用失败！状态码: {response.status_code}")
+            raise LLMRequestError(f"❌ API调用失败！状态码: {response.status_code}, 响应: {response.text}",
+                                  status_code=response.status_code, retry_after=retry_after)
+
+    def _parse_response(self, response: httpx.Response) -> Optional[str]:
+        """检查响应状态并提取模型回复文本"""
+        self._check_status(response)
+
+        result = response.json()
+        # 记录完整的API响应内容用于调试
+        self.logger.info(f"📋 完整API响应 (状态码: {response.status_code}):\n{json.dumps(result, ensure_ascii=False, indent=2)}")
+        logger.debug(f"🔍 API原始响应: {result}")
+
+        # 智能解析API响应，兼容多种格式
+        logger.info(f"🔍 开始解析API响应")
+        logger.debug(f"📥 完整响应结构: {json.dumps(result, ensure_ascii=False, indent=2)}")
+
+        # 尝试OpenAI兼容格式 (output.choices[0].message.content)
+        if ("output" in result and
+            isinstance(result["output"], dict) and
+            "choices" in result["output"] and
+            len(result["output"]["choices"]) > 0):
+            choice = result["output"]["choices"][0]
+            if ("message" in choice and
+                "content" in choice["message"]):
+                content = choice["message"]["content"]
+                logger.info("🔍 使用OpenAI兼容格式解析: output.choices[0].message.content")
+                logger.debug(f"📝 提取的内容长度: {len(content)} 字符")
+                return content
+            else:
+                logger.warning(f"⚠️ OpenAI格式结构不完整: {choice}")
+
+        # 尝试DashScope格式 (output.text)
+        if ("output" in result and
+            isinstance(result["output"], dict) and
+            "text" in result["output"]):
+            text = result["output"]["text"]
+            logger.info("🔍 使用DashScope格式解析: output.text")
+            logger.debug(f"📝 提取的文本长度: {len(text)} 字符")
+            return text
+
+        # 尝试标准OpenAI格式 (直接在根级别)
+        if ("choices" in result and
+            len(result["choices"]) > 0):
+            choice = result["choices"][0]
+            if ("message" in choice and
+                "content" in choice["message"]):
+                content = choice["message"]["content"]
+                logger.info("🔍 使用标准OpenAI格式解析: choices[0].message.content")
+                logger.debug(f"📝 提取的内容长度: {len(content)} 字符")
+                return content
+            else:
+                logger.warning(f"⚠️ 标准OpenAI格式结构不完整: {choice}")
+
+        # 如果所有格式都不匹配，记录详细错误信息
+        logger.error(f"❌ 无法解析API响应！响应结构分析:")
+        logger.error(f"   - 响应字段: {list(result.keys())}")
+        if "output" in result:
+            logger.error(f"   - output字段类型: {type(result['output'])}")
+            if isinstance(result["output"], dict):
+                logger.error(f"   - output字段内容: {list(result['output'].keys())}")
+        logger.error(f"   - 完整响应: {json.dumps(result, ensure_ascii=False, indent=2)}")
+        raise ValueError(f"❌ API响应格式无法识别！期望output.text或choices格式，但得到: {list(result.keys())}")
+
+    def _translate_error(self, e: Exception) -> ValueError:
+        """将传输层异常转换为统一的ValueError"""
+        if isinstance(e, httpx.TimeoutException):
             main_logger.error(f"❌ API请求超时！等待时间超过{self.timeout}秒。")
-            raise ValueError(f"❌ API请求超时！等待时间超过{self.timeout}秒。请检查网络连接或增加timeout设置。")
-        except requests.exceptions.ConnectionError:
+            return LLMRequestError(f"❌ API请求超时！等待时间超过{self.timeout}秒。请检查网络连接或增加timeout设置。",
+                                   network_error=True)
+        if isinstance(e, httpx.ConnectError):
             main_logger.error(f"❌ 网络连接失败！无法连接到API服务器: {self.base_url}。")
-            raise ValueError(f"❌ 网络连接失败！无法连接到API服务器: {self.base_url}。请检查网络连接和API地址。")
-        except requests.exceptions.RequestException as e:
+            return LLMRequestError(f"❌ 网络连接失败！无法连接到API服务器: {self.base_url}。请检查网络连接和API地址。",
+                                   network_error=True)
+        if isinstance(e, httpx.HTTPError):
             main_logger.error(f"❌ API请求失败！网络错误: {str(e)}。")
-            raise ValueError(f"❌ API请求失败！网络错误: {str(e)}。请检查网络配置和API设置。")
+            return LLMRequestError(f"❌ API请求失败！网络错误: {str(e)}。请检查网络配置和API设置。",
+                                   network_error=True)
+        main_logger.error(f"❌ LLM API调用过程中发生未知错误: {str(e)}。")
+        return ValueError(f"❌ LLM API调用过程中发生未知错误: {str(e)}。请检查所有配置参数。")
+
+    @staticmethod
+    def _parse_retry_after(response: httpx.Response) -> Optional[float]:
+        """解析Retry-After响应头（秒）"""
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _is_json_response(text: Optional[str]) -> bool:
+        """判断回复中是否包含可解析的JSON（只缓存可用的回复）"""
+        if not text:
+            return False
+        cleaned = text.strip()
+        if cleaned.startswith('```json'):
+            cleaned = cleaned[7:]
+        if cleaned.startswith('```'):
+            cleaned = cleaned[3:]
+        if cleaned.endswith('```'):
+            cleaned = cleaned[:-3]
+        starts = [i for i in (cleaned.find('{'), cleaned.find('[')) if i != -1]
+        if not starts:
+            return False
+        start = min(starts)
+        end = max(cleaned.rfind('}'), cleaned.rfind(']')) + 1
+        try:
+            json.loads(cleaned[start:end])
+            return True
+        except (json.JSONDecodeError, ValueError):
+            return False
+
+    async def _make_request(self, messages: list, max_tokens: int = 2000,
+                            cache_namespace: Optional[str] = None,
+                            bypass_cache: bool = False) -> Optional[str]:
+        """发起API请求（异步，使用共享keep-alive连接池，不阻塞事件循环）
+
+        Args:
+            messages: 消息列表
+            max_tokens: 最大生成token数
+            cache_namespace: 缓存命名空间（决定TTL），为空时不使用缓存
+            bypass_cache: 为True时跳过缓存读取，强制请求LLM并刷新缓存
+        """
+        ttl = get_cache_ttl(cache_namespace) if LLM_CACHE_ENABLED else 0
+        cache_key = make_cache_key(self.model, messages, max_tokens) if ttl > 0 else None
+
+        if cache_key and not bypass_cache:
+            try:
+                cached = await asyncio.to_thread(get_llm_cache().get, cache_key)
+            except Exception as e:
+                logger.warning(f"⚠️ 读取LLM缓存失败，直接请求API: {e}")
+                cached = None
+            if cached is not None:
+                logger.info(f"💾 命中LLM缓存: namespace={cache_namespace}, key={cache_key[:12]}")
+                return cached
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                content = await self._send_once(messages, max_tokens)
+                break
+            except LLMRequestError as e:
+                if not self.retry_policy.should_retry(e, attempt):
+                    raise
+                delay = self.retry_policy.compute_delay(attempt, e.retry_after)
+                logger.warning(f"🔁 LLM请求失败，{delay:.1f} 秒后进行第 {attempt + 1}/{self.retry_policy.max_attempts} 次尝试: {e}")
+                await asyncio.sleep(delay)
+
+        if cache_key and self._is_json_response(content):
+            try:
+                await asyncio.to_thread(
+                    get_llm_cache().set, cache_key, content, ttl, cache_namespace, self.model
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ 写入LLM缓存失败: {e}")
+        return content
+
+    async def _send_once(self, messages: list, max_tokens: int) -> Optional[str]:
+        """经过限流器和熔断器发送一次请求
+
+        先在限流器排队，再向熔断器申请放行：半开探测名额只在真正发出请求前占用，
+        放行后任何退出路径（包括取消）都会上报结果，避免探测名额泄漏导致熔断器一直拒绝请求。
+        """
+        limiter = get_rate_limiter()
+        await limiter.acquire(estimate_tokens(messages, max_tokens))
+        status_code = None
+        retry_after = None
+        timed_out = False
+        try:
+            self.circuit_breaker.before_request()
+            headers, data = self._build_request(messages, max_tokens)
+            client = get_async_http_client(self.timeout)
+            response = await client.post(self.base_url, headers=headers, json=data, timeout=self.timeout)
+            status_code = response.status_code
+            retry_after = self._parse_retry_after(response)
+            content = self._parse_response(response)
+        except LLMCircuitOpenError:
+            # 熔断器未放行，没有占用探测名额
+            raise
+        except LLMRequestError as e:
+            if e.is_server_failure:
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_neutral()
+            raise
+        except ValueError:
+            self.circuit_breaker.record_neutral()
+            raise
         except Exception as e:
-            main_logger.error(f"❌ LLM API调用过程中发生未知错误: {str(e)}。")
-            raise ValueError(f"❌ LLM API调用过程中发生未知错误: {str(e)}。请检查所有配置参数。")
-    
-    async def analyze_hospital_hierarchy(self, hospital_name: str, query: str = "") -> Dict[str, Any]:
+            timed_out = isinstance(e, httpx.TimeoutException)
+            error = self._translate_error(e)
+            if isinstance(error, LLMRequestError) and error.is_server_failure:
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_neutral()
+            raise error
+        except BaseException:
+            # 任务取消等：不影响熔断判断，但要释放半开探测名额
+            self.circuit_breaker.record_neutral()
+            raise
+        finally:
+            limiter.release(status_code, retry_after, timed_out=timed_out)
+        self.circuit_breaker.record_success()
+        return content
+
+    async def _make_request_stream(self, messages: list, max_tokens: int = 2000,
+                                   cache_namespace: Optional[str] = None,
+                                   bypass_cache: bool = False) -> AsyncIterator[str]:
+        """发起流式API请求，逐段产出模型回复文本
+
+        只有在尚未产出任何内容时才按重试策略重试；完整回复同样写入响应缓存，
+        命中缓存时一次性产出缓存内容。
+        """
+        ttl = get_cache_ttl(cache_namespace) if LLM_CACHE_ENABLED else 0
+        cache_key = make_cache_key(self.model, messages, max_tokens) if ttl > 0 else None
+
+        if cache_key and not bypass_cache:
+            try:
+                cached = await asyncio.to_thread(get_llm_cache().get, cache_key)
+            except Exception as e:
+                logger.warning(f"⚠️ 读取LLM缓存失败，直接请求API: {e}")
+                cached = None
+            if cached is not None:
+                logger.info(f"💾 命中LLM缓存(流式): namespace={cache_namespace}, key={cache_key[:12]}")
+                yield cached
+                return
+
+        chunks: List[str] = []
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                async for delta in self._stream_once(messages, max_tokens):
+                    chunks.append(delta)
+                    yield delta
+                break
+            except LLMRequestError as e:
+                if chunks or not self.retry_policy.should_retry(e, attempt):
+                    raise
+                delay = self.retry_policy.compute_delay(attempt, e.retry_after)
+                logger.warning(f"🔁 LLM流式请求失败，{delay:.1f} 秒后进行第 {attempt + 1}/{self.retry_policy.max_attempts} 次尝试: {e}")
+                await asyncio.sleep(delay)
+
+        content = "".join(chunks)
+        logger.info(f"📥 流式回复接收完成: {len(content)} 字符")
+        if cache_key and self._is_json_response(content):
+            try:
+                await asyncio.to_thread(
+                    get_llm_cache().set, cache_key, content, ttl, cache_namespace, self.model
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ 写入LLM缓存失败: {e}")
+
+    async def _stream_once(self, messages: list, max_tokens: int) -> AsyncIterator[str]:
+        """经过限流器和熔断器发送一次流式请求（放行顺序与 _send_once 相同）"""
+        limiter = get_rate_limiter()
+        await limiter.acquire(estimate_tokens(messages, max_tokens))
+        status_code = None
+        retry_after = None
+        timed_out = False
+        try:
+            self.circuit_breaker.before_request()
+            headers, data = self._build_request(messages, max_tokens, stream=True)
+            client = get_async_http_client(self.timeout)
+            async with client.stream("POST", self.base_url, headers=headers, json=data, timeout=self.timeout) as response:
+                status_code = response.status_code
+                retry_after = self._parse_retry_after(response)
+                if response.status_code != 200:
+                    await response.aread()
+                    self._check_status(response)
+                async for line in response.aiter_lines():
+                    chunk = parse_sse_line(line)
+                    if chunk is None:
+                        continue
+                    delta = extract_stream_delta(chunk)
+                    if delta:
+                        yield delta
+        except LLMCircuitOpenError:
+            raise
+        except LLMRequestError as e:
+            if e.is_server_failure:
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_neutral()
+            raise
+        except ValueError:
+            self.circuit_breaker.record_neutral()
+            raise
+        except Exception as e:
+            timed_out = isinstance(e, httpx.TimeoutException)
+            error = self._translate_error(e)
+            if isinstance(error, LLMRequestError) and error.is_server_failure:
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_neutral()
+            raise error
+        except BaseException:
+            # 任务取消、消费方提前停止读取（GeneratorExit）等
+            self.circuit_breaker.record_neutral()
+            raise
+        finally:
+            limiter.release(status_code, retry_after, timed_out=timed_out)
+        self.circuit_breaker.record_success()
+
+    @single_flight
+    async def analyze_hospital_hierarchy(self, hospital_name: str, query: str = "", bypass_cache: bool = False) -> Dict[str, Any]:
         """分析医院层级结构（仅使用真实LLM API）"""
         try:
             # 只记录关键错误信息
@@ -219,7 +676,7 @@ class LLMClient:
             logger.info(f"=================")
 
             # 调用LLM API
-            response = self._make_request(messages)
+            response = await self._make_request(messages, cache_namespace="hierarchy", bypass_cache=bypass_cache)
 
             if not response:
                 raise ValueError("LLM API返回空响应！请检查API服务是否正常。")
@@ -305,6 +762,7 @@ class LLMClient:
             main_logger.error(f"医院层级结构分析失败: {str(e)}")
             raise ValueError(f"医院层级结构分析失败: {str(e)}")
     
+    @single_flight
     async def generate_hierarchy_report(self, hospital_data: Dict[str, Any]) -> str:
         """生成层级结构报告（仅使用真实LLM API）"""
         try:
@@ -353,7 +811,7 @@ class LLMClient:
 
             logger.info("🔄 正在调用LLM API生成医院分析报告...")
 
-            response = self._make_request(messages, max_tokens=3000)
+            response = await self._make_request(messages, max_tokens=3000)
 
             if not response:
                 raise ValueError("❌ LLM API返回空响应！无法生成报告。")
@@ -368,7 +826,8 @@ class LLMClient:
             main_logger.error(f"❌ 医院分析报告生成过程中发生未知错误: {str(e)}")
             raise ValueError(f"❌ 医院分析报告生成过程中发生未知错误: {str(e)}")
 
-    async def get_cities_by_province(self, province_name: str) -> Dict[str, Any]:
+    @single_flight
+    async def get_cities_by_province(self, province_name: str, bypass_cache: bool = False) -> Dict[str, Any]:
         """获取指定省份的城市数据（仅使用真实LLM API）"""
         try:
             main_logger.info(f"开始获取省份城市数据: {province_name}")
@@ -408,7 +867,7 @@ class LLMClient:
             logger.info(f"============================")
 
             # 调用LLM API
-            response = self._make_request(messages)
+            response = await self._make_request(messages, cache_namespace="cities", bypass_cache=bypass_cache)
 
             if not response:
                 raise ValueError("LLM API返回空响应！请检查API服务是否正常。")
@@ -497,7 +956,8 @@ class LLMClient:
             main_logger.error(f"省份城市数据获取失败: {str(e)}")
             raise ValueError(f"省份城市数据获取失败: {str(e)}")
 
-    async def get_districts_by_city(self, city_name: str) -> Dict[str, Any]:
+    @single_flight
+    async def get_districts_by_city(self, city_name: str, bypass_cache: bool = False) -> Dict[str, Any]:
         """获取指定城市的区县数据（仅使用真实LLM API）"""
         try:
             main_logger.info(f"开始获取城市区县数据: {city_name}")
@@ -541,7 +1001,7 @@ class LLMClient:
             logger.info(f"=========================")
 
             # 调用LLM API
-            response = self._make_request(messages)
+            response = await self._make_request(messages, cache_namespace="districts", bypass_cache=bypass_cache)
 
             if not response:
                 raise ValueError("LLM API返回空响应！请检查API服务是否正常。")
@@ -632,16 +1092,11 @@ class LLMClient:
             main_logger.error(f"城市区县数据获取失败: {str(e)}")
             raise ValueError(f"城市区县数据获取失败: {str(e)}")
 
-    async def get_hospitals_from_district(self, province_name: str, city_name: str, district_name: str) -> list:
-        """获取指定区县的医院数据（仅使用真实LLM API）"""
-        try:
-            main_logger.info(f"开始获取区县医院数据: {province_name} -> {city_name} -> {district_name}")
-
-            if not district_name or len(district_name.strip()) < 2:
-                raise ValueError(f"区县名称无效！'{district_name}' 请提供有效的区县名称（至少2个字符）")
-
-            # 构造提示词
-            system_prompt = """你是一个专业的医疗信息系统专家。请根据用户指定的省市区县信息，返回该区县内的所有医院信息。
+    @staticmethod
+    def _build_district_hospital_messages(province_name: str, city_name: str, district_name: str) -> list:
+        """构造区县医院查询的提示词消息"""
+        # 构造提示词
+        system_prompt = """你是一个专业的医疗信息系统专家。请根据用户指定的省市区县信息，返回该区县内的所有医院信息。
 
 请严格按照JSON数组格式返回，每个医院对象包含以下字段：
 - name: 医院名称（字符串）
@@ -658,7 +1113,7 @@ class LLMClient:
 4. 如果某些信息不确定，请根据公开信息进行合理推断
 5. 不要在JSON前后添加其他说明文字"""
 
-            user_prompt = f"""请查询以下区县的医院信息：
+        user_prompt = f"""请查询以下区县的医院信息：
 
 省份：{province_name.strip()}
 城市：{city_name.strip()}
@@ -666,10 +1121,25 @@ class LLMClient:
 
 请返回该区县内所有医院的详细信息。"""
 
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        return messages
+
+    @single_flight
+    async def get_hospitals_from_district(self, province_name: str, city_name: str, district_name: str,
+                                          bypass_cache: bool = False) -> list:
+        """获取指定区县的医院数据（仅使用真实LLM API）"""
+        try:
+            main_logger.info(f"开始获取区县医院数据: {province_name} -> {city_name} -> {district_name}")
+
+            if not district_name or len(district_name.strip()) < 2:
+                raise ValueError(f"区县名称无效！'{district_name}' 请提供有效的区县名称（至少2个字符）")
+
+            messages = self._build_district_hospital_messages(province_name, city_name, district_name)
+            system_prompt = messages[0]["content"]
+            user_prompt = messages[1]["content"]
 
             # 记录发送给LLM的提示词
             logger.info(f"=== LLM医院查询提示词 ===")
@@ -678,7 +1148,7 @@ class LLMClient:
             logger.info(f"=========================")
 
             # 调用LLM API
-            response = self._make_request(messages)
+            response = await self._make_request(messages, cache_namespace="hospitals", bypass_cache=bypass_cache)
 
             if not response:
                 raise ValueError("LLM API返回空响应！请检查API服务是否正常。")
@@ -753,7 +1223,55 @@ class LLMClient:
             main_logger.error(f"区县医院数据获取失败: {str(e)}")
             raise ValueError(f"区县医院数据获取失败: {str(e)}")
 
-    async def get_hospital_website(self, hospital_name: str) -> Dict[str, Any]:
+    async def stream_hospitals_from_district(self, province_name: str, city_name: str, district_name: str,
+                                             bypass_cache: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """流式获取指定区县的医院数据，每解析出一家医院立即产出
+
+        回复中途中断或被截断时，已解析的医院仍然有效；只有在一家医院都未解析出时才抛出ValueError。
+        与 get_hospitals_from_district 共用请求合并键：相同区县的请求（流式或非流式）正在进行时不重复调用LLM。
+        """
+        key = _single_flight_key("get_hospitals_from_district", self.model,
+                                 (province_name, city_name, district_name),
+                                 {"bypass_cache": True} if bypass_cache else {})
+        async for hospital in _single_flight.stream(
+                key, lambda: self._stream_hospitals_from_district(province_name, city_name, district_name, bypass_cache)):
+            yield hospital
+
+    async def _stream_hospitals_from_district(self, province_name: str, city_name: str, district_name: str,
+                                              bypass_cache: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        main_logger.info(f"开始流式获取区县医院数据: {province_name} -> {city_name} -> {district_name}")
+
+        if not district_name or len(district_name.strip()) < 2:
+            raise ValueError(f"区县名称无效！'{district_name}' 请提供有效的区县名称（至少2个字符）")
+
+        messages = self._build_district_hospital_messages(province_name, city_name, district_name)
+        parser = IncrementalJSONArrayParser()
+        count = 0
+
+        try:
+            async for delta in self._make_request_stream(messages, cache_namespace="hospitals",
+                                                         bypass_cache=bypass_cache):
+                for item in parser.feed(delta):
+                    if not isinstance(item, dict) or not item.get('name'):
+                        logger.warning(f"⚠️ 跳过缺少name字段的医院数据: {item}")
+                        continue
+                    count += 1
+                    yield item
+        except ValueError as e:
+            if count == 0:
+                raise
+            main_logger.warning(f"⚠️ 区县 {district_name} 流式回复中断，保留已解析的 {count} 家医院: {e}")
+            return
+
+        if not parser.started:
+            raise ValueError(f"响应中未找到有效的JSON数组格式！区县: {district_name}")
+        if not parser.finished:
+            main_logger.warning(f"⚠️ 区县 {district_name} 的回复被截断，保留已解析的 {count} 家医院")
+
+        main_logger.info(f"区县医院数据流式获取完成: {district_name}，共 {count} 家医院")
+
+    @single_flight
+    async def get_hospital_website(self, hospital_name: str, bypass_cache: bool = False) -> Dict[str, Any]:
         """获取医院官方网站信息（仅使用真实LLM API）"""
         try:
             request_id = f"REQ-{uuid.uuid4().hex[:8]}"
@@ -806,7 +1324,7 @@ class LLMClient:
 
             # 调用LLM API
             llm_start_time = time.time()
-            response = self._make_request(messages, max_tokens=1500)
+            response = await self._make_request(messages, max_tokens=1500, cache_namespace="website", bypass_cache=bypass_cache)
             llm_response_time = time.time() - llm_start_time
 
             if not response:
@@ -912,4 +1430,168 @@ class LLMClient:
             error_msg = f"医院网站查询过程中发生未知错误: {str(e)}"
             main_logger.error(f"[{request_id}] {error_msg}")
             main_logger.error(f"[{request_id}] 总耗时: {total_time:.2f}s")
-            raise ValueError(error_msg)
\ No newline at end of file
+            raise ValueError(error_msg)
+
+    @single_flight
+    async def get_hospital_websites_batch(self, hospital_names: List[str], bypass_cache: bool = False) -> List[Dict[str, Any]]:
+        """批量获取多家医院的官方网站信息（一次LLM请求查询多家医院）
+
+        返回与输入顺序一致的结果列表；批量回复中缺失或格式错误的条目会单独调用
+        get_hospital_website 重试，仍失败的条目包含 error 字段而不抛出异常。
+        """
+        request_id = f"BREQ-{uuid.uuid4().hex[:8]}"
+        start_time = time.time()
+
+        # 去重后查询，结果再按输入顺序展开
+        unique_names = []
+        for name in hospital_names:
+            name_clean = (name or "").strip()
+            if len(name_clean) >= 2 and name_clean not in unique_names:
+                unique_names.append(name_clean)
+
+        main_logger.info(f"[{request_id}] 批量网站查询开始: 输入 {len(hospital_names)} 家，去重后 {len(unique_names)} 家")
+
+        resolved: Dict[str, Dict[str, Any]] = {}
+        llm_response_time = 0.0
+
+        if unique_names:
+            system_prompt = """你是一个专业的医疗信息查询专家。请根据用户提供的医院名称列表，查询并返回每家医院的官方网站信息。
+
+请严格按照JSON数组格式返回，数组中每个元素对应一家医院，包含以下字段：
+- index: 医院在列表中的序号（整数，与输入序号一致）
+- query_name: 输入的医院名称（字符串，原样返回）
+- hospital_name: 医院全名（字符串）
+- website: 官方网站URL（字符串，必须是完整的URL，如 https://www.xxx.com；无法确定时为null）
+- website_status: 网站状态（字符串：可用/不可用/未知）
+- confidence: 信息可信度（字符串：高/中/低）
+- alternative_names: 医院的其他可能名称（字符串数组）
+- notes: 备注信息（字符串）
+
+查询要求：
+1. 优先返回医院的官方网站（以.gov.cn、.edu.cn、.com等结尾的正规域名）
+2. 网站URL必须是完整的，包含协议头（http://或https://）
+3. 不要返回虚假或猜测的网站地址
+4. 每家医院都必须返回一个元素，不要遗漏
+
+注意：
+- 必须返回有效的JSON数组
+- 不要在JSON前后添加其他说明文字"""
+
+            name_lines = "\n".join(f"{i}. {name}" for i, name in enumerate(unique_names, 1))
+            user_prompt = f"""请查询以下 {len(unique_names)} 家医院的官方网站信息：
+
+{name_lines}
+
+请按序号返回JSON数组。"""
+
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ]
+
+            # 每家医院约需300个token的回复空间
+            max_tokens = min(8000, 300 * len(unique_names) + 200)
+
+            try:
+                llm_start_time = time.time()
+                response = await self._make_request(messages, max_tokens=max_tokens,
+                                                    cache_namespace="website_batch", bypass_cache=bypass_cache)
+                llm_response_time = time.time() - llm_start_time
+                main_logger.info(f"[{request_id}] 批量LLM查询成功: response_length={len(response or '')}, "
+                                 f"response_time={llm_response_time:.2f}s")
+                resolved = self._parse_website_batch(response or "", unique_names, request_id)
+            except ValueError as e:
+                main_logger.error(f"[{request_id}] 批量LLM查询失败，将逐个重试: {e}")
+
+        per_item_time = round(llm_response_time / len(unique_names), 2) if unique_names else 0.0
+        for name, result in resolved.items():
+            result['llm_response_time'] = per_item_time
+            result['request_id'] = request_id
+            result['raw_hospital_name'] = name
+
+        # 单独重试缺失或格式错误的条目
+        missing = [name for name in unique_names if name not in resolved]
+        if missing:
+            main_logger.warning(f"[{request_id}] 批量结果缺失 {len(missing)} 家医院，逐个重试: {missing}")
+        for name in missing:
+            try:
+                resolved[name] = await self.get_hospital_website(name, bypass_cache=bypass_cache)
+            except ValueError as e:
+                resolved[name] = {
+                    "hospital_name": name,
+                    "website": None,
+                    "raw_hospital_name": name,
+                    "request_id": request_id,
+                    "llm_response_time": 0.0,
+                    "error": str(e)
+                }
+
+        results = []
+        for name in hospital_names:
+            name_clean = (name or "").strip()
+            if name_clean in resolved:
+                results.append(dict(resolved[name_clean]))
+            else:
+                results.append({
+                    "hospital_name": name,
+                    "website": None,
+                    "raw_hospital_name": name,
+                    "request_id": request_id,
+                    "llm_response_time": 0.0,
+                    "error": f"医院名称无效！'{name}' 请提供有效的医院名称（至少2个字符）"
+                })
+
+        total_time = time.time() - start_time
+        main_logger.info(f"[{request_id}] 批量网站查询完成: {len(unique_names)} 家，批量命中 {len(unique_names) - len(missing)} 家，"
+                         f"单独重试 {len(missing)} 家，总耗时={total_time:.2f}s")
+        return results
+
+    def _parse_website_batch(self, response: str, names: List[str], request_id: str) -> Dict[str, Dict[str, Any]]:
+        """解析批量网站查询回复，返回 {输入名称: 结果}，无法对应的条目被丢弃"""
+        response = response.strip()
+        if response.startswith('```json'):
+            response = response[7:]
+        if response.startswith('```'):
+            response = response[3:]
+        if response.endswith('```'):
+            response = response[:-3]
+        response = response.strip()
+
+        json_start = response.find('[')
+        json_end = response.rfind(']') + 1
+        if json_start == -1 or json_end <= json_start:
+            main_logger.error(f"[{request_id}] 批量回复中未找到JSON数组: {response[:500]}...")
+            return {}
+
+        try:
+            items = json.loads(response[json_start:json_end])
+        except json.JSONDecodeError as e:
+            main_logger.error(f"[{request_id}] 批量回复JSON解析失败: {e}")
+            return {}
+
+        resolved: Dict[str, Dict[str, Any]] = {}
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict) or 'website' not in item:
+                continue
+
+            # 优先按序号对应，其次按输入名称对应
+            name = None
+            index = item.get('index')
+            if isinstance(index, int) and 1 <= index <= len(names):
+                name = names[index - 1]
+            query_name = str(item.get('query_name') or '').strip()
+            if query_name in names and (name is None or name != query_name):
+                name = query_name
+            if name is None or name in resolved:
+                continue
+
+            website = item.get('website')
+            if not isinstance(website, str):
+                # 模型偶尔返回数字、列表等非字符串值，按未找到官网处理
+                website = item['website'] = None
+            if website and website != 'null' and not website.startswith(('http://', 'https://')):
+                item['website'] = 'https://' + website
+            item.setdefault('hospital_name', name)
+            resolved[name] = item
+
+        return resolved
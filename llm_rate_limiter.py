@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+医院层级扫查微服务 - LLM自适应限流器
+
+所有LLM请求共享同一个限流器：
+- 令牌桶：每分钟请求数（LLM_RPM）和每分钟token数（LLM_TPM）
+- AIMD自适应并发：成功时加性增加并发上限，遇到429/5xx时乘性减小并进入冷却期
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger('llm_client')
+
+LLM_RPM = float(os.getenv("LLM_RPM", "60"))
+LLM_TPM = float(os.getenv("LLM_TPM", "100000"))
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_INITIAL_CONCURRENCY = int(os.getenv("LLM_INITIAL_CONCURRENCY", "4"))
+LLM_THROTTLE_COOLDOWN = float(os.getenv("LLM_THROTTLE_COOLDOWN", "5"))
+
+# 触发退避的状态码
+THROTTLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def estimate_tokens(messages: list, max_tokens: int) -> int:
+    """粗略估算一次请求消耗的token数（中文约1字符1token，加上最大生成长度）"""
+    prompt_chars = sum(len(str(m.get("content", ""))) for m in messages)
+    return prompt_chars + max_tokens
+
+
+class AdaptiveRateLimiter:
+    """令牌桶 + AIMD 自适应并发限流器"""
+
+    def __init__(self,
+                 requests_per_minute: float = LLM_RPM,
+                 tokens_per_minute: float = LLM_TPM,
+                 min_concurrency: int = LLM_MIN_CONCURRENCY,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 initial_concurrency: int = LLM_INITIAL_CONCURRENCY,
+                 cooldown: float = LLM_THROTTLE_COOLDOWN):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.cooldown = cooldown
+
+        self._lock = threading.Lock()
+        self._concurrency_limit = float(min(max(initial_concurrency, self.min_concurrency), self.max_concurrency))
+        self._in_flight = 0
+        self._request_tokens = requests_per_minute
+        self._token_tokens = tokens_per_minute
+        self._last_refill = time.monotonic()
+        self._cooldown_until = 0.0
+        self._stats = {"acquired": 0, "succeeded": 0, "throttled": 0, "failed": 0, "total_wait_seconds": 0.0}
+
+    def _refill(self, now: float):
+        """按经过时间补充令牌，调用方需持有锁"""
+        elapsed = now - self._last_refill
+        if elapsed <= 0:
+            return
+        self._request_tokens = min(self.requests_per_minute,
+                                   self._request_tokens + elapsed * self.requests_per_minute / 60.0)
+        self._token_tokens = min(self.tokens_per_minute,
+                                 self._token_tokens + elapsed * self.tokens_per_minute / 60.0)
+        self._last_refill = now
+
+    async def acquire(self, tokens: int = 0):
+        """等待并占用一个请求名额（并发槽位 + 请求令牌 + token令牌）"""
+        # 单个请求估算值超过桶容量时按桶容量计，避免永远等待
+        tokens = min(tokens, self.tokens_per_minute)
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._cooldown_until:
+                    wait = self._cooldown_until - now
+                elif self._in_flight >= int(self._concurrency_limit):
+                    wait = 0.05
+                elif self._request_tokens < 1:
+                    wait = (1 - self._request_tokens) * 60.0 / self.requests_per_minute
+                elif self._token_tokens < tokens:
+                    wait = (tokens - self._token_tokens) * 60.0 / self.tokens_per_minute
+                else:
+                    self._request_tokens -= 1
+                    self._token_tokens -= tokens
+                    self._in_flight += 1
+                    self._stats["acquired"] += 1
+                    self._stats["total_wait_seconds"] += now - start
+                    return
+            await asyncio.sleep(min(max(wait, 0.01), 1.0))
+
+    def release(self, status_code: Optional[int] = None, retry_after: Optional[float] = None,
+                timed_out: bool = False):
+        """释放名额并根据结果调整并发上限
+
+        Args:
+            status_code: HTTP状态码，None 表示没有拿到响应（连接错误、任务取消等），只释放名额不调整并发
+            retry_after: 服务端建议的等待秒数（Retry-After）
+            timed_out: 请求是否因超时失败，超时与429/5xx一样触发退避
+        """
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            if status_code is not None and status_code < 400:
+                # 加性增加：每成功约一个并发窗口的请求，并发上限+1
+                self._stats["succeeded"] += 1
+                self._concurrency_limit = min(self.max_concurrency,
+                                              self._concurrency_limit + 1.0 / self._concurrency_limit)
+            elif timed_out or status_code in THROTTLE_STATUS_CODES:
+                # 乘性减小并进入冷却期
+                self._stats["throttled"] += 1
+                old_limit = self._concurrency_limit
+                self._concurrency_limit = max(float(self.min_concurrency), self._concurrency_limit / 2)
+                cooldown = retry_after if retry_after is not None else self.cooldown
+                self._cooldown_until = max(self._cooldown_until, time.monotonic() + cooldown)
+                reason = "超时" if timed_out else f"状态码={status_code}"
+                logger.warning(f"🐢 LLM限流退避: {reason}, 并发上限 {old_limit:.1f} -> "
+                               f"{self._concurrency_limit:.1f}, 冷却 {cooldown:.1f} 秒")
+            else:
+                self._stats["failed"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取限流器状态"""
+        with self._lock:
+            self._refill(time.monotonic())
+            stats = dict(self._stats)
+            stats.update({
+                "requests_per_minute": self.requests_per_minute,
+                "tokens_per_minute": self.tokens_per_minute,
+                "concurrency_limit": round(self._concurrency_limit, 2),
+                "min_concurrency": self.min_concurrency,
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "available_requests": round(self._request_tokens, 2),
+                "available_tokens": int(self._token_tokens),
+                "cooldown_remaining": round(max(0.0, self._cooldown_until - time.monotonic()), 2),
+            })
+            stats["total_wait_seconds"] = round(stats["total_wait_seconds"], 2)
+        return stats
+
+
+_limiter_instance: Optional[AdaptiveRateLimiter] = None
+_limiter_instance_lock = threading.Lock()
+
+
+def get_rate_limiter() -> AdaptiveRateLimiter:
+    """获取进程内共享的LLM限流器"""
+    global _limiter_instance
+    with _limiter_instance_lock:
+        if _limiter_instance is None:
+            _limiter_instance = AdaptiveRateLimiter()
+        return _limiter_instance
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+医院层级扫查微服务 - LLM请求重试策略与熔断器
+
+- RetryPolicy: 带抖动的指数退避重试（最大次数、基础/最大延迟、可重试状态码）
+- CircuitBreaker: 连续失败达到阈值后熔断，冷却期内快速失败，之后半开放行探测请求
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+from typing import Dict, Any, Optional, Iterable
+
+logger = logging.getLogger('llm_client')
+main_logger = logging.getLogger(__name__)
+
+
+class LLMRequestError(ValueError):
+    """LLM请求错误（继承ValueError以兼容现有的错误处理）"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None,
+                 retry_after: Optional[float] = None, network_error: bool = False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.network_error = network_error
+
+    @property
+    def is_server_failure(self) -> bool:
+        """是否属于服务端不可用类错误（计入熔断失败次数）"""
+        return self.network_error or (self.status_code is not None and self.status_code >= 500)
+
+
+class LLMCircuitOpenError(LLMRequestError):
+    """熔断器打开时的快速失败错误"""
+
+
+def _parse_status_codes(value: str) -> Iterable[int]:
+    return {int(code) for code in value.split(",") if code.strip().isdigit()}
+
+
+class RetryPolicy:
+    """带抖动的指数退避重试策略"""
+
+    def __init__(self,
+                 max_attempts: int = 3,
+                 base_delay: float = 1.0,
+                 max_delay: float = 30.0,
+                 jitter: float = 0.5,
+                 retryable_status_codes: Iterable[int] = (429, 500, 502, 503, 504),
+                 retry_on_network_error: bool = True):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = min(max(jitter, 0.0), 1.0)
+        self.retryable_status_codes = set(retryable_status_codes)
+        self.retry_on_network_error = retry_on_network_error
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        """从环境变量读取重试配置"""
+        return cls(
+            max_attempts=int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", "3")),
+            base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", "1.0")),
+            max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", "30")),
+            jitter=float(os.getenv("LLM_RETRY_JITTER", "0.5")),
+            retryable_status_codes=_parse_status_codes(os.getenv("LLM_RETRY_STATUS_CODES", "429,500,502,503,504")),
+            retry_on_network_error=os.getenv("LLM_RETRY_ON_NETWORK_ERROR", "true").lower() in ("1", "true", "yes"),
+        )
+
+    def is_retryable(self, error: Exception) -> bool:
+        """判断错误是否可重试"""
+        if isinstance(error, LLMCircuitOpenError) or not isinstance(error, LLMRequestError):
+            return False
+        if error.network_error:
+            return self.retry_on_network_error
+        return error.status_code in self.retryable_status_codes
+
+    def should_retry(self, error: Exception, attempt: int) -> bool:
+        """第attempt次（从1开始）尝试失败后是否继续重试"""
+        return attempt < self.max_attempts and self.is_retryable(error)
+
+    def compute_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """计算第attempt次失败后的等待时间，服务端给出Retry-After时以其为下限"""
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        delay = delay * (1 - self.jitter * random.random())
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "max_attempts": self.max_attempts,
+            "base_delay": self.base_delay,
+            "max_delay": self.max_delay,
+            "jitter": self.jitter,
+            "retryable_status_codes": sorted(self.retryable_status_codes),
+            "retry_on_network_error": self.retry_on_network_error,
+        }
+
+
+class CircuitBreaker:
+    """熔断器：closed -> open -> half_open -> closed"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 60.0, name: str = "llm"):
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_timeout = recovery_timeout
+        self.name = name
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._stats = {"rejected": 0, "opened": 0, "successes": 0, "failures": 0}
+
+    @classmethod
+    def from_env(cls, name: str = "llm") -> "CircuitBreaker":
+        """从环境变量读取熔断配置"""
+        return cls(
+            failure_threshold=int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5")),
+            recovery_timeout=float(os.getenv("LLM_BREAKER_RECOVERY_TIMEOUT", "60")),
+            name=name,
+        )
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        """冷却期结束后自动进入半开状态，调用方需持有锁"""
+        if self._state == self.OPEN and now - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+            logger.info(f"🟡 LLM熔断器进入半开状态: {self.name}")
+        return self._state
+
+    def before_request(self):
+        """请求前检查，熔断打开时抛出LLMCircuitOpenError"""
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                # 半开状态只放行一个探测请求
+                self._probe_in_flight = True
+                return
+            self._stats["rejected"] += 1
+            remaining = max(0.0, self.recovery_timeout - (now - self._opened_at))
+        main_logger.error(f"❌ LLM服务熔断中，快速失败（约 {remaining:.0f} 秒后重新探测）")
+        raise LLMCircuitOpenError(f"❌ LLM服务暂时不可用（熔断中），约 {remaining:.0f} 秒后重试。")
+
+    def record_success(self):
+        with self._lock:
+            self._stats["successes"] += 1
+            if self._state != self.CLOSED:
+                logger.info(f"🟢 LLM熔断器恢复关闭状态: {self.name}")
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._stats["failures"] += 1
+            self._consecutive_failures += 1
+            state = self._current_state(time.monotonic())
+            if state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if state != self.OPEN:
+                    self._stats["opened"] += 1
+                    logger.error(f"🔴 LLM熔断器打开: {self.name}, 连续失败 {self._consecutive_failures} 次，"
+                                 f"{self.recovery_timeout:.0f} 秒内快速失败")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def record_neutral(self):
+        """请求结束但不影响熔断判断（如4xx错误），释放半开探测名额"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            stats = dict(self._stats)
+            stats.update({
+                "name": self.name,
+                "state": state,
+                "consecutive_failures": self._consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "recovery_timeout": self.recovery_timeout,
+                "open_remaining": round(max(0.0, self.recovery_timeout - (now - self._opened_at)), 2)
+                if state == self.OPEN else 0.0,
+            })
+        return stats
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """获取指定API地址共享的熔断器（同一端点的所有LLMClient实例共享状态）"""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker.from_env(name)
+        return _breakers[name]
+
+
+def get_all_circuit_breaker_stats() -> Dict[str, Any]:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.get_stats() for breaker in breakers}
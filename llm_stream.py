@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+医院层级扫查微服务 - LLM流式响应解析
+
+- extract_stream_delta: 从SSE数据块中提取增量文本（兼容DashScope和OpenAI格式）
+- IncrementalJSONArrayParser: 增量解析JSON数组，每个顶层对象闭合后立即产出
+"""
+
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger('llm_client')
+
+
+def extract_stream_delta(chunk: Dict[str, Any]) -> str:
+    """从一个流式数据块中提取增量文本"""
+    output = chunk.get("output")
+    if isinstance(output, dict):
+        choices = output.get("choices")
+        if choices:
+            message = choices[0].get("message") or choices[0].get("delta") or {}
+            return message.get("content") or ""
+        if "text" in output:
+            return output.get("text") or ""
+
+    choices = chunk.get("choices")
+    if choices:
+        delta = choices[0].get("delta") or choices[0].get("message") or {}
+        return delta.get("content") or ""
+    return ""
+
+
+def parse_sse_line(line: str) -> Optional[Dict[str, Any]]:
+    """解析一行SSE数据，返回JSON对象；非数据行或结束标记返回None"""
+    line = line.strip()
+    if not line.startswith("data:"):
+        return None
+    payload = line[5:].strip()
+    if not payload or payload == "[DONE]":
+        return None
+    try:
+        return json.loads(payload)
+    except json.JSONDecodeError:
+        logger.warning(f"⚠️ 无法解析流式数据块: {payload[:200]}")
+        return None
+
+
+class IncrementalJSONArrayParser:
+    """增量JSON数组解析器
+
+    逐段喂入文本，跳过数组之前的markdown标记等内容，找到第一个 '[' 后，
+    每当一个顶层对象闭合即解析并返回；截断的尾部对象不会影响已解析的对象。
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._object_start = -1
+        self.parsed_count = 0
+        self.error_count = 0
+
+    @property
+    def started(self) -> bool:
+        """是否已经找到数组起始位置"""
+        return self._in_array or self._finished
+
+    @property
+    def finished(self) -> bool:
+        """数组是否已经闭合"""
+        return self._finished
+
+    def feed(self, text: str) -> List[Any]:
+        """喂入一段文本，返回本次新闭合的顶层元素列表"""
+        if self._finished or not text:
+            return []
+        self._buffer += text
+        items = []
+
+        while self._pos < len(self._buffer):
+            ch = self._buffer[self._pos]
+
+            if not self._in_array:
+                if ch == "[":
+                    self._in_array = True
+                self._pos += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._object_start = self._pos
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0 and self._object_start >= 0:
+                    fragment = self._buffer[self._object_start:self._pos + 1]
+                    try:
+                        items.append(json.loads(fragment))
+                        self.parsed_count += 1
+                    except json.JSONDecodeError as e:
+                        self.error_count += 1
+                        logger.warning(f"⚠️ 跳过无法解析的数组元素: {e}; 内容: {fragment[:200]}")
+                    self._object_start = -1
+            elif ch == "[":
+                self._depth += 1
+            elif ch == "]":
+                if self._depth == 0:
+                    self._finished = True
+                    self._pos += 1
+                    break
+                self._depth -= 1
+            self._pos += 1
+
+        # 丢弃已处理且不再需要的缓冲区内容
+        keep_from = self._object_start if self._object_start >= 0 else self._pos
+        if keep_from > 0:
+            self._buffer = self._buffer[keep_from:]
+            self._pos -= keep_from
+            if self._object_start >= 0:
+                self._object_start = 0
+        return items
@@ -13,27 +13,30 @@ except ImportError:
 
 from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 import uvicorn
 import logging
 import uuid
 import time
 import asyncio
-import sqlite3
+import json
 from datetime import datetime
 from contextlib import asynccontextmanager
 from urllib.parse import unquote
 from typing import List, Optional
 import sys
+import os
 import psutil
 import socket
 import subprocess
 import platform
 
-from db import init_db, get_db, clear_all_data, clear_all_tasks as db_clear_all_tasks, search_procurement_links, get_latest_procurement_links
+from db import init_db, close_db, get_db, clear_all_data, clear_all_tasks as db_clear_all_tasks, search_procurement_links, get_latest_procurement_links, fulltext_search_procurement_links
 from schemas import (
     ScanTaskRequest,
     ScanTaskResponse,
     TaskStatus,
+    TaskType,
     ScanResult,
     HospitalInfo,
     RefreshTaskRequest,
@@ -61,6 +64,9 @@ from schemas import (
     ProcurementLinkItem,
     ProcurementLatestRequest,
     ProcurementLatestResponse,
+    ProcurementFulltextRequest,
+    ProcurementFulltextResponse,
+    ProcurementFulltextItem,
     HospitalKeywordsRequest,
     HospitalKeywordsResponse,
     HospitalKeywordsDeleteRequest,
@@ -82,7 +88,10 @@ class StandardResponse:
             "data": self.data
         }
 from tasks import TaskManager, execute_province_cities_districts_refresh_task, execute_all_provinces_cascade_refresh
-from llm_client import LLMClient
+from cascade_pipeline import freshness_cutoff, is_fresh, plan_cascade_refresh, plan_city_refresh
+from job_queue import JobQueue
+from llm_client import LLMClient, close_http_clients, get_llm_runtime_stats
+from llm_cache import get_llm_cache
 from crawl import crawl_procurement_links
 
 # On Windows, use SelectorEventLoop so that asyncio subprocess APIs
@@ -240,23 +249,61 @@ def wait_for_port_free(port: int, timeout: int = 10) -> bool:
     logger.warning(f"等待端口 {port} 释放超时")
     return False
 
+# 批量更新医院网站时每次LLM请求合并查询的医院数量
+WEBSITE_BATCH_SIZE = int(os.getenv("WEBSITE_BATCH_SIZE", "10"))
+
+# 采购链接查询的默认每页条数（请求未指定page_size时使用）
+PROCUREMENT_PAGE_SIZE = int(os.getenv("PROCUREMENT_PAGE_SIZE", "500"))
+
 # 任务管理器
 task_manager = TaskManager()
 llm_client = LLMClient()
+# 持久化后台作业队列（/refresh/* 接口的后台任务入队执行，服务重启后自动恢复）
+job_queue = JobQueue(task_manager)
 
 def get_task_manager() -> TaskManager:
     """FastAPI依赖注入函数，返回TaskManager实例"""
     return task_manager
 
+async def _run_city_hospitals_refresh_job(task_id: str, payload: dict):
+    """城市医院刷新作业：执行时按城市ID重新读取城市及其区县"""
+    db = await get_db()
+    city_info = await db.get_city_by_id(payload["city_id"])
+    if not city_info:
+        error_msg = f"城市ID {payload['city_id']} 不存在"
+        await task_manager.update_task_status(task_id, TaskStatus.FAILED, error_msg)
+        raise ValueError(error_msg)
+    districts, _ = await db.get_districts(city_info['id'], 1, 1000)
+    await execute_city_hospitals_refresh(task_id, city_info, districts, payload.get("max_age_hours"))
+
+def register_job_handlers():
+    """注册各作业类型的处理函数（作业载荷只保存可JSON序列化的参数）"""
+    job_queue.register("province_refresh",
+                       lambda task_id, payload: execute_province_refresh_task(task_id, payload["province_name"]))
+    job_queue.register("district_hospital_refresh",
+                       lambda task_id, payload: execute_hospital_refresh_for_district(task_id, payload["district_name"]))
+    job_queue.register("province_cascade_refresh",
+                       lambda task_id, payload: execute_province_cities_districts_refresh_task(
+                           task_id, payload["province_name"], task_manager, payload.get("max_age_hours")))
+    job_queue.register("nationwide_cascade_refresh",
+                       lambda task_id, payload: execute_all_provinces_cascade_refresh(task_id, task_manager, payload.get("max_age_hours")))
+    job_queue.register("city_hospital_refresh", _run_city_hospitals_refresh_job)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
     # 启动时初始化
     logger.info("启动医院层级扫查微服务...")
     await init_db()
+    register_job_handlers()
+    await job_queue.start()
     yield
     # 关闭时清理
     logger.info("关闭医院层级扫查微服务...")
+    await job_queue.stop()
+    await task_manager.flush_progress()
+    await close_http_clients()
+    await close_db()
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -474,6 +521,15 @@ async def create_scan_task(
 async def get_task_status(task_id: str):
     """获取任务状态和结果"""
     try:
+        # 运行中的任务直接返回内存中的状态和进度
+        task_progress = await task_manager.get_progress(task_id)
+        if task_progress:
+            return {
+                "code": 200,
+                "message": "获取任务状态成功",
+                "data": task_progress
+            }
+
         # 先尝试获取任务结果（ScanResult格式）
         result = await task_manager.get_task_result(task_id)
         if result:
@@ -507,6 +563,69 @@ async def list_tasks():
         logger.error(f"获取任务列表失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/db/pool/stats",
+         summary="数据库连接池统计",
+         description="返回SQLite连接池的使用指标：读/写连接借出次数、平均及最大等待时间、正在使用的读连接数量、已创建连接数等；executor字段为数据库执行器（单写线程 + 读线程池）的排队与执行耗时。",
+         tags=["系统监控"])
+async def get_db_pool_stats():
+    """获取数据库连接池统计"""
+    db = await get_db()
+    return {"code": 200, "message": "获取数据库连接池统计成功", "data": db.get_pool_stats()}
+
+@app.get("/jobs",
+         summary="后台作业队列",
+         description="返回持久化后台作业队列的状态：各状态作业数量、本进程工作协程池统计（领取/完成/失败/恢复次数、正在执行的作业）、任务进度记录统计（进度更新次数与实际落库次数）以及最近的作业列表。可通过status参数（queued/running/succeeded/failed）过滤。",
+         tags=["系统监控"])
+async def list_jobs(status: Optional[str] = Query(None, description="作业状态过滤"),
+                    limit: int = Query(50, ge=1, le=1000, description="返回的作业数量")):
+    """获取后台作业队列状态"""
+    try:
+        db = await get_db()
+        return {"code": 200, "message": "获取作业队列状态成功", "data": {
+            "counts": await db.get_job_counts(),
+            "workers": job_queue.get_stats(),
+            "task_progress": task_manager.get_progress_stats(),
+            "jobs": await db.list_jobs(status, limit),
+        }}
+    except Exception as e:
+        logger.error(f"获取作业队列状态失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/llm/stats",
+         summary="LLM客户端运行时统计",
+         description="返回LLM客户端的运行时统计，包括相同请求合并（single-flight）的调用次数、实际执行次数和被合并次数，共享限流器的令牌余量和自适应并发上限，以及重试策略配置和熔断器状态。",
+         tags=["LLM缓存"])
+async def get_llm_stats():
+    """获取LLM客户端运行时统计"""
+    return {"code": 200, "message": "获取LLM运行时统计成功", "data": get_llm_runtime_stats()}
+
+@app.get("/llm/cache/stats",
+         summary="LLM缓存统计",
+         description="返回LLM响应缓存的命中/未命中次数、命中率、条目数量及各命名空间条目分布。",
+         tags=["LLM缓存"])
+async def get_llm_cache_stats():
+    """获取LLM响应缓存统计"""
+    try:
+        stats = await asyncio.to_thread(get_llm_cache().get_stats)
+        return {"code": 200, "message": "获取LLM缓存统计成功", "data": stats}
+    except Exception as e:
+        logger.error(f"获取LLM缓存统计失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/llm/cache",
+            summary="清空LLM缓存",
+            description="清空LLM响应缓存。可通过namespace参数（provinces/cities/districts/hospitals/website/hierarchy）只清空某一类缓存。",
+            tags=["LLM缓存"])
+async def clear_llm_cache(namespace: Optional[str] = Query(None, description="缓存命名空间，为空时清空全部")):
+    """清空LLM响应缓存"""
+    try:
+        deleted = await asyncio.to_thread(get_llm_cache().clear, namespace)
+        logger.info(f"🧹 已清空LLM缓存: namespace={namespace or '全部'}, 删除 {deleted} 条")
+        return {"code": 200, "message": "清空LLM缓存成功", "data": {"deleted": deleted, "namespace": namespace}}
+    except Exception as e:
+        logger.error(f"清空LLM缓存失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # 新增的数据刷新和查询接口
 
 @app.post("/refresh/all", response_model=RefreshTaskResponse,
@@ -545,7 +664,7 @@ async def refresh_all_data(background_tasks: BackgroundTasks):
           summary="省份数据刷新",
           description="根据省份名称刷新该省份下的城市和区县数据。该接口会执行以下流程：\n\n1. **获取城市数据**：调用LLM获取指定省份下的所有地级市、自治州、地区等\n2. **省份处理**：检查省份是否存在，不存在则创建新省份记录\n3. **城市创建**：批量创建获取到的所有城市记录\n4. **数据验证**：确保数据的完整性和正确性\n\n**与级联刷新接口的区别**：\n- 本接口仅刷新省份和城市数据，不处理区县和医院数据\n- 级联刷新接口会处理完整的省份→城市→区县→医院数据链\n\n**参数**：\n- province_name: 省份名称（如：广东省、浙江省、四川省等）\n\n**返回**：\n- task_id: 后台任务ID，可用于查询任务执行状态\n- message: 任务创建确认信息\n- created_at: 任务创建时间",
           tags=["数据刷新"])
-async def refresh_province_data(province_name: str, background_tasks: BackgroundTasks):
+async def refresh_province_data(province_name: str):
     try:
         # URL解码，处理中文字符
         original_province_name = province_name
@@ -598,7 +717,7 @@ async def refresh_province_data(province_name: str, background_tasks: Background
             # 省份刷新 - 仅处理省级数据
             logger.info(f"📋 即将调用: execute_province_refresh_task")
             logger.info(f"📋 参数: task_id={task_id}, province_name={province_name_clean}")
-            background_tasks.add_task(execute_province_refresh_task, task_id, province_name_clean)
+            await job_queue.enqueue(task_id, "province_refresh", {"province_name": province_name_clean})
             logger.info(f"✅ 省份数据刷新后台任务已成功添加到队列")
         except Exception as bg_error:
             logger.error(f"❌ 添加后台任务失败: {bg_error}")
@@ -642,7 +761,7 @@ async def test_district_endpoint():
           summary="区县医院数据刷新",
           description="根据区县名称刷新该区县内的所有医院数据，包括医院基本信息、等级、地址、电话、网站和官网等详细信息。\n\n**功能特性**：\n- 调用阿里百炼LLM获取区县内所有医院的详细信息\n- 自动识别医院等级（三甲、三乙、二甲等）\n- 获取医院联系方式（地址、电话、网站）\n- 智能去重：避免重复创建相同医院记录\n- 异步处理：后台执行医院数据获取和保存\n\n**参数**：\n- district_name: 区县名称（如：朝阳区、海淀区、西城区等）\n\n**返回**：\n- task_id: 后台任务ID，可用于查询任务执行状态\n- message: 任务创建确认信息\n- created_at: 任务创建时间",
           tags=["数据刷新"])
-async def refresh_district_data(district_name: str, background_tasks: BackgroundTasks):
+async def refresh_district_data(district_name: str):
     try:
         # 验证参数
         if not district_name or not isinstance(district_name, str) or len(district_name.strip()) == 0:
@@ -680,8 +799,8 @@ async def refresh_district_data(district_name: str, background_tasks: Background
         logger.info(f"📋 任务详情: task_id={task_id}, district_name={district_name_clean}")
 
         # 启动区县医院刷新后台任务
+        await job_queue.enqueue(task_id, "district_hospital_refresh", {"district_name": district_name_clean})
         logger.info(f"✅ 区县医院刷新后台任务已成功添加到队列")
-        background_tasks.add_task(execute_hospital_refresh_for_district, task_id, district_name_clean)
 
         logger.info(f"📤 步骤5: 准备响应")
         response_message = f"区县 {district_name_clean} 医院数据刷新任务已创建，正在后台处理中..."
@@ -710,16 +829,28 @@ async def refresh_district_data(district_name: str, background_tasks: Background
 
 @app.post("/refresh/province-cities-districts/{province_name}", response_model=RefreshTaskResponse,
           summary="省份城市区县级联刷新",
-          description="根据省份名称级联刷新该省份下所有城市、区县及医院数据。该接口会完整执行以下流程：\n\n1. **获取城市数据**：调用LLM获取指定省份下的所有城市列表\n2. **省份处理**：检查省份是否存在，不存在则创建新省份记录\n3. **城市处理**：对每个城市检查是否存在，不存在则创建新城市记录\n4. **区县处理**：获取每个城市下的所有区县，创建区县记录\n5. **医院数据准备**：为每个区县准备医院数据刷新\n\n**特性**：\n- 不对输入省份名称进行验证，支持任意省份名称\n- 自动去重：省份、城市、区县名称相同时不会重复创建\n- 详细日志：记录每个步骤的执行情况\n- 异步处理：后台执行级联刷新任务\n\n**参数**：\n- province_name: 省份名称（如：北京市、上海市、广东省等）\n\n**返回**：\n- task_id: 后台任务ID，可用于查询任务执行状态\n- message: 任务创建确认信息\n- created_at: 任务创建时间",
+          description="根据省份名称级联刷新该省份下所有城市、区县及医院数据。该接口会完整执行以下流程：\n\n1. **获取城市数据**：调用LLM获取指定省份下的所有城市列表\n2. **省份处理**：检查省份是否存在，不存在则创建新省份记录\n3. **城市处理**：对每个城市检查是否存在，不存在则创建新城市记录\n4. **区县处理**：获取每个城市下的所有区县，创建区县记录\n5. **医院数据准备**：为每个区县准备医院数据刷新\n\n**特性**：\n- 不对输入省份名称进行验证，支持任意省份名称\n- 自动去重：省份、城市、区县名称相同时不会重复创建\n- 详细日志：记录每个步骤的执行情况\n- 异步处理：后台执行级联刷新任务\n- 增量刷新：指定 max_age 时，该时间内刷新过的省份/城市/区县不再调用LLM\n\n**参数**：\n- province_name: 省份名称（如：北京市、上海市、广东省等）\n- max_age: 可选，新鲜度阈值（小时）\n- dry_run: 为 true 时不创建任务，只按数据库现有数据估算将发起的LLM调用数\n\n**返回**：\n- task_id: 后台任务ID，可用于查询任务执行状态（dry_run 时为空）\n- message: 任务创建确认信息\n- created_at: 任务创建时间\n- plan: dry_run 时的LLM调用估算",
           tags=["数据刷新"])
-async def refresh_province_cities_districts(province_name: str, background_tasks: BackgroundTasks):
+async def refresh_province_cities_districts(
+    province_name: str,
+    max_age: Optional[float] = Query(None, ge=0, description="新鲜度阈值（小时），该时间内刷新过的单元跳过LLM调用"),
+    dry_run: bool = Query(False, description="只估算LLM调用数，不创建任务"),
+):
     try:
         logger.info(f"🎉 ========== 开始处理省份城市区县级联刷新请求 ==========")
-        logger.info(f"📍 请求参数: province_name='{province_name}'")
+        logger.info(f"📍 请求参数: province_name='{province_name}', max_age={max_age}, dry_run={dry_run}")
 
         province_name_clean = province_name.strip()
         logger.info(f"✅ 省份名称处理完成: '{province_name_clean}'")
 
+        if dry_run:
+            plan = await plan_cascade_refresh([province_name_clean], max_age)
+            return RefreshTaskResponse(
+                message=f"省份 {province_name_clean} 级联刷新预计调用LLM {plan['llm_calls']['total']} 次（dry-run，未创建任务）",
+                created_at=datetime.now(),
+                plan=plan
+            )
+
         logger.info(f"🔄 步骤1: 通过TaskManager创建任务")
         logger.info(f"📝 任务详情: 省份={province_name_clean}")
 
@@ -737,8 +868,9 @@ async def refresh_province_cities_districts(province_name: str, background_tasks
         logger.info(f"🎯 步骤2: 准备启动后台任务")
         logger.info(f"📋 任务详情: task_id={task_id}, province_name={province_name_clean}")
 
+        await job_queue.enqueue(task_id, "province_cascade_refresh",
+                                {"province_name": province_name_clean, "max_age_hours": max_age})
         logger.info(f"✅ 省份城市区县级联刷新后台任务已成功添加到队列")
-        background_tasks.add_task(execute_province_cities_districts_refresh_task, task_id, province_name_clean, task_manager)
 
         logger.info(f"📤 步骤5: 准备响应")
         response_message = f"省份 {province_name_clean} 的城市、区县及医院数据级联刷新任务已创建，正在后台处理中..."
@@ -776,6 +908,10 @@ async def refresh_province_cities_districts(province_name: str, background_tasks
 3. 使用串行处理避免过度并发导致API限流
 4. 提供详细的进度日志和错误处理
 
+参数：
+- max_age: 可选，新鲜度阈值（小时），该时间内刷新过的省份/城市/区县不再调用LLM
+- dry_run: 为 true 时不创建任务，只按数据库现有的省份列表估算将发起的LLM调用数
+
 特性：
 - 🌍 覆盖全国所有省级行政区
 - 📊 实时进度跟踪和详细日志记录
@@ -798,15 +934,28 @@ Example:
 """,
           tags=["数据刷新"])
 async def refresh_all_provinces_nationwide(
-    background_tasks: BackgroundTasks,
+    max_age: Optional[float] = Query(None, ge=0, description="新鲜度阈值（小时），该时间内刷新过的单元跳过LLM调用"),
+    dry_run: bool = Query(False, description="只估算LLM调用数，不创建任务"),
     task_manager: TaskManager = Depends(get_task_manager),
 ):
     """
     全国扫描API端点 - 启动所有省份的级联刷新任务
     """
-    logger.info("🌍 ========== API请求：启动全国扫描任务 ==========")
+    logger.info(f"🌍 ========== API请求：启动全国扫描任务 (max_age={max_age}, dry_run={dry_run}) ==========")
 
     try:
+        if dry_run:
+            # 实际执行时省份列表由LLM获取（1次调用），这里以数据库现有省份估算
+            db = await get_db()
+            provinces, _ = await db.get_provinces(page=1, page_size=1000, include_total=False)
+            plan = await plan_cascade_refresh([province['name'] for province in provinces], max_age,
+                                              include_province_list=True)
+            return RefreshTaskResponse(
+                message=f"全国扫描预计调用LLM {plan['llm_calls']['total']} 次（dry-run，按数据库现有 {len(provinces)} 个省份估算，未创建任务）",
+                created_at=datetime.now(),
+                plan=plan
+            )
+
         # 检查是否已有全国扫描任务在运行（优先使用task_type字段，兼容旧数据）
         active_tasks = await task_manager.get_active_tasks()
         for task in active_tasks:
@@ -822,7 +971,6 @@ async def refresh_all_provinces_nationwide(
         logger.info("📝 创建全国扫描任务...")
 
         # 使用TaskManager创建任务，确保内存和数据库一致
-        from schemas import ScanTaskRequest, TaskType
         task_request = ScanTaskRequest(
             hospital_name="全国扫描 - 所有省份级联刷新",
             query="级联刷新全国所有省份的城市、区县及医院数据",
@@ -830,12 +978,8 @@ async def refresh_all_provinces_nationwide(
         )
         task_id = await task_manager.create_task(task_request)
 
-        # 启动全国扫描后台任务
-        background_tasks.add_task(
-            execute_all_provinces_cascade_refresh,
-            task_id,
-            task_manager
-        )
+        # 全国扫描作业入队
+        await job_queue.enqueue(task_id, "nationwide_cascade_refresh", {"max_age_hours": max_age})
 
         logger.info(f"🎯 全国扫描任务已创建: {task_id}")
 
@@ -854,36 +998,110 @@ async def refresh_all_provinces_nationwide(
         raise HTTPException(status_code=500, detail=f"全国扫描任务创建失败: {str(e)}")
 
 
+@app.post("/refresh/all-provinces/{task_id}/resume", response_model=RefreshTaskResponse,
+          summary="全国扫描 - 断点续跑",
+          description="对中断或失败的全国扫描任务断点续跑：沿用原任务ID重新入队，执行时使用断点中的省份列表，跳过已完成的省份、城市和区县，已入库的城市/区县列表直接从数据库读取而不再调用LLM。\n\n**参数**：\n- task_id: 原全国扫描任务ID\n\n**返回**：\n- task_id: 原任务ID，可用于查询任务执行状态\n- message: 包含已完成单元数量的确认信息\n- created_at: 续跑提交时间",
+          tags=["数据刷新"])
+async def resume_all_provinces_nationwide(
+    task_id: str,
+    task_manager: TaskManager = Depends(get_task_manager),
+):
+    """全国扫描断点续跑API端点"""
+    logger.info(f"🌍 ========== API请求：全国扫描断点续跑 {task_id} ==========")
+
+    try:
+        db = await get_db()
+        task = await db.get_task(task_id)
+        if not task or task.get("task_type") != TaskType.NATIONWIDE.value:
+            raise HTTPException(status_code=404, detail=f"全国扫描任务不存在: {task_id}")
+
+        for active_task in await task_manager.get_active_tasks():
+            if active_task.get("task_id") != task_id and active_task.get("task_type") == TaskType.NATIONWIDE.value:
+                raise HTTPException(status_code=409, detail="其他全国扫描任务正在运行中，请等待完成")
+
+        # 沿用原作业的参数（如 max_age_hours）
+        job = await db.get_job(task_id)
+        if job and job.get("status") in ("queued", "running"):
+            raise HTTPException(status_code=409, detail="该全国扫描任务正在排队或执行中，无需续跑")
+        payload = job["payload"] if job else {}
+
+        counts = await db.get_refresh_checkpoint_counts(task_id)
+        completed = {unit_type: statuses.get("completed", 0) for unit_type, statuses in counts.items()}
+        message = (f"全国扫描断点续跑已提交，将跳过已完成的 省份 {completed.get('province', 0)} 个、"
+                   f"城市 {completed.get('city', 0)} 个、区县 {completed.get('district', 0)} 个")
+        # 先置为 PENDING 再入队：作业入队后可能立即被领取并置为 RUNNING，之后不能再被覆盖
+        await task_manager.update_task_status(task_id, TaskStatus.PENDING, message)
+        try:
+            await job_queue.enqueue(task_id, "nationwide_cascade_refresh", payload, replace_finished=True)
+        except ValueError:
+            # 并发的续跑请求已抢先入队（它同样在入队前置为 PENDING）
+            raise HTTPException(status_code=409, detail="该全国扫描任务正在排队或执行中，无需续跑")
+        logger.info(f"🎯 {message}: {task_id}")
+
+        return RefreshTaskResponse(
+            task_id=task_id,
+            message=message,
+            created_at=datetime.now()
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ 全国扫描断点续跑失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"全国扫描断点续跑失败: {str(e)}")
+
+
 # Note: The district endpoint was having registration issues in the original version.
 # Now we have a dedicated district endpoint for clarity.
 
 
+def _build_paginated_response(items: list, total: Optional[int], page: int, page_size: int,
+                              after_name: Optional[str] = None) -> PaginatedResponse:
+    """构造分页响应：页码分页按总数计算页数；键集分页（after_name）或不计总数时，
+    items 为多取一行的查询结果（probe_next），多出的一行说明还有下一页"""
+    effective_page_size = min(max(page_size, 1), 1000)
+    pages = (total + page_size - 1) // page_size if total is not None and page_size > 0 else None
+    has_more = len(items) > effective_page_size
+    items = items[:effective_page_size]
+    if after_name is not None or pages is None:
+        has_next = has_more
+        has_prev = after_name is not None or page > 1
+    else:
+        has_next = page < pages
+        has_prev = page > 1
+    last_item = items[-1] if items and has_next else None
+
+    return PaginatedResponse(
+        items=items,
+        total=total,
+        page=page,
+        page_size=page_size,
+        pages=pages,
+        has_next=has_next,
+        has_prev=has_prev,
+        next_after_name=last_item.get("name") if last_item else None,
+        next_after_id=last_item.get("id") if last_item else None
+    )
+
+
 @app.get("/provinces", response_model=PaginatedResponse)
-async def get_provinces(page: int = 1, page_size: int = 20):
-    """获取省份列表（分页）"""
+async def get_provinces(page: int = 1, page_size: int = 20, after_name: str = None, after_id: int = None,
+                        include_total: bool = True):
+    """获取省份列表（分页；传入after_name/after_id时使用键集分页，include_total=false时不计算总数）"""
     try:
         db = await get_db()
-        items, total = await db.get_provinces(page, page_size)
-        
-        pages = (total + page_size - 1) // page_size if page_size > 0 else 1
-        
-        return PaginatedResponse(
-            items=items,
-            total=total,
-            page=page,
-            page_size=page_size,
-            pages=pages,
-            has_next=page < pages,
-            has_prev=page > 1
-        )
-        
+        items, total = await db.get_provinces(page, page_size, after_name=after_name, after_id=after_id,
+                                              include_total=include_total, probe_next=True)
+        return _build_paginated_response(items, total, page, page_size, after_name)
+
     except Exception as e:
         logger.error(f"获取省份列表失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/cities", response_model=PaginatedResponse)
-async def get_cities(province: str = None, province_id: int = None, page: int = 1, page_size: int = 20):
-    """获取城市列表（分页）"""
+async def get_cities(province: str = None, province_id: int = None, page: int = 1, page_size: int = 20,
+                     after_name: str = None, after_id: int = None, include_total: bool = True):
+    """获取城市列表（分页；传入after_name/after_id时使用键集分页，include_total=false时不计算总数）"""
     try:
         db = await get_db()
 
@@ -913,27 +1131,18 @@ async def get_cities(province: str = None, province_id: int = None, page: int =
         else:
             logger.info(f"🔍 API参数: province='{province}', province_id={province_id}")
 
-        items, total = await db.get_cities(province_id, page, page_size)
-
-        pages = (total + page_size - 1) // page_size if page_size > 0 else 1
+        items, total = await db.get_cities(province_id, page, page_size, after_name=after_name,
+                                           after_id=after_id, include_total=include_total, probe_next=True)
+        return _build_paginated_response(items, total, page, page_size, after_name)
 
-        return PaginatedResponse(
-            items=items,
-            total=total,
-            page=page,
-            page_size=page_size,
-            pages=pages,
-            has_next=page < pages,
-            has_prev=page > 1
-        )
-        
     except Exception as e:
         logger.error(f"获取城市列表失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/districts", response_model=PaginatedResponse)
-async def get_districts(city_id: int = None, city: str = None, page: int = 1, page_size: int = 20):
-    """获取区县列表（分页）"""
+async def get_districts(city_id: int = None, city: str = None, page: int = 1, page_size: int = 20,
+                        after_name: str = None, after_id: int = None, include_total: bool = True):
+    """获取区县列表（分页；传入after_name/after_id时使用键集分页，include_total=false时不计算总数）"""
     try:
         db = await get_db()
 
@@ -945,29 +1154,21 @@ async def get_districts(city_id: int = None, city: str = None, page: int = 1, pa
             if city_info:
                 city_id = city_info['id']
 
-        items, total = await db.get_districts(city_id, page, page_size)
-        
-        pages = (total + page_size - 1) // page_size if page_size > 0 else 1
-        
-        return PaginatedResponse(
-            items=items,
-            total=total,
-            page=page,
-            page_size=page_size,
-            pages=pages,
-            has_next=page < pages,
-            has_prev=page > 1
-        )
-        
+        items, total = await db.get_districts(city_id, page, page_size, after_name=after_name,
+                                              after_id=after_id, include_total=include_total, probe_next=True)
+        return _build_paginated_response(items, total, page, page_size, after_name)
+
     except Exception as e:
         logger.error(f"获取区县列表失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/hospitals", response_model=PaginatedResponse)
-async def get_hospitals(district_id: int = None, district: str = None, city: str = None, page: int = 1, page_size: int = 20):
-    """获取医院列表（分页）"""
+async def get_hospitals(district_id: int = None, district: str = None, city: str = None, page: int = 1, page_size: int = 20,
+                        after_name: str = None, after_id: int = None, include_total: bool = True):
+    """获取医院列表（分页；传入after_name/after_id时使用键集分页，include_total=false时不计算总数）"""
     try:
         db = await get_db()
+        keyset = dict(after_name=after_name, after_id=after_id, include_total=include_total, probe_next=True)
 
         # 优先处理城市参数（如果提供了城市名称，获取该城市所有医院的列表）
         if city:
@@ -977,7 +1178,7 @@ async def get_hospitals(district_id: int = None, district: str = None, city: str
             # 通过城市名称查找城市ID
             city_info = await db.get_city_by_name(city_name)
             if city_info:
-                items, total = await db.get_hospitals_by_city(city_info['id'], page, page_size)
+                items, total = await db.get_hospitals_by_city(city_info['id'], page, page_size, **keyset)
             else:
                 # 如果找不到城市，返回空结果
                 items, total = [], 0
@@ -991,25 +1192,17 @@ async def get_hospitals(district_id: int = None, district: str = None, city: str
                 if district_info:
                     district_id = district_info['id']
 
-            items, total = await db.get_hospitals(district_id, page, page_size)
-        
-        pages = (total + page_size - 1) // page_size if page_size > 0 else 1
-        
-        return PaginatedResponse(
-            items=items,
-            total=total,
-            page=page,
-            page_size=page_size,
-            pages=pages,
-            has_next=page < pages,
-            has_prev=page > 1
-        )
-        
+            items, total = await db.get_hospitals(district_id, page, page_size, **keyset)
+
+        return _build_paginated_response(items, total, page, page_size, after_name)
+
     except Exception as e:
         logger.error(f"获取医院列表失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/hospitals/search")
+@app.get("/hospitals/search",
+         summary="全文检索医院",
+         description="基于FTS5 trigram全文索引检索医院名称、别名和地址，按相关度排序；支持任意位置子串及前缀匹配，多个关键词以空格分隔（AND关系）。少于3个字符的关键词退化为子串匹配。")
 async def search_hospitals(q: str, limit: int = 20):
     """搜索医院"""
     try:
@@ -1050,7 +1243,7 @@ async def search_hospitals(q: str, limit: int = 20):
 
 **参数说明**：
 - hospital_name: 医院名称（2-200个字符）
-- force_update: 是否强制更新已有网站信息（默认false）
+- force_update: 是否强制更新已有网站信息（默认false；为true时同时绕过LLM响应缓存重新查询）
 
 **返回数据**：
 - success: 操作是否成功
@@ -1235,7 +1428,8 @@ async def get_and_update_hospital_website(request: HospitalWebsiteRequest):
         llm_start_time = time.time()
 
         try:
-            website_info = await llm_client.get_hospital_website(hospital_name_clean)
+            # 强制更新时绕过LLM响应缓存，避免返回缓存期内的旧结果
+            website_info = await llm_client.get_hospital_website(hospital_name_clean, bypass_cache=request.force_update)
             llm_time = time.time() - llm_start_time
 
             logger.info(f"[{request_id}] LLM查询成功: 耗时={llm_time:.3f}s")
@@ -2224,7 +2418,7 @@ async def update_hospital_name(
           response_model=BatchUpdateResponse,
           summary="批量更新所有医院网站信息",
           description="""
-批量获取hospitals表中的所有医院，然后依次串行调用医院网站查询API更新网站数据。
+批量获取hospitals表中的所有医院，按批次合并调用LLM查询医院官网并更新网站数据。
 
 **功能特性**：
 - 🏥 扫描获取hospitals表中所有医院信息
@@ -2245,7 +2439,9 @@ async def update_hospital_name(
 **参数说明**：
 - limit: 批量处理限制（默认null表示更新所有医院，最大10000）
 - skip_existing: 跳过已有网站信息的医院（默认false）
+- force_update: 绕过LLM响应缓存重新查询（默认false）
 - hospital_ids: 指定要更新的医院ID列表（可选）
+- batch_size: 每次LLM请求合并查询的医院数量（默认10，可通过WEBSITE_BATCH_SIZE配置；批量结果缺失的医院会单独重试）
 - progress_callback_url: 进度回调URL（可选）
 
 **返回数据**：
@@ -2259,7 +2455,7 @@ async def update_hospital_name(
 
 **注意事项**：
 - 串行处理避免数据库锁定冲突
-- 统一设置force_update=true确保更新
+- force_update=true时不使用缓存期内的LLM查询结果
 - 提供详细的日志记录便于调试
 - 支持断点续传和中途监控
           """,
@@ -2396,7 +2592,9 @@ async def batch_update_hospital_websites(request: BatchUpdateRequest):
             hospitals,
             request.skip_existing,
             request_id,
-            db
+            db,
+            batch_size=request.batch_size,
+            bypass_cache=bool(request.force_update)
         )
 
         update_time = time.time() - update_start_time
@@ -2454,32 +2652,7 @@ async def _get_hospitals_by_ids(db, hospital_ids: List[int]) -> List[dict]:
     try:
         if not hospital_ids:
             return []
-
-        # 构建IN查询
-        placeholders = ','.join(['?' for _ in hospital_ids])
-
-        conn = sqlite3.connect(db.db_path, timeout=30.0)
-        conn.execute("PRAGMA journal_mode=WAL")
-        cursor = conn.cursor()
-
-        cursor.execute(f"""
-            SELECT id, name, website FROM hospitals
-            WHERE id IN ({placeholders})
-            ORDER BY id
-        """, hospital_ids)
-
-        rows = cursor.fetchall()
-        conn.close()
-
-        hospitals = []
-        for row in rows:
-            hospitals.append({
-                "id": row[0],
-                "name": row[1],
-                "website": row[2]
-            })
-
-        return hospitals
+        return await db.get_hospital_websites_by_ids(hospital_ids)
     except Exception as e:
         logger.error(f"根据ID获取医院失败: {e}")
         return []
@@ -2488,178 +2661,141 @@ async def _get_hospitals_by_ids(db, hospital_ids: List[int]) -> List[dict]:
 async def _get_all_hospitals(db, limit: Optional[int] = None) -> List[dict]:
     """获取所有医院信息"""
     try:
-        conn = sqlite3.connect(db.db_path, timeout=30.0)
-        conn.execute("PRAGMA journal_mode=WAL")
-        cursor = conn.cursor()
-
         if limit is None:
-            # 获取所有医院，不限制数量
-            cursor.execute("""
-                SELECT id, name, website FROM hospitals
-                ORDER BY id
-            """)
             logger.info(f"查询所有医院（无数量限制）")
         else:
-            # 有数量限制
-            cursor.execute("""
-                SELECT id, name, website FROM hospitals
-                ORDER BY id
-                LIMIT ?
-            """, (limit,))
             logger.info(f"查询医院，限制数量: {limit}")
-
-        rows = cursor.fetchall()
-        conn.close()
-
-        hospitals = []
-        for row in rows:
-            hospitals.append({
-                "id": row[0],
-                "name": row[1],
-                "website": row[2]
-            })
-
-        return hospitals
+        return await db.get_hospital_websites(limit)
     except Exception as e:
         logger.error(f"获取所有医院失败: {e}")
         return []
 
 
 async def _batch_update_hospitals(hospitals: List[dict], skip_existing: bool,
-                                 request_id: str, db) -> List[HospitalUpdateResult]:
-    """批量更新医院网站"""
-    results = []
+                                 request_id: str, db, batch_size: Optional[int] = None,
+                                 bypass_cache: bool = False) -> List[HospitalUpdateResult]:
+    """批量更新医院网站（每次LLM请求合并查询batch_size家医院；bypass_cache=True 时不使用LLM响应缓存）"""
     total_hospitals = len(hospitals)
+    batch_size = batch_size or WEBSITE_BATCH_SIZE
+    results: List[Optional[HospitalUpdateResult]] = [None] * total_hospitals
 
-    logger.info(f"[{request_id}] 开始批量更新 {total_hospitals} 个医院")
+    logger.info(f"[{request_id}] 开始批量更新 {total_hospitals} 个医院，每批 {batch_size} 家")
 
+    # 先处理需要跳过的医院，剩余的按批次查询
+    pending = []
     for i, hospital in enumerate(hospitals):
-        hospital_start_time = time.time()
-        hospital_name = hospital["name"]
-        hospital_id = hospital["id"]
         current_website = hospital.get("website")
+        if skip_existing and current_website and current_website.strip():
+            logger.info(f"[{request_id}] 跳过已有网站: {hospital['name']} (网站: {current_website})")
+            results[i] = HospitalUpdateResult(
+                hospital_id=hospital["id"],
+                hospital_name=hospital["name"],
+                previous_website=current_website,
+                new_website=current_website,
+                success=True,
+                updated=False,
+                error_message=None,
+                llm_response_time=0.0,
+                database_update_time=0.0,
+                total_time=0.0,
+                request_id=f"{request_id}-{i+1:04d}"
+            )
+        else:
+            pending.append(i)
 
-        # 计算进度
-        progress = (i + 1) / total_hospitals * 100
-        logger.info(f"[{request_id}] 进度: {i+1}/{total_hospitals} ({progress:.1f}%) - 正在处理: {hospital_name}")
+    processed = total_hospitals - len(pending)
+    for batch_start in range(0, len(pending), batch_size):
+        batch_indexes = pending[batch_start:batch_start + batch_size]
+        batch_start_time = time.time()
+        batch_names = [hospitals[i]["name"] for i in batch_indexes]
 
         try:
-            # 检查是否需要跳过
-            if skip_existing and current_website and current_website.strip():
-                logger.info(f"[{request_id}] 跳过已有网站: {hospital_name} (网站: {current_website})")
-                hospital_time = time.time() - hospital_start_time
-                result = HospitalUpdateResult(
-                    hospital_id=hospital_id,
-                    hospital_name=hospital_name,
-                    previous_website=current_website,
-                    new_website=current_website,
-                    success=True,
-                    updated=False,
-                    error_message=None,
-                    llm_response_time=0.0,
-                    database_update_time=0.0,
-                    total_time=round(hospital_time, 3),
-                    request_id=f"{request_id}-{i+1:04d}"
-                )
-                results.append(result)
-                continue
-
-            # 构造医院网站更新请求
-            website_request = HospitalWebsiteRequest(
-                hospital_name=hospital_name,
-                force_update=True
-            )
-
-            # 调用现有的医院网站更新逻辑
-            website_result = await _update_single_hospital_website(hospital_id, website_request, db)
+            if len(batch_names) == 1:
+                website_infos = [await llm_client.get_hospital_website(batch_names[0], bypass_cache=bypass_cache)]
+            else:
+                website_infos = await llm_client.get_hospital_websites_batch(batch_names, bypass_cache=bypass_cache)
+        except Exception as e:
+            error_msg = f"批量查询医院网站时发生错误: {str(e)}"
+            logger.error(f"[{request_id}] {error_msg}")
+            website_infos = [{"error": error_msg} for _ in batch_names]
 
-            hospital_time = time.time() - hospital_start_time
+        for i, website_info in zip(batch_indexes, website_infos):
+            hospital = hospitals[i]
+            hospital_start_time = time.time()
+            try:
+                if website_info.get("error"):
+                    website_result = _website_failure_result(website_info["error"])
+                else:
+                    website_result = await _apply_hospital_website(hospital["id"], website_info, db)
+            except Exception as e:
+                website_result = _website_failure_result(f"处理医院 {hospital['name']} 时发生错误: {str(e)}")
+                logger.error(f"[{request_id}] {website_result['error']}")
 
-            result = HospitalUpdateResult(
-                hospital_id=hospital_id,
-                hospital_name=hospital_name,
-                previous_website=website_result.get("previous_website"),
+            results[i] = HospitalUpdateResult(
+                hospital_id=hospital["id"],
+                hospital_name=hospital["name"],
+                previous_website=website_result.get("previous_website") if website_result.get("success") else hospital.get("website"),
                 new_website=website_result.get("new_website"),
                 success=website_result.get("success", False),
                 updated=website_result.get("updated", False),
                 error_message=website_result.get("error") if not website_result.get("success") else None,
                 llm_response_time=website_result.get("llm_response_time", 0.0),
-                database_update_time=website_result.get("database_update_time", 0.0),
-                total_time=round(hospital_time, 3),
+                database_update_time=round(time.time() - hospital_start_time, 3),
+                total_time=round(website_result.get("llm_response_time", 0.0) + time.time() - hospital_start_time, 3),
                 request_id=f"{request_id}-{i+1:04d}"
             )
 
-            results.append(result)
+        processed += len(batch_indexes)
+        progress = processed / total_hospitals * 100
+        logger.info(f"[{request_id}] 进度: {processed}/{total_hospitals} ({progress:.1f}%) - "
+                    f"本批 {len(batch_indexes)} 家耗时 {time.time() - batch_start_time:.2f}s")
 
-            # 添加短暂延迟避免API限流
-            await asyncio.sleep(0.1)
+    logger.info(f"[{request_id}] 批量更新完成，处理了 {total_hospitals} 个医院")
+    return results
 
-        except Exception as e:
-            hospital_time = time.time() - hospital_start_time
-            error_msg = f"处理医院 {hospital_name} 时发生错误: {str(e)}"
-            logger.error(f"[{request_id}] {error_msg}")
 
-            result = HospitalUpdateResult(
-                hospital_id=hospital_id,
-                hospital_name=hospital_name,
-                previous_website=current_website,
-                new_website=None,
-                success=False,
-                updated=False,
-                error_message=error_msg,
-                llm_response_time=0.0,
-                database_update_time=0.0,
-                total_time=round(hospital_time, 3),
-                request_id=f"{request_id}-{i+1:04d}"
-            )
+def _website_failure_result(error: str) -> dict:
+    """构造医院网站更新失败结果"""
+    return {
+        "success": False,
+        "updated": False,
+        "previous_website": None,
+        "new_website": None,
+        "llm_response_time": 0.0,
+        "database_update_time": 0.0,
+        "error": error
+    }
 
-            results.append(result)
 
-    logger.info(f"[{request_id}] 批量更新完成，处理了 {len(results)} 个医院")
-    return results
+async def _apply_hospital_website(hospital_id: int, website_info: dict, db) -> dict:
+    """将LLM返回的网站信息写入数据库（内部函数）"""
+    new_website = website_info.get("website")
+    if new_website and new_website != "null":
+        # 更新数据库
+        db_result = await db.update_hospital_website(hospital_id, new_website)
+
+        return {
+            "success": db_result.get("success", False),
+            "updated": db_result.get("updated", False),
+            "previous_website": db_result.get("previous_website"),
+            "new_website": new_website,
+            "llm_response_time": website_info.get("llm_response_time", 0.0),
+            "database_update_time": 0.0,  # 这个时间在update_hospital_website中已经计算
+            "error": None
+        }
+
+    result = _website_failure_result("LLM未返回有效网站信息")
+    result["llm_response_time"] = website_info.get("llm_response_time", 0.0)
+    return result
 
 
 async def _update_single_hospital_website(hospital_id: int, request: HospitalWebsiteRequest, db) -> dict:
     """更新单个医院的网站信息（内部函数）"""
     try:
-        # 使用现有的update_hospital_website方法
-        website_info = await llm_client.get_hospital_website(request.hospital_name)
-
-        new_website = website_info.get("website")
-        if new_website and new_website != "null":
-            # 更新数据库
-            db_result = await db.update_hospital_website(hospital_id, new_website)
-
-            return {
-                "success": db_result.get("success", False),
-                "updated": db_result.get("updated", False),
-                "previous_website": db_result.get("previous_website"),
-                "new_website": new_website,
-                "llm_response_time": website_info.get("llm_response_time", 0.0),
-                "database_update_time": 0.0,  # 这个时间在update_hospital_website中已经计算
-                "error": None
-            }
-        else:
-            return {
-                "success": False,
-                "updated": False,
-                "previous_website": None,
-                "new_website": None,
-                "llm_response_time": website_info.get("llm_response_time", 0.0),
-                "database_update_time": 0.0,
-                "error": "LLM未返回有效网站信息"
-            }
-
+        website_info = await llm_client.get_hospital_website(request.hospital_name, bypass_cache=request.force_update)
+        return await _apply_hospital_website(hospital_id, website_info, db)
     except Exception as e:
-        return {
-            "success": False,
-            "updated": False,
-            "previous_website": None,
-            "new_website": None,
-            "llm_response_time": 0.0,
-            "database_update_time": 0.0,
-            "error": str(e)
-        }
+        return _website_failure_result(str(e))
 
 
 async def execute_scan_task(task_id: str, request: ScanTaskRequest):
@@ -2814,7 +2950,7 @@ async def execute_full_refresh_task(task_id: str):
             ]
 
             logger.info("📤 发送测试请求...")
-            response = llm_client._make_request(test_messages, max_tokens=100)
+            response = await llm_client._make_request(test_messages, max_tokens=100)
 
             if response:
                 logger.info("✅ LLM API连接测试成功")
@@ -2864,7 +3000,7 @@ async def execute_full_refresh_task(task_id: str):
                 {"role": "user", "content": province_prompt}
             ]
 
-            province_response = llm_client._make_request(province_messages, max_tokens=2000)
+            province_response = await llm_client._make_request(province_messages, max_tokens=2000, cache_namespace="provinces")
 
             if not province_response:
                 raise Exception("省份数据获取失败：返回空响应")
@@ -2980,10 +3116,6 @@ async def execute_full_refresh_task(task_id: str):
 
                 successful_provinces += 1
 
-                # 短暂休息，避免API调用过于频繁
-                import asyncio
-                await asyncio.sleep(2)
-
             except Exception as province_error:
                 province_time = time.time() - province_start_time
                 logger.error(f"❌ [步骤11.{i}/{len(provinces)}] 省份 {province_name} 处理失败")
@@ -3136,7 +3268,7 @@ async def execute_province_refresh_task(task_id: str, province_name: str):
             messages = city_messages
 
             # 调用LLM API
-            cities_response = llm_client._make_request(messages, max_tokens=2000)
+            cities_response = await llm_client._make_request(messages, max_tokens=2000, cache_namespace="cities")
 
             if cities_response:
                 logger.info(f"✅ LLM API调用成功，响应类型: {type(cities_response)}")
@@ -3550,69 +3682,16 @@ async def execute_hospital_refresh_for_district(task_id: str, district_name: str
         logger.info(f"🔄 步骤6: 保存医院数据")
         logger.info(f"📊 [60%] 💾 正在保存医院数据...")
 
-        saved_count = 0
-        updated_count = 0
-
-        for i, hospital_data in enumerate(hospitals_data):
-            try:
-                logger.info(f"📊 [{60 + i*30//len(hospitals_data)}%] 💾 正在保存医院 {i+1}/{len(hospitals_data)}: {hospital_data.get('name', 'Unknown')}")
-
-                # 提取医院信息，支持更多字段
-                hospital_name = hospital_data.get('name', '').strip()
-                level = hospital_data.get('level', '')
-                address = hospital_data.get('address', '')
-                phone = hospital_data.get('phone', '')
-                beds_count = hospital_data.get('beds_count')
-                staff_count = hospital_data.get('staff_count')
-                departments = hospital_data.get('departments', [])
-                specializations = hospital_data.get('specializations', [])
-                website = hospital_data.get('website', '')
-
-                if not hospital_name:
-                    logger.warning(f"⚠️ 医院名称为空，跳过")
-                    continue
-
-                # 检查医院是否已存在
-                existing_hospital = await db.get_hospital_by_name_and_district(hospital_name, district_info['id'])
-
-                if existing_hospital:
-                    # 更新现有医院
-                    await db.update_hospital(
-                        hospital_id=existing_hospital['id'],
-                        name=hospital_name,
-                        level=level,
-                        address=address,
-                        phone=phone,
-                        beds_count=beds_count,
-                        staff_count=staff_count,
-                        departments=departments,
-                        specializations=specializations,
-                        website=website
-                    )
-                    updated_count += 1
-                    logger.info(f"✅ 已更新医院: {hospital_name}")
-                else:
-                    # 创建新医院
-                    await db.create_hospital(
-                        name=hospital_name,
-                        district_id=district_info['id'],
-                        level=level,
-                        address=address,
-                        phone=phone,
-                        beds_count=beds_count,
-                        staff_count=staff_count,
-                        departments=departments,
-                        specializations=specializations,
-                        website=website
-                    )
-                    saved_count += 1
-                    logger.info(f"✅ 已保存医院: {hospital_name}")
-
-            except Exception as hospital_error:
-                logger.error(f"❌ 保存医院失败: {hospital_data.get('name', 'Unknown')}, 错误: {str(hospital_error)}")
-                continue
+        # 整个区县的医院在一个事务内批量upsert（唯一键 district_id + name）
+        upsert_result = await db.upsert_hospitals(district_info['id'], hospitals_data)
+        saved_count = upsert_result["inserted"]
+        updated_count = upsert_result["updated"]
+        unchanged_count = upsert_result["unchanged"]
+        if upsert_result["skipped"]:
+            logger.warning(f"⚠️ {upsert_result['skipped']} 家医院名称为空，已跳过")
+        logger.info(f"📊 [90%] 💾 医院数据已写入: 新增 {saved_count}, 更新 {updated_count}, 无变化 {unchanged_count}")
 
-        logger.info(f"✅ 医院数据保存完成 - 新增: {saved_count}, 更新: {updated_count}")
+        logger.info(f"✅ 医院数据保存完成 - 新增: {saved_count}, 更新: {updated_count}, 无变化: {unchanged_count}")
 
         # 步骤7: 完成任务
         logger.info(f"🔄 步骤7: 完成任务")
@@ -3621,13 +3700,13 @@ async def execute_hospital_refresh_for_district(task_id: str, district_name: str
         # 更新任务状态为成功
         await task_manager.update_task_status(task_id, TaskStatus.COMPLETED)
 
-        success_message = f"区县 '{district_name}' 医院数据刷新完成，新增 {saved_count} 家医院，更新 {updated_count} 家医院"
+        success_message = f"区县 '{district_name}' 医院数据刷新完成，新增 {saved_count} 家医院，更新 {updated_count} 家医院，{unchanged_count} 家无变化"
         logger.info(f"🎉 ========== 区县医院刷新任务完成 ==========")
         logger.info(f"✅ 任务ID: {task_id}")
         logger.info(f"📍 目标区县: {district_name}")
         logger.info(f"⏰ 完成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         logger.info(f"⏱️ 总用时: {time.time() - start_time:.2f}秒")
-        logger.info(f"🏥 处理结果: 新增 {saved_count} 家，更新 {updated_count} 家医院")
+        logger.info(f"🏥 处理结果: 新增 {saved_count} 家，更新 {updated_count} 家，无变化 {unchanged_count} 家医院")
         logger.info(f"🎯 任务状态: COMPLETED")
         logger.info(f"📋 成功消息: {success_message}")
         logger.info(f"============================================================")
@@ -3659,13 +3738,18 @@ async def test_city_endpoint():
 
 
 @app.post("/refresh/city/{city_name}", response_model=RefreshTaskResponse)
-async def refresh_city_data(city_name: str, background_tasks: BackgroundTasks):
+async def refresh_city_data(
+    city_name: str,
+    max_age: Optional[float] = Query(None, ge=0, description="新鲜度阈值（小时），该时间内刷新过的区县跳过LLM调用"),
+    dry_run: bool = Query(False, description="只估算LLM调用数，不创建任务"),
+):
     """
     刷新指定城市所有区县的医院数据
 
     Args:
         city_name: 城市名称
-        background_tasks: FastAPI后台任务管理器
+        max_age: 可选，新鲜度阈值（小时），该时间内刷新过的区县不再调用LLM
+        dry_run: 为 true 时不创建任务，只估算将发起的LLM调用数
 
     Returns:
         RefreshTaskResponse: 包含任务ID和响应信息
@@ -3722,21 +3806,31 @@ async def refresh_city_data(city_name: str, background_tasks: BackgroundTasks):
         if total_count > 5:
             logger.info(f"   ... 还有 {total_count - 5} 个区县")
 
+        if dry_run:
+            plan = await plan_city_refresh(city_info, max_age)
+            return RefreshTaskResponse(
+                message=f"城市 {city_info['name']} 医院刷新预计调用LLM {plan['llm_calls']['total']} 次（dry-run，未创建任务）",
+                created_at=datetime.now(),
+                plan=plan
+            )
+
         # 步骤4: 创建主任务
         logger.info(f"🔄 步骤4: 创建主任务")
         logger.info(f"📊 [80%] 📋 正在创建主任务...")
 
-        task_id = await task_manager.create_task(
-            task_type="city_hospital_refresh",
-            target=f"{city_info['name']}及所有区县医院数据",
-            description=f"刷新城市 '{city_info['name']}' 下所有 {total_count} 个区县的医院数据"
+        task_id = str(uuid.uuid4())
+        await db.create_task(
+            task_id=task_id,
+            hospital_name=f"城市医院刷新: {city_info['name']}",
+            query=f"刷新城市 '{city_info['name']}' 下所有 {total_count} 个区县的医院数据",
+            status=TaskStatus.PENDING.value
         )
 
         logger.info(f"✅ 主任务已创建: {task_id}")
 
         # 步骤5: 启动后台任务
         logger.info(f"🔄 步骤5: 启动后台任务")
-        background_tasks.add_task(execute_city_hospitals_refresh, task_id, city_info, districts)
+        await job_queue.enqueue(task_id, "city_hospital_refresh", {"city_id": city_info['id'], "max_age_hours": max_age})
 
         logger.info(f"📤 步骤6: 准备响应")
         response_message = f"城市 {city_info['name']} 及其 {total_count} 个区县医院数据刷新任务已创建，正在后台处理中..."
@@ -3762,7 +3856,8 @@ async def refresh_city_data(city_name: str, background_tasks: BackgroundTasks):
         raise HTTPException(status_code=500, detail=error_msg)
 
 
-async def execute_city_hospitals_refresh(task_id: str, city_info: dict, districts: list):
+async def execute_city_hospitals_refresh(task_id: str, city_info: dict, districts: list,
+                                         max_age_hours: Optional[float] = None):
     """
     执行城市所有区县的医院数据刷新任务
 
@@ -3770,6 +3865,7 @@ async def execute_city_hospitals_refresh(task_id: str, city_info: dict, district
         task_id: 任务ID
         city_info: 城市信息字典
         districts: 区县信息列表
+        max_age_hours: 新鲜度阈值（小时），该时间内刷新过的区县不再调用LLM；None 表示全部刷新
     """
     # City hospital refresh implementation
     start_time = time.time()
@@ -3799,13 +3895,15 @@ async def execute_city_hospitals_refresh(task_id: str, city_info: dict, district
 
         logger.info(f"📍 完整层级: {province_info['name']} -> {city_info['name']} -> {len(districts)} 个区县")
 
-        # 统计数据
+        # 统计数据：每个区县恰好计入 成功/失败/近期已刷新跳过 之一，已处理数 = 三者之和
         total_districts = len(districts)
-        completed_districts = 0
         successful_districts = 0
         failed_districts = 0
+        skipped_fresh = 0
         total_new_hospitals = 0
         total_updated_hospitals = 0
+        total_unchanged_hospitals = 0
+        cutoff = freshness_cutoff(max_age_hours)
 
         # 初始化LLM客户端
         llm_client = LLMClient()
@@ -3821,7 +3919,12 @@ async def execute_city_hospitals_refresh(task_id: str, city_info: dict, district
 
                 # 更新主任务状态
                 progress_msg = f"正在处理区县 {i+1}/{total_districts}: {district_name}"
-                await task_manager.update_task_status(task_id, TaskStatus.RUNNING, progress_msg)
+                await task_manager.update_progress(
+                    task_id, progress_msg, current=district_name,
+                    done=successful_districts + failed_districts + skipped_fresh, total=total_districts,
+                    successful_districts=successful_districts, failed_districts=failed_districts,
+                    skipped_fresh=skipped_fresh, new_hospitals=total_new_hospitals,
+                    updated_hospitals=total_updated_hospitals)
 
                 # 步骤1: 检查区县是否仍然存在
                 district_info = await db.get_district_by_name(district_name)
@@ -3832,19 +3935,27 @@ async def execute_city_hospitals_refresh(task_id: str, city_info: dict, district
 
                 logger.info(f"✅ 找到区县: {district_info['name']} (ID: {district_info['id']})")
 
+                if is_fresh(district_info, cutoff):
+                    logger.info(f"⏭️ 区县 '{district_name}' 于 {district_info['last_refreshed_at']} 刷新过，跳过")
+                    skipped_fresh += 1
+                    continue
+
                 # 步骤2: 使用LLM获取区县内的医院数据
                 logger.info(f"🔄 步骤2: 获取区县医院数据")
                 logger.info(f"📊 [{district_progress}%] 🤖 正在调用LLM获取医院数据...")
 
+                # 增量刷新时过期的区县绕过LLM响应缓存（缓存期可能长于max_age_hours）
                 hospitals_data = await llm_client.get_hospitals_from_district(
                     province_info['name'],
                     city_info['name'],
-                    district_info['name']
+                    district_info['name'],
+                    bypass_cache=cutoff is not None
                 )
 
                 if not hospitals_data:
                     logger.warning(f"⚠️ 区县 '{district_name}' 没有获取到任何医院数据")
-                    completed_districts += 1
+                    await db.mark_refreshed("districts", district_info['id'])
+                    successful_districts += 1
                     continue
 
                 logger.info(f"✅ LLM返回医院数据: {len(hospitals_data)} 家医院")
@@ -3853,116 +3964,34 @@ async def execute_city_hospitals_refresh(task_id: str, city_info: dict, district
                 logger.info(f"🔄 步骤3: 保存医院数据")
                 logger.info(f"📊 [{district_progress}%] 💾 正在保存医院数据...")
 
-                saved_count = 0
-                updated_count = 0
-
-                for j, hospital_data in enumerate(hospitals_data):
-                    try:
-                        # 提取医院信息
-                        hospital_name = hospital_data.get('name', '').strip()
-                        level = hospital_data.get('level', '')
-                        address = hospital_data.get('address', '')
-                        phone = hospital_data.get('phone', '')
-                        beds_count = hospital_data.get('beds_count')
-                        staff_count = hospital_data.get('staff_count')
-                        departments = hospital_data.get('departments', [])
-                        specializations = hospital_data.get('specializations', [])
-                        website = hospital_data.get('website', '')
-
-                        if not hospital_name:
-                            logger.warning(f"⚠️ 医院名称为空，跳过")
-                            continue
-
-                        # 检查医院是否已存在
-                        existing_hospital = await db.get_hospital_by_name_and_district(hospital_name, district_info['id'])
-
-                        if existing_hospital:
-                            # 更新现有医院（只有信息有变化时才更新）
-                            update_needed = False
-                            updates = {}
-
-                            if level and level != existing_hospital.get('level', ''):
-                                updates['level'] = level
-                                update_needed = True
-
-                            if address and address != existing_hospital.get('address', ''):
-                                updates['address'] = address
-                                update_needed = True
-
-                            if phone and phone != existing_hospital.get('phone', ''):
-                                updates['phone'] = phone
-                                update_needed = True
-
-                            if beds_count and beds_count != existing_hospital.get('beds_count'):
-                                updates['beds_count'] = beds_count
-                                update_needed = True
-
-                            if staff_count and staff_count != existing_hospital.get('staff_count'):
-                                updates['staff_count'] = staff_count
-                                update_needed = True
-
-                            if departments and departments != existing_hospital.get('departments', []):
-                                updates['departments'] = departments
-                                update_needed = True
-
-                            if specializations and specializations != existing_hospital.get('specializations', []):
-                                updates['specializations'] = specializations
-                                update_needed = True
-
-                            if website and website != existing_hospital.get('website', ''):
-                                updates['website'] = website
-                                update_needed = True
-
-                            if update_needed:
-                                await db.update_hospital(existing_hospital['id'], **updates)
-                                updated_count += 1
-                                logger.info(f"🔄 更新医院: {hospital_name}")
-                            else:
-                                logger.info(f"ℹ️ 医院信息无变化，跳过: {hospital_name}")
-
-                        else:
-                            # 创建新医院
-                            await db.create_hospital(
-                                name=hospital_name,
-                                district_id=district_info['id'],
-                                level=level,
-                                address=address,
-                                phone=phone,
-                                beds_count=beds_count,
-                                staff_count=staff_count,
-                                departments=departments,
-                                specializations=specializations,
-                                website=website
-                            )
-                            saved_count += 1
-                            logger.info(f"➕ 新增医院: {hospital_name}")
-
-                    except Exception as hospital_error:
-                        logger.warning(f"⚠️ 处理医院数据失败: {hospital_data.get('name', 'Unknown')}: {str(hospital_error)}")
-                        continue
+                # 整个区县的医院在一个事务内批量upsert，已有医院只用非空且有变化的信息更新
+                upsert_result = await db.upsert_hospitals(district_info['id'], hospitals_data, keep_existing_on_empty=True)
+                saved_count = upsert_result["inserted"]
+                updated_count = upsert_result["updated"]
+                unchanged_count = upsert_result["unchanged"]
+                if upsert_result["skipped"]:
+                    logger.warning(f"⚠️ {upsert_result['skipped']} 家医院名称为空，已跳过")
+                await db.mark_refreshed("districts", district_info['id'])
 
                 # 更新统计
                 total_new_hospitals += saved_count
                 total_updated_hospitals += updated_count
-                completed_districts += 1
+                total_unchanged_hospitals += unchanged_count
                 successful_districts += 1
 
-                logger.info(f"✅ 区县 '{district_name}' 处理完成: 新增 {saved_count} 家医院，更新 {updated_count} 家医院")
-
-                # 短暂延迟，避免API调用过于频繁
-                await asyncio.sleep(1)
+                logger.info(f"✅ 区县 '{district_name}' 处理完成: 新增 {saved_count} 家医院，更新 {updated_count} 家医院，{unchanged_count} 家无变化")
 
             except Exception as district_error:
                 logger.error(f"❌ 处理区县 '{district_name}' 失败: {str(district_error)}")
                 failed_districts += 1
-                completed_districts += 1
                 continue
 
         # 更新任务状态为成功
-        final_status = f"市级医院刷新完成！成功处理 {successful_districts}/{total_districts} 个区县"
+        final_status = (f"市级医院刷新完成！共 {total_districts} 个区县：成功 {successful_districts} 个，"
+                        f"失败 {failed_districts} 个，近期已刷新跳过 {skipped_fresh} 个")
         await task_manager.update_task_status(task_id, TaskStatus.COMPLETED, final_status)
 
-        success_message = f"城市 '{city_info['name']}' 医院数据刷新完成，共处理 {successful_districts}/{total_districts} 个区县，新增 {total_new_hospitals} 家医院，更新 {total_updated_hospitals} 家医院"
+        success_message = f"城市 '{city_info['name']}' 医院数据刷新完成，{total_districts} 个区县中成功 {successful_districts} 个、失败 {failed_districts} 个、近期已刷新跳过 {skipped_fresh} 个，新增 {total_new_hospitals} 家医院，更新 {total_updated_hospitals} 家医院，{total_unchanged_hospitals} 家无变化"
 
         logger.info(f"🎉 ========== 市级医院刷新任务完成 ==========")
         logger.info(f"✅ 任务ID: {task_id}")
@@ -3970,8 +3999,10 @@ async def execute_city_hospitals_refresh(task_id: str, city_info: dict, district
         logger.info(f"⏰ 完成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         logger.info(f"⏱️ 总用时: {time.time() - start_time:.2f}秒")
         logger.info(f"📍 处理结果: {successful_districts}/{total_districts} 个区县成功")
+        logger.info(f"⏭️ 近期已刷新跳过: {skipped_fresh} 个区县")
         logger.info(f"🏥 新增医院: {total_new_hospitals} 家")
         logger.info(f"🔄 更新医院: {total_updated_hospitals} 家")
+        logger.info(f"ℹ️ 无变化医院: {total_unchanged_hospitals} 家")
         logger.info(f"❌ 失败区县: {failed_districts} 个")
         logger.info(f"🎯 任务状态: COMPLETED")
         logger.info(f"📋 成功消息: {success_message}")
@@ -4181,7 +4212,7 @@ async def crawl_procurement(
 @app.post("/procurement/search",
           response_model=ProcurementSearchResponse,
           summary="搜索采购信息",
-          description="根据基础URL和时间范围搜索采购信息。支持base_url精确匹配和时间范围筛选。")
+          description="根据基础URL和时间范围搜索采购信息。支持base_url精确匹配和时间范围筛选。结果按首次发现时间倒序游标分页：每页最多page_size条，has_more为true时用next_cursor请求下一页。")
 async def search_procurement_info(request: ProcurementSearchRequest) -> ProcurementSearchResponse:
     """搜索采购信息"""
     import uuid
@@ -4196,7 +4227,9 @@ async def search_procurement_info(request: ProcurementSearchRequest) -> Procurem
         result = await search_procurement_links(
             base_url=request.base_url,
             time_start=request.time_start,
-            time_end=request.time_end
+            time_end=request.time_end,
+            limit=request.page_size or PROCUREMENT_PAGE_SIZE,
+            cursor=request.cursor
         )
 
         if result["success"]:
@@ -4220,6 +4253,8 @@ async def search_procurement_info(request: ProcurementSearchRequest) -> Procurem
                 message=result["message"],
                 total_count=result["total_count"],
                 procurement_links=procurement_link_items,
+                has_more=result["has_more"],
+                next_cursor=result["next_cursor"],
                 search_params=request,
                 request_id=request_id
             )
@@ -4252,7 +4287,7 @@ async def search_procurement_info(request: ProcurementSearchRequest) -> Procurem
 @app.post("/procurement/latest",
           response_model=ProcurementLatestResponse,
           summary="获取最新采购信息",
-          description="获取is_latest为1的采购链接记录。如果base_url为空，则返回所有is_latest为1的记录；如果指定base_url，则返回指定base_url且is_latest为1的记录。")
+          description="获取最新的采购链接记录，即站点最近一次完成的抓取批次（crawl_runs）中出现的链接，返回的is_latest均为true。如果base_url为空，则返回所有站点的最新记录；如果指定base_url，则只返回该站点的最新记录。结果按首次发现时间倒序游标分页：每页最多page_size条，has_more为true时用next_cursor请求下一页。")
 async def get_latest_procurement_info(request: ProcurementLatestRequest) -> ProcurementLatestResponse:
     """获取最新采购信息"""
     import uuid
@@ -4268,7 +4303,11 @@ async def get_latest_procurement_info(request: ProcurementLatestRequest) -> Proc
 
     try:
         # 调用数据库查询函数
-        result = await get_latest_procurement_links(base_url=request.base_url)
+        result = await get_latest_procurement_links(
+            base_url=request.base_url,
+            limit=request.page_size or PROCUREMENT_PAGE_SIZE,
+            cursor=request.cursor
+        )
 
         if result["success"]:
             logger.info(f"最新采购信息搜索成功: request_id={request_id}, 找到 {result['total_count']} 条记录")
@@ -4291,6 +4330,8 @@ async def get_latest_procurement_info(request: ProcurementLatestRequest) -> Proc
                 message=result["message"],
                 total_count=result["total_count"],
                 procurement_links=procurement_link_items,
+                has_more=result["has_more"],
+                next_cursor=result["next_cursor"],
                 search_params=request,
                 request_id=request_id
             )
@@ -4320,6 +4361,112 @@ async def get_latest_procurement_info(request: ProcurementLatestRequest) -> Proc
         )
 
 
+@app.post("/procurement/fulltext",
+          response_model=ProcurementFulltextResponse,
+          summary="采购链接全文检索",
+          description="按关键词全文检索采购链接文本，结果按相关度（bm25）排序。中文按二元组建立索引，支持任意子串匹配，如“中标”“医疗器械”；多个词以空格分隔表示同时包含。可按base_url、hospital_id及首次发现时间范围过滤，page/page_size分页。")
+async def fulltext_search_procurement_info(request: ProcurementFulltextRequest) -> ProcurementFulltextResponse:
+    """采购链接全文检索"""
+    request_id = str(uuid.uuid4())
+    logger.info(f"收到采购链接全文检索请求: request_id={request_id}, query={request.query}, "
+                f"base_url={request.base_url}, hospital_id={request.hospital_id}")
+
+    try:
+        result = await fulltext_search_procurement_links(
+            query=request.query,
+            base_url=request.base_url,
+            hospital_id=request.hospital_id,
+            time_start=request.time_start,
+            time_end=request.time_end,
+            page=request.page,
+            page_size=request.page_size
+        )
+
+        if not result["success"]:
+            logger.error(f"采购链接全文检索失败: request_id={request_id}, error={result['message']}")
+
+        return ProcurementFulltextResponse(
+            success=result["success"],
+            message=result["message"],
+            total_count=result["total_count"],
+            page=result["page"],
+            page_size=result["page_size"],
+            has_more=result["has_more"],
+            procurement_links=[ProcurementFulltextItem(**link) for link in result["procurement_links"]],
+            search_params=request,
+            request_id=request_id
+        )
+
+    except Exception as e:
+        error_msg = f"采购链接全文检索时发生异常: {str(e)}"
+        logger.error(f"采购链接全文检索异常: request_id={request_id}, error={error_msg}")
+
+        return ProcurementFulltextResponse(
+            success=False,
+            message=error_msg,
+            total_count=0,
+            procurement_links=[],
+            search_params=request,
+            request_id=request_id
+        )
+
+
+
+async def _stream_procurement_ndjson(fetch_page, page_size: int, cursor: Optional[str] = None):
+    """按游标逐页读取采购链接并输出NDJSON，每行一条记录；内存占用只与page_size有关"""
+    exported = 0
+    while True:
+        result = await fetch_page(limit=page_size, cursor=cursor)
+        if not result["success"]:
+            logger.error(f"采购链接导出中断: 已导出 {exported} 条, error={result['message']}")
+            yield json.dumps({"error": result["message"]}, ensure_ascii=False) + "\n"
+            return
+        for link in result["procurement_links"]:
+            yield json.dumps(link, ensure_ascii=False) + "\n"
+        exported += len(result["procurement_links"])
+        if not result["has_more"]:
+            logger.info(f"采购链接导出完成: 共 {exported} 条")
+            return
+        cursor = result["next_cursor"]
+
+
+@app.post("/procurement/search/export",
+          summary="导出采购信息（NDJSON流）",
+          description="与/procurement/search条件相同，按游标分页在服务端逐页读取，以NDJSON（每行一个JSON对象）流式返回全部匹配记录。page_size控制每次读取的条数；传入cursor可从指定位置继续导出。")
+async def export_procurement_search(request: ProcurementSearchRequest):
+    """流式导出采购信息搜索结果"""
+    logger.info(f"收到采购信息导出请求: base_url={request.base_url}, time_start={request.time_start}, time_end={request.time_end}")
+
+    async def fetch_page(limit: int, cursor: Optional[str]):
+        return await search_procurement_links(
+            base_url=request.base_url,
+            time_start=request.time_start,
+            time_end=request.time_end,
+            limit=limit,
+            cursor=cursor
+        )
+
+    return StreamingResponse(
+        _stream_procurement_ndjson(fetch_page, request.page_size or PROCUREMENT_PAGE_SIZE, request.cursor),
+        media_type="application/x-ndjson"
+    )
+
+
+@app.post("/procurement/latest/export",
+          summary="导出最新采购信息（NDJSON流）",
+          description="与/procurement/latest条件相同，按游标分页在服务端逐页读取，以NDJSON（每行一个JSON对象）流式返回全部最新记录。page_size控制每次读取的条数；传入cursor可从指定位置继续导出。")
+async def export_latest_procurement(request: ProcurementLatestRequest):
+    """流式导出最新采购信息"""
+    logger.info(f"收到最新采购信息导出请求: base_url={request.base_url}")
+
+    async def fetch_page(limit: int, cursor: Optional[str]):
+        return await get_latest_procurement_links(base_url=request.base_url, limit=limit, cursor=cursor)
+
+    return StreamingResponse(
+        _stream_procurement_ndjson(fetch_page, request.page_size or PROCUREMENT_PAGE_SIZE, request.cursor),
+        media_type="application/x-ndjson"
+    )
+
 if __name__ == "__main__":
     # 在启动服务前检查并关闭8000端口
     logger.info("🚀 准备启动HBScan服务...")
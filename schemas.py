@@ -216,19 +216,22 @@ class RefreshTaskRequest(BaseModel):
 
 class RefreshTaskResponse(BaseModel):
     """数据刷新任务响应模型"""
-    task_id: str = Field(..., description="任务ID")
+    task_id: Optional[str] = Field(None, description="任务ID（dry_run时为空）")
     message: str = Field(..., description="响应消息")
     created_at: Optional[datetime] = Field(None, description="创建时间")
+    plan: Optional[Dict[str, Any]] = Field(None, description="dry_run时的LLM调用估算")
 
 class PaginatedResponse(BaseModel):
     """分页响应模型"""
     items: List[Dict[str, Any]] = Field(..., description="数据项列表")
-    total: int = Field(..., description="总数量")
+    total: Optional[int] = Field(..., description="总数量（include_total=false时为空）")
     page: int = Field(..., description="当前页码")
     page_size: int = Field(..., description="每页大小")
-    pages: int = Field(..., description="总页数")
+    pages: Optional[int] = Field(..., description="总页数（include_total=false时为空）")
     has_next: bool = Field(..., description="是否有下一页")
     has_prev: bool = Field(..., description="是否有上一页")
+    next_after_name: Optional[str] = Field(None, description="键集分页：下一页请求的after_name")
+    next_after_id: Optional[int] = Field(None, description="键集分页：下一页请求的after_id")
 
 class SearchRequest(BaseModel):
     """搜索请求模型"""
@@ -279,7 +282,9 @@ class BatchUpdateRequest(BaseModel):
     update_all: Optional[bool] = Field(False, description="是否更新所有医院（为true时忽略其他限制参数）")
     limit: Optional[int] = Field(1000, description="每次批量处理的医院数量限制（默认1000，最大10000）", ge=1, le=10000)
     skip_existing: Optional[bool] = Field(False, description="跳过已有网站信息的医院（默认false）")
+    force_update: Optional[bool] = Field(False, description="是否绕过LLM响应缓存重新查询（默认false，使用缓存期内的查询结果）")
     hospital_ids: Optional[List[int]] = Field(None, description="指定要更新的医院ID列表（可选，为空则更新所有医院）")
+    batch_size: Optional[int] = Field(None, description="每次LLM请求合并查询的医院数量（默认读取环境变量WEBSITE_BATCH_SIZE，为1时逐个查询）", ge=1, le=50)
     progress_callback_url: Optional[str] = Field(None, description="进度回调URL（可选）")
 
 class HospitalUpdateResult(BaseModel):
@@ -395,6 +400,8 @@ class ProcurementSearchRequest(BaseModel):
     base_url: str = Field(..., description="采购基础URL", example="http://www.procurement.example.com")
     time_start: str = Field(..., description="开始时间 (YYYY-MM-DD 格式)", example="2024-01-01")
     time_end: str = Field(..., description="结束时间 (YYYY-MM-DD 格式)", example="2024-12-31")
+    page_size: Optional[int] = Field(None, ge=1, le=1000, description="每页条数（默认500，最大1000）")
+    cursor: Optional[str] = Field(None, description="分页游标，传入上一页响应中的next_cursor获取下一页")
 
 class ProcurementLinkItem(BaseModel):
     """采购链接项模型"""
@@ -410,8 +417,10 @@ class ProcurementSearchResponse(BaseModel):
     """采购信息搜索响应模型"""
     success: bool = Field(..., description="搜索是否成功")
     message: str = Field(..., description="搜索结果描述")
-    total_count: int = Field(..., description="匹配的记录总数")
+    total_count: int = Field(..., description="本页返回的记录数")
     procurement_links: List[ProcurementLinkItem] = Field(..., description="采购链接列表")
+    has_more: bool = Field(False, description="是否还有下一页")
+    next_cursor: Optional[str] = Field(None, description="下一页游标，没有更多数据时为空")
     search_params: ProcurementSearchRequest = Field(..., description="搜索参数")
     request_id: str = Field(..., description="请求ID")
     timestamp: datetime = Field(default_factory=datetime.now, description="响应时间")
@@ -419,18 +428,50 @@ class ProcurementSearchResponse(BaseModel):
 class ProcurementLatestRequest(BaseModel):
     """采购最新信息搜索请求模型"""
     base_url: Optional[str] = Field(None, description="采购基础URL（可选，为空时搜索所有is_latest=1的记录）", example="http://www.procurement.example.com")
+    page_size: Optional[int] = Field(None, ge=1, le=1000, description="每页条数（默认500，最大1000）")
+    cursor: Optional[str] = Field(None, description="分页游标，传入上一页响应中的next_cursor获取下一页")
 
 class ProcurementLatestResponse(BaseModel):
     """采购最新信息搜索响应模型"""
     success: bool = Field(..., description="搜索是否成功")
     message: str = Field(..., description="搜索结果描述")
-    total_count: int = Field(..., description="匹配的记录总数")
+    total_count: int = Field(..., description="本页返回的记录数")
     procurement_links: List[ProcurementLinkItem] = Field(..., description="采购链接列表（仅is_latest=1的记录）")
+    has_more: bool = Field(False, description="是否还有下一页")
+    next_cursor: Optional[str] = Field(None, description="下一页游标，没有更多数据时为空")
     search_params: ProcurementLatestRequest = Field(..., description="搜索参数")
     request_id: str = Field(..., description="请求ID")
     timestamp: datetime = Field(default_factory=datetime.now, description="响应时间")
 
 
+class ProcurementFulltextRequest(BaseModel):
+    """采购链接全文检索请求模型"""
+    query: str = Field(..., min_length=1, description="检索词，多个词以空格分隔（AND关系），支持中文任意子串")
+    base_url: Optional[str] = Field(None, description="限定采购基础URL")
+    hospital_id: Optional[int] = Field(None, description="限定为该医院的采购基础URL")
+    time_start: Optional[str] = Field(None, description="首次发现时间起 (YYYY-MM-DD)")
+    time_end: Optional[str] = Field(None, description="首次发现时间止 (YYYY-MM-DD)")
+    page: int = Field(1, ge=1, description="页码")
+    page_size: int = Field(20, ge=1, le=100, description="每页条数")
+
+class ProcurementFulltextItem(ProcurementLinkItem):
+    """采购链接全文检索结果项模型"""
+    score: float = Field(..., description="相关度得分（越大越相关）")
+
+class ProcurementFulltextResponse(BaseModel):
+    """采购链接全文检索响应模型"""
+    success: bool = Field(..., description="检索是否成功")
+    message: str = Field(..., description="检索结果描述")
+    total_count: int = Field(..., description="匹配的记录总数")
+    page: int = Field(1, description="当前页码")
+    page_size: int = Field(20, description="每页条数")
+    has_more: bool = Field(False, description="是否还有下一页")
+    procurement_links: List[ProcurementFulltextItem] = Field(..., description="按相关度排序的采购链接列表")
+    search_params: ProcurementFulltextRequest = Field(..., description="检索参数")
+    request_id: str = Field(..., description="请求ID")
+    timestamp: datetime = Field(default_factory=datetime.now, description="响应时间")
+
+
 class HospitalKeywordsRequest(BaseModel):
     """医院关键词设置请求模型"""
     hospital_id: int = Field(..., description="医院ID")
@@ -2,13 +2,17 @@
 # -*- coding: utf-8 -*-
 """
 医院层级扫查微服务 - 任务管理
+
+运行中任务的进度（计数器、当前处理单元、预计剩余时间）保存在内存中的进度记录里：
+状态变化（开始/完成/失败等）立即写库，同一状态下的进度更新最多每 TASK_PROGRESS_FLUSH_SECONDS 秒落库一次，
+/task/{task_id} 查询运行中任务时直接读取内存中的进度记录。
 """
 
 import asyncio
-import threading
 import logging
 import uuid
 import os
+import time
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 from enum import Enum
@@ -18,16 +22,25 @@ from schemas import TaskStatus, TaskType, ScanTaskRequest, ScanResult
 
 logger = logging.getLogger(__name__)
 
+# 流式获取医院数据时每攒够多少家医院批量写入一次（非流式模式整个区县一次写入）
+HOSPITAL_UPSERT_BATCH_SIZE = int(os.getenv("HOSPITAL_UPSERT_BATCH_SIZE", "20"))
+# 同一状态下的任务进度最多每隔多少秒写入一次数据库（状态变化总是立即写入）
+TASK_PROGRESS_FLUSH_SECONDS = float(os.getenv("TASK_PROGRESS_FLUSH_SECONDS", "5"))
+
 class TaskManager:
     """任务管理器"""
     
-    def __init__(self):
+    def __init__(self, progress_flush_seconds: float = TASK_PROGRESS_FLUSH_SECONDS):
         self.tasks: Dict[str, Dict[str, Any]] = {}
-        self._lock = threading.Lock()
+        self._lock = asyncio.Lock()
+        # 运行中任务的进度记录（task_id -> 记录），任务结束时移除
+        self._progress: Dict[str, Dict[str, Any]] = {}
+        self.progress_flush_seconds = progress_flush_seconds
+        self._progress_stats = {"updates": 0, "flushes": 0}
     
     async def create_task(self, request: ScanTaskRequest, custom_task_id: str = None) -> str:
         """创建任务"""
-        with self._lock:
+        async with self._lock:
             # 使用自定义task_id或生成新的
             task_id = custom_task_id if custom_task_id else str(uuid.uuid4())
 
@@ -68,21 +81,39 @@ class TaskManager:
             return task_id
     
     async def update_task_status(self, task_id: str, status: TaskStatus, error_message: Optional[str] = None):
-        """更新任务状态"""
+        """更新任务状态；运行中任务重复上报 RUNNING 时只更新内存中的进度消息（按间隔落库）"""
+        record = self._progress.get(task_id)
+        if status == TaskStatus.RUNNING and record and record["status"] == TaskStatus.RUNNING.value:
+            await self.update_progress(task_id, error_message)
+            return
+
         try:
-            with self._lock:
+            async with self._lock:
                 logger.info(f"📝 尝试更新任务状态: {task_id} -> {status.value}")
 
-                # 始终更新数据库，无论任务是否在内存中
+                # 状态变化始终写数据库（连同内存中的进度快照），无论任务是否在内存中
+                record = self._progress.pop(task_id, None)
+                if record and error_message:
+                    record["message"] = error_message
                 try:
                     db = await get_db()
-                    await db.update_task_status(task_id, status.value, error_message)
+                    await db.update_task_status(task_id, status.value, error_message,
+                                                self._progress_snapshot(record) if record else None)
                     logger.info(f"✅ 数据库中的任务状态已更新: {task_id} -> {status.value}")
                 except Exception as db_error:
                     logger.error(f"❌ 更新数据库任务状态失败: {db_error}")
                     # 数据库更新失败是严重错误，需要抛出
                     raise
 
+                # 进行中的任务保留进度记录，已结束的任务不再保留
+                if status in (TaskStatus.PENDING, TaskStatus.RUNNING):
+                    record = record or self._new_progress_record()
+                    record["status"] = status.value
+                    record["message"] = error_message or record["message"]
+                    record["flushed_at"] = time.monotonic()
+                    record["dirty"] = False
+                    self._progress[task_id] = record
+
                 # 更新内存中的任务状态（如果存在）
                 if task_id in self.tasks:
                     self.tasks[task_id]["status"] = status.value
@@ -155,9 +186,128 @@ class TaskManager:
             logger.error(f"📋 异常详情: task_id={task_id}, status={status}, error_message={error_message}")
             raise
     
+    @staticmethod
+    def _new_progress_record() -> Dict[str, Any]:
+        return {
+            "status": TaskStatus.RUNNING.value,
+            "message": None,
+            "current": None,
+            "done": None,
+            "total": None,
+            "counters": {},
+            "started_at": datetime.now().isoformat(),
+            "started_monotonic": time.monotonic(),
+            "updated_at": datetime.now().isoformat(),
+            "flushed_at": 0.0,
+            "dirty": False,
+            "info": None,
+        }
+
+    @staticmethod
+    def _progress_snapshot(record: Dict[str, Any]) -> Dict[str, Any]:
+        """进度记录转为可序列化的快照（含按已完成比例估算的剩余秒数）"""
+        elapsed = time.monotonic() - record["started_monotonic"]
+        done, total = record["done"], record["total"]
+        eta_seconds = None
+        if done and total and total >= done:
+            eta_seconds = round(elapsed / done * (total - done), 1)
+        return {
+            "message": record["message"],
+            "current": record["current"],
+            "done": done,
+            "total": total,
+            "percent": round(done * 100 / total, 1) if done is not None and total else None,
+            "counters": dict(record["counters"]),
+            "started_at": record["started_at"],
+            "updated_at": record["updated_at"],
+            "elapsed_seconds": round(elapsed, 1),
+            "eta_seconds": eta_seconds,
+        }
+
+    async def update_progress(self, task_id: str, message: Optional[str] = None, current: Optional[str] = None,
+                              done: Optional[int] = None, total: Optional[int] = None, **counters):
+        """
+        更新运行中任务的进度（只改内存记录），距上次落库超过 progress_flush_seconds 时写入数据库
+
+        Args:
+            task_id: 任务ID
+            message: 进度消息（落库到 error_message 字段，与原有的进度消息位置一致）
+            current: 当前处理的单元（如区县名称）
+            done: 已完成的单元数
+            total: 单元总数（done/total 用于计算完成比例和预计剩余时间）
+            **counters: 其他计数器
+        """
+        record = self._progress.get(task_id)
+        is_new = record is None
+        if is_new:
+            # 未经过本管理器开始的任务：首次进度立即落库，任务已结束或不存在时不保留记录
+            record = self._progress[task_id] = self._new_progress_record()
+        if message is not None:
+            record["message"] = message
+        if current is not None:
+            record["current"] = current
+        if done is not None:
+            record["done"] = done
+        if total is not None:
+            record["total"] = total
+        record["counters"].update(counters)
+        record["updated_at"] = datetime.now().isoformat()
+        record["dirty"] = True
+        self._progress_stats["updates"] += 1
+        if time.monotonic() - record["flushed_at"] >= self.progress_flush_seconds:
+            if not await self._flush_progress(task_id, record) and is_new:
+                self._progress.pop(task_id, None)
+
+    async def _flush_progress(self, task_id: str, record: Dict[str, Any]) -> bool:
+        """进度快照写入数据库，返回任务是否仍在进行中"""
+        record["flushed_at"] = time.monotonic()
+        record["dirty"] = False
+        self._progress_stats["flushes"] += 1
+        try:
+            db = await get_db()
+            return await db.update_task_progress(task_id, record["message"], self._progress_snapshot(record))
+        except Exception as e:
+            logger.warning(f"⚠️ 写入任务进度失败: {task_id}: {e}")
+            return True
+
+    async def flush_progress(self):
+        """把所有未落库的进度写入数据库（服务关闭时调用）"""
+        for task_id, record in list(self._progress.items()):
+            if record["dirty"]:
+                await self._flush_progress(task_id, record)
+
+    async def get_progress(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """从内存读取运行中任务的状态和进度；任务基本信息首次读取后缓存在进度记录中"""
+        record = self._progress.get(task_id)
+        if record is None:
+            return None
+        if record["info"] is None:
+            if task_id in self.tasks:
+                task = self.tasks[task_id]
+                record["info"] = {key: task.get(key) for key in ("task_id", "hospital_name", "query", "created_at", "task_type")}
+            else:
+                db = await get_db()
+                task = await db.get_task(task_id)
+                if not task:
+                    return None
+                record["info"] = {key: task.get(key) for key in ("task_id", "hospital_name", "query", "created_at", "task_type")}
+        return {
+            **record["info"],
+            "status": record["status"],
+            "updated_at": record["updated_at"],
+            "error_message": record["message"],
+            "result": None,
+            "progress": self._progress_snapshot(record),
+        }
+
+    def get_progress_stats(self) -> Dict[str, Any]:
+        """进度记录统计：内存中的进度更新次数与实际落库次数"""
+        return {"tracked_tasks": len(self._progress), "flush_seconds": self.progress_flush_seconds,
+                **self._progress_stats}
+
     async def save_task_result(self, task_id: str, result: ScanResult):
         """保存任务结果"""
-        with self._lock:
+        async with self._lock:
             if task_id in self.tasks:
                 self.tasks[task_id]["result"] = result.dict()
                 self.tasks[task_id]["updated_at"] = datetime.now().isoformat()
@@ -236,7 +386,7 @@ class TaskManager:
     
     async def delete_task(self, task_id: str) -> bool:
         """删除任务"""
-        with self._lock:
+        async with self._lock:
             if task_id in self.tasks:
                 del self.tasks[task_id]
                 
@@ -253,7 +403,7 @@ class TaskManager:
         cutoff_time = datetime.now().timestamp() - (older_than_hours * 3600)
         cleaned_count = 0
         
-        with self._lock:
+        async with self._lock:
             completed_statuses = [
                 TaskStatus.COMPLETED.value,
                 TaskStatus.FAILED.value
@@ -368,13 +518,16 @@ class TaskManager:
         return stats
 
 
-async def refresh_district_hospitals_internal(district_name: str, task_manager: TaskManager) -> dict:
+async def refresh_district_hospitals_internal(district_name: str, task_manager: TaskManager,
+                                             district_id: Optional[int] = None, bypass_cache: bool = False) -> dict:
     """
     内部区县医院刷新函数，直接调用业务逻辑而不通过HTTP
 
     Args:
         district_name: 区县名称
         task_manager: 任务管理器实例
+        district_id: 可选，区县ID（指定时按ID定位区县，避免不同城市下同名区县混淆）
+        bypass_cache: 是否绕过LLM响应缓存（增量刷新中已过期的区县需要重新查询，不能读取缓存期内的旧回复）
 
     Returns:
         dict: 包含处理结果的字典
@@ -387,6 +540,7 @@ async def refresh_district_hospitals_internal(district_name: str, task_manager:
         "success": False,
         "saved_count": 0,
         "updated_count": 0,
+        "unchanged_count": 0,
         "error_message": None,
         "execution_time": 0
     }
@@ -404,13 +558,16 @@ async def refresh_district_hospitals_internal(district_name: str, task_manager:
         logger.info(f"✅ [内部函数] 标准化区县名称: '{district_name_clean}'")
 
         # 准备执行环境
-        from llm_client import LLMClient
+        from llm_client import LLMClient, LLM_STREAMING_ENABLED
         llm_client = LLMClient()
 
         db = await get_db()
 
         # 查找区县信息
-        district_info = await db.get_district_by_name(district_name_clean)
+        if district_id is not None:
+            district_info = await db.get_district_by_id(district_id)
+        else:
+            district_info = await db.get_district_by_name(district_name_clean)
         if not district_info:
             result["error_message"] = f"区县 '{district_name_clean}' 不存在"
             logger.error(f"❌ {result['error_message']}")
@@ -423,81 +580,68 @@ async def refresh_district_hospitals_internal(district_name: str, task_manager:
         province_info = await db.get_province_by_id(city_info['province_id'])
         logger.info(f"📍 [内部函数] 完整层级: {province_info['name']} -> {city_info['name']} -> {district_info['name']}")
 
-        # 调用LLM获取医院数据
-        logger.info(f"🤖 [内部函数] 正在调用LLM获取医院数据...")
-        hospitals_data = await llm_client.get_hospitals_from_district(
-            province_info['name'],
-            city_info['name'],
-            district_info['name']
-        )
-        logger.info(f"✅ [内部函数] LLM返回医院数据: {len(hospitals_data)} 家医院")
-
-        # 保存医院数据
+        # 保存医院数据：按区县批量upsert，一个事务写入一批医院
         saved_count = 0
         updated_count = 0
+        unchanged_count = 0
+        save_failed = False
 
-        for i, hospital_data in enumerate(hospitals_data):
+        async def save_hospitals(hospitals_batch: list):
+            nonlocal saved_count, updated_count, unchanged_count, save_failed
+            if not hospitals_batch:
+                return
             try:
-                hospital_name = hospital_data.get('name', '').strip()
-                level = hospital_data.get('level', '')
-                address = hospital_data.get('address', '')
-                phone = hospital_data.get('phone', '')
-                beds_count = hospital_data.get('beds_count')
-                staff_count = hospital_data.get('staff_count')
-                departments = hospital_data.get('departments', [])
-                specializations = hospital_data.get('specializations', [])
-                website = hospital_data.get('website', '')
-
-                if not hospital_name:
-                    logger.warning(f"⚠️ [内部函数] 医院名称为空，跳过")
-                    continue
-
-                # 检查医院是否已存在
-                existing_hospital = await db.get_hospital_by_name_and_district(hospital_name, district_info['id'])
-
-                if existing_hospital:
-                    # 更新现有医院
-                    await db.update_hospital(
-                        hospital_id=existing_hospital['id'],
-                        name=hospital_name,
-                        level=level,
-                        address=address,
-                        phone=phone,
-                        beds_count=beds_count,
-                        staff_count=staff_count,
-                        departments=departments,
-                        specializations=specializations,
-                        website=website
-                    )
-                    updated_count += 1
-                    logger.info(f"✅ [内部函数] 已更新医院: {hospital_name}")
-                else:
-                    # 创建新医院
-                    await db.create_hospital(
-                        name=hospital_name,
-                        district_id=district_info['id'],
-                        level=level,
-                        address=address,
-                        phone=phone,
-                        beds_count=beds_count,
-                        staff_count=staff_count,
-                        departments=departments,
-                        specializations=specializations,
-                        website=website
-                    )
-                    saved_count += 1
-                    logger.info(f"✅ [内部函数] 已保存医院: {hospital_name}")
-
+                upsert_result = await db.upsert_hospitals(district_info['id'], hospitals_batch)
+                saved_count += upsert_result["inserted"]
+                updated_count += upsert_result["updated"]
+                unchanged_count += upsert_result["unchanged"]
+                logger.info(f"✅ [内部函数] 已保存医院 {len(hospitals_batch)} 家: 新增 {upsert_result['inserted']}, "
+                            f"更新 {upsert_result['updated']}, 无变化 {upsert_result['unchanged']}")
             except Exception as hospital_error:
-                logger.error(f"❌ [内部函数] 保存医院失败: {hospital_data.get('name', 'Unknown')}, 错误: {str(hospital_error)}")
-                continue
+                save_failed = True
+                logger.error(f"❌ [内部函数] 批量保存医院失败: {len(hospitals_batch)} 家, 错误: {str(hospital_error)}")
+
+        # 调用LLM获取医院数据（流式模式下每解析出一批医院即入库）
+        if LLM_STREAMING_ENABLED:
+            logger.info(f"🤖 [内部函数] 正在流式调用LLM获取医院数据...")
+            received_count = 0
+            pending_hospitals = []
+            async for hospital_data in llm_client.stream_hospitals_from_district(
+                province_info['name'],
+                city_info['name'],
+                district_info['name'],
+                bypass_cache=bypass_cache
+            ):
+                received_count += 1
+                pending_hospitals.append(hospital_data)
+                if len(pending_hospitals) >= HOSPITAL_UPSERT_BATCH_SIZE:
+                    await save_hospitals(pending_hospitals)
+                    pending_hospitals = []
+            await save_hospitals(pending_hospitals)
+            logger.info(f"✅ [内部函数] LLM流式返回医院数据: {received_count} 家医院")
+        else:
+            logger.info(f"🤖 [内部函数] 正在调用LLM获取医院数据...")
+            hospitals_data = await llm_client.get_hospitals_from_district(
+                province_info['name'],
+                city_info['name'],
+                district_info['name'],
+                bypass_cache=bypass_cache
+            )
+            logger.info(f"✅ [内部函数] LLM返回医院数据: {len(hospitals_data)} 家医院")
+
+            await save_hospitals(hospitals_data)
+
+        # 医院全部入库后才记录刷新时间，部分失败的区县下次增量刷新仍会重试
+        if not save_failed:
+            await db.mark_refreshed("districts", district_info['id'])
 
         result["success"] = True
         result["saved_count"] = saved_count
         result["updated_count"] = updated_count
+        result["unchanged_count"] = unchanged_count
         result["execution_time"] = time.time() - start_time
 
-        logger.info(f"🎉 [内部函数] 区县医院刷新完成 - 新增: {saved_count}, 更新: {updated_count}, 耗时: {result['execution_time']:.2f}秒")
+        logger.info(f"🎉 [内部函数] 区县医院刷新完成 - 新增: {saved_count}, 更新: {updated_count}, 无变化: {unchanged_count}, 耗时: {result['execution_time']:.2f}秒")
 
     except Exception as e:
         result["error_message"] = str(e)
@@ -510,237 +654,50 @@ async def refresh_district_hospitals_internal(district_name: str, task_manager:
     return result
 
 
-async def refresh_district_hospitals_with_semaphore(district_name: str, task_manager: TaskManager, semaphore: asyncio.Semaphore) -> dict:
+async def execute_province_cities_districts_refresh_task(task_id: str, province_name: str, task_manager: TaskManager,
+                                                        max_age_hours: Optional[float] = None):
     """
-    带并发控制的区县医院刷新函数
+    执行单个省份的 城市→区县→医院 级联刷新（流水线方式，城市之间、区县之间并发重叠）
 
     Args:
-        district_name: 区县名称
+        task_id: 任务ID
         task_manager: 任务管理器实例
-        semaphore: 并发控制信号量
-
-    Returns:
-        dict: 包含处理结果的字典
+        province_name: 省份名称
+        max_age_hours: 新鲜度阈值（小时），该时间内刷新过的城市/区县不再调用LLM；None 表示全部刷新
     """
-    async with semaphore:
-        logger.info(f"🔒 [并发控制] 获取信号量成功，开始刷新区县: {district_name}")
-        try:
-            result = await refresh_district_hospitals_internal(district_name, task_manager)
-            if result["success"]:
-                logger.info(f"🔓 [并发控制] 区县刷新成功，释放信号量: {district_name}")
-            else:
-                logger.info(f"🔓 [并发控制] 区县刷新失败，释放信号量: {district_name}")
-            return result
-        except Exception as e:
-            logger.error(f"🔓 [并发控制] 区县刷新异常，释放信号量: {district_name}, 错误: {e}")
-            return {
-                "success": False,
-                "error_message": str(e),
-                "saved_count": 0,
-                "updated_count": 0,
-                "execution_time": 0
-            }
-
+    from cascade_pipeline import CascadePipeline
 
-async def execute_province_cities_districts_refresh_task(task_id: str, province_name: str, task_manager: TaskManager):
+    start_time = time.time()
     try:
         logger.info(f"🎉 ========== 开始执行省份城市区县级联刷新任务 ==========")
-        logger.info(f"📋 任务参数: task_id={task_id}, province_name={province_name}")
-        logger.info(f"📋 接收到的TaskManager实例: {type(task_manager)}, 内存任务数: {len(task_manager.tasks)}")
-
-        # 获取数据库连接
-        logger.info(f"🔄 正在获取数据库连接...")
-        db = await get_db()
-        logger.info(f"✅ 数据库连接成功")
-
-        # 并发控制：限制同时进行的区县医院刷新数量，避免打爆LLM API和数据库
-        # 使用环境变量配置，默认为3个并发
-        logger.info(f"🔄 正在配置并发控制...")
-        import os
-        max_concurrent_district_refreshes = int(os.getenv("MAX_CONCURRENT_DISTRICT_REFRESHES", "3"))
-        district_semaphore = asyncio.Semaphore(max_concurrent_district_refreshes)
-        logger.info(f"✅ 并发控制配置完成: 最大同时刷新区县数 = {max_concurrent_district_refreshes}")
-
-        # 统计变量
-        total_cities = 0
-        processed_cities = 0
-        total_districts_created = 0
-        total_districts_skipped = 0
-        total_hospital_refreshes_success = 0
-        total_hospital_refreshes_failed = 0
-        province_id = None
-        # ===== 阶段1: 省份数据准备和城市数据获取 =====
+        logger.info(f"📋 任务参数: task_id={task_id}, province_name={province_name}, max_age_hours={max_age_hours}")
         await task_manager.update_task_status(task_id, TaskStatus.RUNNING, f"开始获取省份 {province_name} 的城市数据...")
-        logger.info(f"🔄 阶段1: 省份数据准备和城市数据获取")
-
-        # 1.1 检查/创建省份记录
-        await task_manager.update_task_status(task_id, TaskStatus.RUNNING, f"检查/创建省份记录: {province_name}")
-        existing_province = await db.get_province_by_name(province_name)
-        if existing_province:
-            province_id = existing_province['id']
-            logger.info(f"✅ 省份已存在: {province_name}, ID: {province_id}")
-        else:
-            province_id = await db.create_province(province_name)
-            logger.info(f"✅ 创建新省份: {province_name}, ID: {province_id}")
 
-        # 1.2 获取城市数据
-        from llm_client import LLMClient
-        llm_client = LLMClient()
-
-        logger.info(f"🔄 正在获取省份 {province_name} 的城市数据...")
-        cities_data = await llm_client.get_cities_by_province(province_name)
-        cities_list = cities_data.get('cities', [])
-        total_cities = len(cities_list)
-        logger.info(f"✅ 成功获取城市数据: {total_cities} 个城市")
-        logger.info(f"📋 城市列表: {cities_list}")
-
-        # 1.3 批量存储城市数据到数据库
-        await task_manager.update_task_status(task_id, TaskStatus.RUNNING, f"批量存储 {total_cities} 个城市到数据库...")
-        logger.info(f"🔄 阶段1.3: 批量存储城市数据到数据库")
-
-        cities_created = 0
-        cities_skipped = 0
-
-        for city_name in cities_list:
-            try:
-                existing_city = await db.get_city_by_name(city_name)
-                if existing_city:
-                    logger.info(f"⏭️ 城市已存在，跳过创建: {city_name}, ID: {existing_city['id']}")
-                    cities_skipped += 1
-                else:
-                    city_id = await db.create_city(city_name, province_id)
-                    logger.info(f"✅ 创建新城市: {city_name}, ID: {city_id}")
-                    cities_created += 1
-            except Exception as city_error:
-                logger.error(f"❌ 处理城市 {city_name} 时出错: {city_error}")
-                continue
-
-        logger.info(f"📊 阶段1完成: 创建 {cities_created} 个城市，跳过 {cities_skipped} 个城市")
-
-        # ===== 阶段2: 从数据库读取城市列表，串行处理每个城市 =====
-        await task_manager.update_task_status(task_id, TaskStatus.RUNNING, f"开始串行处理城市数据...")
-        logger.info(f"🔄 阶段2: 串行处理城市数据（从数据库读取）")
-
-        # 2.1 从数据库获取该省的所有城市
-        cities_data_from_db, total = await db.get_cities(province_id=province_id, page=1, page_size=1000)
-        cities_from_db = cities_data_from_db
-        logger.info(f"✅ 从数据库读取到 {len(cities_from_db)} 个城市")
-
-        # 2.2 串行处理每个城市
-        for city_index, city_data in enumerate(cities_from_db, 1):
-            try:
-                city_name = city_data['name']
-                city_id = city_data['id']
-
-                processed_cities += 1
-                progress_msg = f"处理城市 {city_name} ({city_index}/{len(cities_from_db)})"
-                await task_manager.update_task_status(task_id, TaskStatus.RUNNING, progress_msg)
-
-                logger.info(f"🏙️ 开始处理城市 {city_index}/{len(cities_from_db)}: {city_name} (ID: {city_id})")
-
-                # 2.2.1 获取城市的区县数据
-                logger.info(f"🔄 获取城市 {city_name} 的区县数据...")
-                districts_data = await llm_client.get_districts_by_city(city_name)
-                districts_list = districts_data.get('items', [])
-                logger.info(f"✅ 成功获取 {city_name} 的区县数据: {len(districts_list)} 个区县")
-
-                # 2.2.2 存储区县数据
-                districts_created = 0
-                districts_skipped = 0
-                stored_districts = []
-                all_districts = []
-
-                for district_item in districts_list:
-                    try:
-                        district_name = district_item.get('name') if isinstance(district_item, dict) else district_item
-
-                        # 添加所有区县到 all_districts 列表（无论新旧）
-                        all_districts.append(district_name)
-
-                        # 使用精确查询：检查该城市下是否已存在同名区县
-                        existing_district = await db.get_district_by_name_and_city(district_name, city_id)
-                        if existing_district:
-                            logger.info(f"⏭️ 区县已存在（城市 {city_id}），跳过: {district_name}")
-                            districts_skipped += 1
-                        else:
-                            # 如果精确查询没找到，检查全局是否有同名区县（记录潜在冲突）
-                            global_district = await db.get_district_by_name(district_name)
-                            if global_district:
-                                logger.warning(f"⚠️ 发现跨城市同名区县冲突: '{district_name}' 已存在于城市 {global_district.get('city_id')}，当前城市: {city_id}")
-                                logger.info(f"🔄 将在新城市 {city_id} 中创建区县: {district_name}")
-
-                            district_id = await db.create_district(district_name, city_id)
-                            logger.info(f"✅ 创建新区县: {district_name}, 城市ID: {city_id}")
-                            districts_created += 1
-                            stored_districts.append(district_name)
-                    except Exception as district_error:
-                        logger.error(f"❌ 处理区县 {district_name} 时出错: {district_error}")
-                        continue
-
-                total_districts_created += districts_created
-                total_districts_skipped += districts_skipped
-
-                logger.info(f"📊 城市 {city_name} 区县数据完成: 创建 {districts_created} 个区县，跳过 {districts_skipped} 个区县")
-
-                # 2.2.3 并发刷新每个区县的医院数据（使用内部函数调用 + 并发控制）
-                logger.info(f"🔄 [并发模式] 开始并发刷新 {city_name} 下所有区县的医院数据...")
-                logger.info(f"📊 {city_name} 下共有 {len(all_districts)} 个区县，最大并发数: {max_concurrent_district_refreshes}")
-
-                # 创建并发任务列表
-                hospital_tasks = []
-                for district_name in all_districts:
-                    task = refresh_district_hospitals_with_semaphore(district_name, task_manager, district_semaphore)
-                    hospital_tasks.append((district_name, task))
-
-                # 执行并发任务，并实时更新统计
-                logger.info(f"🚀 [并发模式] 开始执行 {len(hospital_tasks)} 个区县并发刷新任务...")
-
-                completed_count = 0
-                for district_name, task in hospital_tasks:
-                    try:
-                        # 等待单个任务完成
-                        hospital_result = await task
-                        completed_count += 1
-
-                        # 更新任务状态
-                        hospital_refresh_msg = f"刷新区县 {district_name} 医院数据 ({completed_count}/{len(all_districts)})"
-                        await task_manager.update_task_status(task_id, TaskStatus.RUNNING, hospital_refresh_msg)
-
-                        if hospital_result["success"]:
-                            logger.info(f"✅ [并发模式] 区县 {district_name} 医院数据刷新成功 - 新增: {hospital_result['saved_count']}, 更新: {hospital_result['updated_count']}, 耗时: {hospital_result['execution_time']:.2f}秒")
-                            total_hospital_refreshes_success += 1
-                        else:
-                            logger.error(f"❌ [并发模式] 区县 {district_name} 医院数据刷新失败: {hospital_result['error_message']}")
-                            total_hospital_refreshes_failed += 1
-
-                    except Exception as hospital_error:
-                        completed_count += 1
-                        logger.error(f"❌ [并发模式] 刷新区县 {district_name} 医院数据失败: {hospital_error}")
-                        logger.error(f"📋 异常类型: {type(hospital_error).__name__}")
-                        import traceback
-                        logger.error(f"📋 完整堆栈: {traceback.format_exc()}")
-                        total_hospital_refreshes_failed += 1
-
-                logger.info(f"🎉 [并发模式] 城市 {city_name} 所有区县医院刷新完成 - 成功: {total_hospital_refreshes_success}, 失败: {total_hospital_refreshes_failed}")
-
-                logger.info(f"🎉 城市 {city_name} 完整处理完成")
-
-            except Exception as city_error:
-                logger.error(f"❌ 处理城市 {city_name} 时出错: {city_error}")
-                continue
+        pipeline = CascadePipeline(task_id, task_manager, max_age_hours=max_age_hours)
+        summary = await pipeline.run([province_name])
+        if summary["failed_provinces"]:
+            raise ValueError(summary["failed_provinces"][0]["error"])
 
         # ===== 任务完成统计 =====
-        final_msg = f"级联刷新完成: {province_name} - 处理 {processed_cities} 个城市，创建 {total_districts_created} 个区县，跳过 {total_districts_skipped} 个区县，医院刷新成功 {total_hospital_refreshes_success} 个区县，失败 {total_hospital_refreshes_failed} 个区县"
+        final_msg = (f"级联刷新完成: {province_name} - 处理 {summary['cities_done']} 个城市，"
+                     f"创建 {summary['districts_created']} 个区县，跳过 {summary['districts_skipped']} 个区县，"
+                     f"医院刷新成功 {summary['hospital_refreshes_success']} 个区县，失败 {summary['hospital_refreshes_failed']} 个区县，"
+                     f"医院新增 {summary['hospitals_saved']} 家，更新 {summary['hospitals_updated']} 家，"
+                     f"{summary['hospitals_unchanged']} 家无变化")
+        if summary["cities_fresh_skipped"] or summary["districts_fresh_skipped"]:
+            final_msg += (f"（近期已刷新跳过: 城市 {summary['cities_fresh_skipped']} 个，"
+                          f"区县 {summary['districts_fresh_skipped']} 个）")
         await task_manager.update_task_status(task_id, TaskStatus.COMPLETED, final_msg)
 
         logger.info(f"🎉 ========== 省份城市区县级联刷新任务完成 ==========")
         logger.info(f"📊 最终统计:")
-        logger.info(f"   - 处理城市数量: {processed_cities}/{total_cities}")
-        logger.info(f"   - 创建区县数量: {total_districts_created}")
-        logger.info(f"   - 跳过区县数量: {total_districts_skipped}")
-        logger.info(f"   - 医院刷新成功: {total_hospital_refreshes_success} 个区县")
-        logger.info(f"   - 医院刷新失败: {total_hospital_refreshes_failed} 个区县")
-        logger.info(f"   - 省份: {province_name} (ID: {province_id})")
+        logger.info(f"   - 处理城市数量: {summary['cities_done']}/{summary['cities_total']}")
+        logger.info(f"   - 创建区县数量: {summary['districts_created']}")
+        logger.info(f"   - 跳过区县数量: {summary['districts_skipped']}")
+        logger.info(f"   - 医院刷新成功: {summary['hospital_refreshes_success']} 个区县")
+        logger.info(f"   - 医院刷新失败: {summary['hospital_refreshes_failed']} 个区县")
+        logger.info(f"   - 医院新增/更新/无变化: {summary['hospitals_saved']}/{summary['hospitals_updated']}/{summary['hospitals_unchanged']} 家")
+        logger.info(f"   - 总用时: {time.time() - start_time:.2f}秒")
 
     except Exception as e:
         error_message = f"省份城市区县级联刷新失败: {str(e)}"
@@ -828,7 +785,7 @@ async def get_all_provinces_from_llm() -> List[str]:
         ]
 
         logger.info("📤 发送省份查询请求到LLM...")
-        province_response = llm_client._make_request(province_messages, max_tokens=2000)
+        province_response = await llm_client._make_request(province_messages, max_tokens=2000, cache_namespace="provinces")
 
         if not province_response:
             raise Exception("LLM返回空响应，无法获取省份数据")
@@ -925,19 +882,26 @@ async def get_all_provinces_from_llm() -> List[str]:
         raise Exception(f"无法从LLM获取省份数据: {str(e)}")
 
 
-async def execute_all_provinces_cascade_refresh(task_id: str, task_manager: TaskManager):
+async def execute_all_provinces_cascade_refresh(task_id: str, task_manager: TaskManager,
+                                                max_age_hours: Optional[float] = None):
     """
     执行全国所有省份的级联刷新任务
 
     Args:
         task_id: 任务ID
         task_manager: 任务管理器实例
+        max_age_hours: 新鲜度阈值（小时），该时间内刷新过的省份/城市/区县不再调用LLM；None 表示全部刷新
 
     该函数会：
     1. 从LLM获取所有省份列表
-    2. 串行处理每个省份（避免过度并发）
-    3. 对每个省份执行完整的级联刷新
+    2. 以流水线方式处理所有省份（省份/城市/医院阶段之间为有界队列，各阶段并发数可配置）
+    3. 为每个省份创建子任务记录并跟踪其完成状态
     4. 提供详细的进度跟踪和错误处理
+
+    省份列表及各省份/城市/区县的进度按task_id记录为断点，同一任务再次执行
+    （断点续跑接口或作业中断后恢复）时跳过已完成的部分。
+
+    失败时不抛出异常，返回 {"success": False, "error": ...}（作业队列据此把作业记录为失败）。
     """
     import time
     import asyncio
@@ -958,7 +922,15 @@ async def execute_all_provinces_cascade_refresh(task_id: str, task_manager: Task
         await task_manager.update_task_status(task_id, TaskStatus.RUNNING, "正在获取全国所有省份列表...")
 
         try:
-            provinces = await get_all_provinces_from_llm()
+            db = await get_db()
+            provinces_checkpoint = (await db.get_refresh_checkpoints(task_id)).get("provinces", {}).get("all")
+            if provinces_checkpoint and provinces_checkpoint["detail"]:
+                provinces = provinces_checkpoint["detail"]
+                logger.info(f"⏭️ 使用断点中的省份列表: {len(provinces)} 个省份")
+            else:
+                provinces = await get_all_provinces_from_llm()
+                if provinces:
+                    await db.save_refresh_checkpoint(task_id, "provinces", "all", "completed", detail=provinces)
             total_provinces = len(provinces)
 
             # Check if LLM returned empty provinces list
@@ -966,7 +938,7 @@ async def execute_all_provinces_cascade_refresh(task_id: str, task_manager: Task
                 error_msg = "LLM返回的省份列表为空，无法执行全国扫描"
                 logger.error(f"❌ {error_msg}")
                 await task_manager.update_task_status(task_id, TaskStatus.FAILED, error_msg)
-                return
+                return {"success": False, "error": error_msg}
 
             logger.info(f"✅ 成功获取省份列表: {total_provinces} 个省份")
             await task_manager.update_task_status(task_id, TaskStatus.RUNNING, f"成功获取 {total_provinces} 个省份，开始级联刷新...")
@@ -974,103 +946,32 @@ async def execute_all_provinces_cascade_refresh(task_id: str, task_manager: Task
             error_msg = f"获取省份列表失败: {str(e)}"
             logger.error(f"❌ {error_msg}")
             await task_manager.update_task_status(task_id, TaskStatus.FAILED, error_msg)
-            return
-
-        # 阶段2: 串行处理每个省份的级联刷新
-        logger.info("🔄 阶段2: 开始串行处理所有省份的级联刷新")
-
-        for i, province_name in enumerate(provinces, 1):
-            province_start_time = time.time()
-
-            try:
-                logger.info(f"🌍 [省份 {i}/{total_provinces}] 开始处理: {province_name}")
-                progress_msg = f"正在处理省份 {province_name} ({i}/{total_provinces})"
-                await task_manager.update_task_status(task_id, TaskStatus.RUNNING, progress_msg)
-
-                # 创建真实的省级子任务记录，便于状态跟踪
-                province_task_id = f"{task_id}_province_{i}"
-
-                try:
-                    # 验证省份名称参数
-                    if not province_name or province_name.strip() == "":
-                        error_msg = f"省份名称为空，跳过处理 [省份 {i}/{total_provinces}]"
-                        logger.warning(f"⚠️ {error_msg}")
-                        failed_provinces += 1
-                        continue
-
-                    # 创建省级子任务记录
-                    province_task_request = ScanTaskRequest(
-                        hospital_name=f"省级级联刷新 - {province_name}",
-                        query=f"级联刷新省份 {province_name} 的所有城市、区县和医院数据",
-                        task_type=TaskType.PROVINCE
-                    )
-
-                    # 通过TaskManager创建子任务，确保在内存和数据库中都有记录
-                    await task_manager.create_task(province_task_request, province_task_id)
-                    logger.info(f"📋 创建省级子任务: {province_task_id} - {province_name}")
-
-                    # 更新子任务状态为运行中
-                    await task_manager.update_task_status(province_task_id, TaskStatus.RUNNING, f"开始处理 {province_name} 的级联刷新...")
-
-                    # 调用省份级联刷新函数
-                    await execute_province_cities_districts_refresh_task(province_task_id, province_name, task_manager)
-
-                except Exception as task_init_error:
-                    # 处理任务初始化阶段的异常
-                    error_msg = f"省级任务初始化失败: {str(task_init_error)}"
-                    logger.error(f"❌ [省份 {i}/{total_provinces}] {province_name} - {error_msg}")
-                    logger.error(f"⏱️ 初始化失败前用时: {time.time() - province_start_time:.2f}秒")
-                    failed_provinces += 1
-
-                    # 如果子任务已创建，更新失败状态
-                    if 'province_task_id' in locals():
-                        try:
-                            await task_manager.update_task_status(province_task_id, TaskStatus.FAILED, error_msg)
-                        except Exception as status_update_error:
-                            logger.error(f"❌ 更新子任务失败状态时出错: {status_update_error}")
-
-                    # 记录详细错误信息用于调试
-                    import traceback
-                    logger.error(f"❌ 省份任务初始化异常详情: {traceback.format_exc()}")
-                    continue
-
-                # 省级任务处理成功的情况
-                province_time = time.time() - province_start_time
-                logger.info(f"✅ [省份 {i}/{total_provinces}] {province_name} 处理成功 - 耗时: {province_time:.2f}秒")
-                successful_provinces += 1
-
-                # 标记子任务完成，但不删除（保留用于历史查询）
-                await task_manager.update_task_status(province_task_id, TaskStatus.COMPLETED, f"{province_name} 级联刷新完成")
-
-                # 省份间短暂休息，避免API限流
-                await asyncio.sleep(2)
-
-            except Exception as province_refresh_error:
-                # 处理省份级联刷新阶段的异常（不包括初始化）
-                province_time = time.time() - province_start_time
-                logger.error(f"❌ [省份 {i}/{total_provinces}] {province_name} 级联刷新失败: {province_refresh_error}")
-                logger.error(f"⏱️ 失败前用时: {province_time:.2f}秒")
-                failed_provinces += 1
-
-                # 如果子任务已创建，更新失败状态
-                try:
-                    error_msg = f"{province_name} 级联刷新失败: {str(province_refresh_error)}"
-                    await task_manager.update_task_status(province_task_id, TaskStatus.FAILED, error_msg)
-                except Exception as status_update_error:
-                    logger.warning(f"⚠️ 无法更新子任务 {province_task_id} 状态: {status_update_error}")
+            return {"success": False, "error": error_msg}
 
-                # 继续处理下一个省份
-                continue
+        # 阶段2: 流水线处理所有省份（省份/城市/医院阶段各自并发，不同省份的请求相互重叠）
+        logger.info("🔄 阶段2: 开始流水线处理所有省份的级联刷新")
 
-            # 显示当前进度
-            current_progress = int((i / total_provinces) * 100)
-            logger.info(f"📊 全国扫描进度: {i}/{total_provinces} ({current_progress}%) - 成功: {successful_provinces}, 失败: {failed_provinces}")
+        from cascade_pipeline import CascadePipeline
+        pipeline = CascadePipeline(task_id, task_manager, create_province_tasks=True, checkpoint=True,
+                                   max_age_hours=max_age_hours)
+        summary = await pipeline.run(provinces)
+        successful_provinces = summary["provinces_completed"]
+        failed_provinces = summary["provinces_failed"]
+        for failed in summary["failed_provinces"]:
+            logger.error(f"❌ 省份 {failed['name']} 级联刷新失败: {failed['error']}")
 
         # 阶段3: 任务完成总结
         total_time = time.time() - start_time
         success_rate = int((successful_provinces / total_provinces) * 100) if total_provinces > 0 else 0
 
         final_msg = f"全国扫描完成！成功处理 {successful_provinces}/{total_provinces} 个省份 (成功率: {success_rate}%)，失败 {failed_provinces} 个省份"
+        skipped_provinces = summary["provinces_checkpoint_skipped"]
+        if skipped_provinces or summary["cities_checkpoint_skipped"] or summary["districts_checkpoint_skipped"]:
+            final_msg += (f"（断点跳过: 省份 {skipped_provinces} 个，城市 {summary['cities_checkpoint_skipped']} 个，"
+                          f"区县 {summary['districts_checkpoint_skipped']} 个）")
+        if summary["provinces_fresh_skipped"] or summary["cities_fresh_skipped"] or summary["districts_fresh_skipped"]:
+            final_msg += (f"（近期已刷新跳过: 省份 {summary['provinces_fresh_skipped']} 个，城市 {summary['cities_fresh_skipped']} 个，"
+                          f"区县 {summary['districts_fresh_skipped']} 个）")
         await task_manager.update_task_status(task_id, TaskStatus.COMPLETED, final_msg)
 
         logger.info("🎉 ========== 全国扫描任务完成 ==========")
@@ -1078,6 +979,8 @@ async def execute_all_provinces_cascade_refresh(task_id: str, task_manager: Task
         logger.info(f"   - 总省份数: {total_provinces}")
         logger.info(f"   - 成功处理: {successful_provinces}")
         logger.info(f"   - 失败处理: {failed_provinces}")
+        logger.info(f"   - 城市/区县: {summary['cities_done']}/{summary['districts_done']}")
+        logger.info(f"   - 医院刷新成功/失败: {summary['hospital_refreshes_success']}/{summary['hospital_refreshes_failed']} 个区县")
         logger.info(f"   - 成功率: {success_rate}%")
         logger.info(f"   - 总用时: {total_time:.2f}秒")
         logger.info(f"   - 平均每省用时: {total_time/total_provinces:.2f}秒" if total_provinces > 0 else "   - 平均每省用时: N/A")
@@ -1103,4 +1006,5 @@ async def execute_all_provinces_cascade_refresh(task_id: str, task_manager: Task
             logger.error(f"❌ 更新任务状态失败: {update_error}")
 
         logger.error("=" * 80)
-        # 不重新抛出异常，避免影响主服务
\ No newline at end of file
+        # 不重新抛出异常，避免影响主服务；失败信息通过返回值交给作业队列记录
+        return {"success": False, "error": error_message}
\ No newline at end of file
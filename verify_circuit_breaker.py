@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM熔断器半开探测验证（模拟限流器和HTTP客户端，不访问真实API）
+
+验证半开状态下的探测请求在以下情况下都会释放探测名额，熔断器不会一直拒绝请求：
+1. 探测请求在限流器排队时被取消
+2. 探测请求已放行、等待HTTP响应时被取消
+3. 流式探测请求被消费方提前停止读取
+
+用法:
+    python verify_circuit_breaker.py
+"""
+
+import os
+import sys
+import asyncio
+
+sys.path.append(os.path.dirname(__file__))
+os.environ.setdefault("DASHSCOPE_API_KEY", "verify-circuit-breaker")
+
+import llm_client
+from llm_client import LLMClient
+from llm_resilience import CircuitBreaker, LLMCircuitOpenError
+
+RECOVERY_TIMEOUT = 0.05
+
+
+class BlockingLimiter:
+    """acquire 一直等待的限流器，模拟探测请求在限流器排队"""
+
+    async def acquire(self, tokens: int = 0):
+        await asyncio.Event().wait()
+
+    def release(self, status_code=None, retry_after=None, timed_out=False):
+        pass
+
+
+class PassLimiter(BlockingLimiter):
+    async def acquire(self, tokens: int = 0):
+        return None
+
+
+class HangingResponse:
+    status_code = 200
+    headers = {}
+
+    async def aread(self):
+        return b""
+
+    async def aiter_lines(self):
+        yield 'data: {"choices": [{"delta": {"content": "探测"}}]}'
+        await asyncio.Event().wait()
+
+
+class HangingStream:
+    async def __aenter__(self):
+        return HangingResponse()
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class HangingClient:
+    """post 一直等待的HTTP客户端，模拟已放行的请求等待响应"""
+
+    async def post(self, *args, **kwargs):
+        await asyncio.Event().wait()
+
+    def stream(self, *args, **kwargs):
+        return HangingStream()
+
+
+def open_breaker() -> CircuitBreaker:
+    """返回一个已打开、冷却期结束后进入半开状态的熔断器"""
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=RECOVERY_TIMEOUT, name="verify")
+    breaker.record_failure()
+    return breaker
+
+
+async def assert_probe_released(breaker: CircuitBreaker, case: str) -> bool:
+    await asyncio.sleep(RECOVERY_TIMEOUT * 2)
+    try:
+        breaker.before_request()
+    except LLMCircuitOpenError:
+        print(f"❌ {case}: 探测名额未释放，熔断器状态 {breaker.state}，请求仍被拒绝")
+        return False
+    breaker.record_neutral()
+    print(f"✅ {case}: 探测名额已释放，熔断器状态 {breaker.state}")
+    return True
+
+
+async def cancel_after(coro, delay: float = 0.05):
+    task = asyncio.create_task(coro)
+    await asyncio.sleep(delay)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+async def verify() -> bool:
+    messages = [{"role": "user", "content": "探测"}]
+    results = []
+
+    # 1. 半开探测在限流器排队时被取消
+    breaker = open_breaker()
+    await asyncio.sleep(RECOVERY_TIMEOUT * 2)
+    client = LLMClient(circuit_breaker=breaker)
+    llm_client.get_rate_limiter = BlockingLimiter
+    await cancel_after(client._send_once(messages, 16))
+    results.append(await assert_probe_released(breaker, "限流器排队时取消"))
+
+    # 2. 半开探测已放行、等待响应时被取消
+    breaker = open_breaker()
+    await asyncio.sleep(RECOVERY_TIMEOUT * 2)
+    client = LLMClient(circuit_breaker=breaker)
+    llm_client.get_rate_limiter = PassLimiter
+    llm_client.get_async_http_client = lambda timeout: HangingClient()
+    await cancel_after(client._send_once(messages, 16))
+    results.append(await assert_probe_released(breaker, "等待响应时取消"))
+
+    # 3. 流式探测被消费方提前停止读取
+    breaker = open_breaker()
+    await asyncio.sleep(RECOVERY_TIMEOUT * 2)
+    client = LLMClient(circuit_breaker=breaker)
+    stream = client._stream_once(messages, 16)
+    await stream.__anext__()
+    await stream.aclose()
+    results.append(await assert_probe_released(breaker, "流式读取提前停止"))
+
+    return all(results)
+
+
+if __name__ == "__main__":
+    if asyncio.run(verify()):
+        print("\n🎉 熔断器半开探测名额在所有退出路径上都会释放")
+    else:
+        print("\n💥 熔断器验证失败")
+        sys.exit(1)
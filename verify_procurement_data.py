@@ -2,6 +2,13 @@ import sqlite3
 import os
 import sys
 
+# "最新"记录：last_run_id 等于该站点最近一次完成的抓取批次（与 db.CURRENT_CRAWL_RUN_SQL 一致）
+LATEST_RUN_CONDITION = """
+    p.last_run_id IS NOT NULL AND p.last_run_id = (
+        SELECT MAX(r.id) FROM crawl_runs r WHERE r.base_url = p.base_url AND r.status = 'completed'
+    )
+"""
+
 def verify_procurement_data():
     """详细验证procurement_links表的数据"""
 
@@ -47,10 +54,11 @@ def verify_procurement_data():
 
         # 显示最近的一些记录
         print(f"\n📄 最近5条记录:")
-        cursor.execute("""
-            SELECT id, base_url, url, link_text, first_seen_at, last_seen_at, is_latest
-            FROM procurement_links
-            ORDER BY id DESC
+        cursor.execute(f"""
+            SELECT p.id, p.base_url, p.url, p.link_text, p.first_seen_at, p.last_seen_at,
+                   p.last_run_id, {LATEST_RUN_CONDITION} AS is_latest
+            FROM procurement_links p
+            ORDER BY p.id DESC
             LIMIT 5
         """)
         records = cursor.fetchall()
@@ -61,7 +69,8 @@ def verify_procurement_data():
             print(f"     Link Text: {record[3][:50] if record[3] else 'NULL'}{'...' if record[3] and len(record[3]) > 50 else ''}")
             print(f"     First Seen: {record[4]}")
             print(f"     Last Seen: {record[5]}")
-            print(f"     Is Latest: {record[6]}")
+            print(f"     Last Run ID: {record[6]}")
+            print(f"     Is Latest: {record[7]}")
             print()
 
         # 按base_url分组统计
@@ -77,9 +86,9 @@ def verify_procurement_data():
             print(f"  {base_url}: {count} 条记录")
 
         # 检查最新记录
-        cursor.execute("SELECT base_url, COUNT(*) FROM procurement_links WHERE is_latest = 1 GROUP BY base_url")
+        cursor.execute(f"SELECT p.base_url, COUNT(*) FROM procurement_links p WHERE {LATEST_RUN_CONDITION} GROUP BY p.base_url")
         latest_records = cursor.fetchall()
-        print(f"\n🌟 最新记录 (is_latest=1):")
+        print(f"\n🌟 最新记录 (last_run_id 为站点最近一次完成的抓取批次):")
         for base_url, count in latest_records:
             print(f"  {base_url}: {count} 条记录")
 